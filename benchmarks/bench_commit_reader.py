@@ -0,0 +1,130 @@
+"""Compare readers of commit tables in prepare_neo4j_import.
+
+Writes commits of a synthetic repository to commits.csv and reads them back
+with util.parse.iter_commit_records on util.table_io.iter_table, which
+prepare_neo4j_import uses, and with a reader which memory-maps the file,
+finds records with a regular expression on the raw bytes, decodes only the
+fields of CommitRecord, and keeps messages as memoryviews.
+
+Usage:
+    python -m benchmarks.bench_commit_reader --commits 100000
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Iterator
+
+from benchmarks.fixtures import write_git_repo
+from util.bare_git import CommitRecord, GitHistory
+from util.parse import iter_commit_records
+from util.table_io import iter_table, write_table
+
+
+# Quoted field with doubled quotes or unquoted field
+FIELD_PATTERN = rb'("[^"]*(?:""[^"]*)*"|[^,"\r\n]*)'
+HEADER_PATTERN = re.compile(rb'[^\r\n]*\r?\n')
+
+
+def decode_field(field) -> str:
+    """Decode raw CSV field, removing quotes."""
+    if field[:1] == b'"':
+        return bytes(field[1:-1]).replace(b'""', b'"').decode()
+    return bytes(field).decode()
+
+
+def iter_mmap_commit_records(path: str) -> Iterator[CommitRecord]:
+    """Read commits CSV file by matching records on memory-mapped bytes.
+
+    Messages of the records are memoryviews of the raw, quoted fields.
+    """
+    with open(path, 'rb') as csv_file:
+        if not os.fstat(csv_file.fileno()).st_size:
+            return
+        mapped = mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    header = HEADER_PATTERN.match(mapped)
+    names = header.group().decode().rstrip('\r\n').split(',')
+    fields = CommitRecord._fields
+    groups = [names.index(field) + 1 for field in fields]
+    message_index = fields.index('message')
+    interned = [fields.index(field) for field in fields
+                if field.endswith(('_name', '_email'))]
+    record_pattern = re.compile(
+        FIELD_PATTERN + (b',' + FIELD_PATTERN) * (len(names) - 1)
+        + rb'(?:\r?\n|\Z)')
+    position = header.end()
+    for match in record_pattern.finditer(mapped, position):
+        if match.start() != position:
+            raise ValueError('Malformed record at byte {}'.format(position))
+        if match.end() == position:
+            break
+        position = match.end()
+        row = [
+            decode_field(value) if value[:1] == b'"' else value.decode()
+            for value in match.group(*groups)]
+        start, end = match.span(groups[message_index])
+        row[message_index] = view[start:end]
+        for index in interned:
+            row[index] = sys.intern(row[index])
+        yield CommitRecord._make(row)
+
+
+def iter_csv_commit_records(path: str) -> Iterator[CommitRecord]:
+    """Read commits CSV file as prepare_neo4j_import does."""
+    return iter_commit_records(iter_table(os.path.splitext(path)[0]))
+
+
+def run(name: str, read, path: str) -> dict:
+    """Read all commits at path."""
+    start = time.perf_counter()
+    commits = sum(1 for _ in read(path))
+    seconds = time.perf_counter() - start
+    return {
+        'reader': name,
+        'commits': commits,
+        'seconds': round(seconds, 4),
+        'commits_per_second': round(commits / seconds, 1),
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help='Number of runs per reader. The fastest one is reported.')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        git_dir = os.path.join(tmp_dir, 'synthetic.git')
+        write_git_repo(git_dir, args.commits, args.seed)
+        table = os.path.join(tmp_dir, 'commits')
+        path = write_table(
+            table, CommitRecord._fields, GitHistory(git_dir).iter_commits())
+
+        mapped = [
+            commit._replace(message=decode_field(commit.message))
+            for commit in iter_mmap_commit_records(path)]
+        if mapped != list(iter_csv_commit_records(path)):
+            sys.exit('Readers disagree')
+        del mapped
+        results = {'file_bytes': os.path.getsize(path), 'runs': []}
+        for name, read in [
+                ('csv', iter_csv_commit_records),
+                ('mmap', iter_mmap_commit_records)]:
+            runs = [run(name, read, path) for _ in range(args.repeat)]
+            results['runs'].append(min(runs, key=lambda r: r['seconds']))
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Compare parsers of commit history in util.bare_git.GitHistory.
+
+Creates a bare repository with synthetic commits and reads its history with
+the fixed-field record format and with the legacy key-value format. Reports
+time spent in git-log and in parsing separately.
+
+Usage:
+    python -m benchmarks.bench_git_history --commits 100000
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import write_git_repo
+from util.bare_git import GitHistory
+
+
+def run(git: GitHistory, name: str, log, parse) -> dict:
+    """Run git-log and parse its output."""
+    start = time.perf_counter()
+    output = log()
+    log_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    commits = sum(1 for _ in parse(output))
+    parse_seconds = time.perf_counter() - start
+    return {
+        'format': name,
+        'commits': commits,
+        'output_bytes': len(output),
+        'log_seconds': round(log_seconds, 4),
+        'parse_seconds': round(parse_seconds, 4),
+        'commits_per_second_parsed': round(commits / parse_seconds, 1),
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        git_dir = os.path.join(tmp_dir, 'synthetic.git')
+        start = time.perf_counter()
+        write_git_repo(git_dir, args.commits, args.seed)
+        setup_seconds = time.perf_counter() - start
+        git = GitHistory(git_dir)
+        records = [commit._asdict() for commit in git.iter_commits()]
+        if records != list(git.iter_legacy_commits()):
+            sys.exit('Parsers disagree')
+        results = {
+            'setup_seconds': round(setup_seconds, 4),
+            'runs': [
+                run(git, 'record', git._log_records, git._parse_records),
+                run(
+                    git, 'legacy', git._log_all,
+                    git._parse_legacy_output),
+            ],
+        }
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Load test the Github API client stack against a local stand-in server.
+
+Starts benchmarks.fake_github with synthetic repositories and drives the
+functions of subcommands match_packages, get_repo_data, and
+get_gradle_files against it through RepoVerifier and its subclasses. Every
+workload starts with fresh rate limits and statistics of the server.
+Reports throughput and the requests the server received by endpoint and
+status.
+
+Rate limit windows default to a few seconds, so that waiting for a reset
+shows up in the results without stalling the benchmark.
+
+Usage:
+    python -m benchmarks.bench_github_client --repos 500 --workers 8 \\
+        --latency 0.05 --metadata-cache :memory:
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import functools
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_github import \
+    CORE_RESOURCE, FakeGitHub, RateLimits, SEARCH_RESOURCE, start_server
+from benchmarks.fixtures import \
+    github_repos, write_package_repos, write_play_details_dir
+
+
+WORKLOADS = ['match_packages', 'get_repo_data', 'get_gradle_files']
+TOKEN = 'benchmark'
+
+
+def make_verifier(base_url: str, metadata_cache, cls=None):
+    """Create RepoVerifier or a subclass using the server at base_url."""
+    from util.github_repo import RepoVerifier
+    return (cls or RepoVerifier)(
+        token=TOKEN, metadata_cache=metadata_cache, base_url=base_url)
+
+
+def run_match_packages(
+        verifier_factory, fixtures_dir: str, workers: int) -> int:
+    """Match all packages with repositories in batch mode."""
+    from subcommands.match_packages import match_play_and_github
+    with open(os.path.join(fixtures_dir, 'package_repos.csv')) as csv_file:
+        matches = list(match_play_and_github(
+            csv_file, os.path.join(fixtures_dir, 'package_details'),
+            verifier_factory(), batch=True, workers=workers))
+    return len(matches)
+
+
+def run_get_repo_data(
+        verifier_factory, repo_names: list, workers: int) -> int:
+    """Download meta data and number of commits of repositories."""
+    from subcommands.get_repo_data import download_repo_data
+    verifier = verifier_factory()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            lambda name: download_repo_data(name, verifier), repo_names)
+        return sum(1 for data in results if data)
+
+
+def run_get_gradle_files(
+        verifier_factory, repo_names: list, workers: int) -> int:
+    """Search and download Gradle files of repositories."""
+    from subcommands.get_gradle_files import \
+        GradleFileSearcher, download_gradle_files
+    searcher = verifier_factory(GradleFileSearcher)
+    with tempfile.TemporaryDirectory() as outdir:
+        def _download(repo_name):
+            return searcher.catch_renamed_repo(
+                repo_name,
+                lambda name: download_gradle_files(name, searcher, outdir))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(
+                1 for name, _ in executor.map(_download, repo_names) if name)
+
+
+def read_repo_names(package_repos_path: str) -> list:
+    """Read all repository names listed for packages."""
+    with open(package_repos_path) as csv_file:
+        return sorted({
+            name for row in csv.DictReader(csv_file)
+            for name in row['all_repos'].split(',')})
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packages', type=int, default=300)
+    parser.add_argument(
+        '--repos', type=int, default=200,
+        help='''Number of repositories for get_repo_data and
+            get_gradle_files.''')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument(
+        '--latency', type=float, default=0.02,
+        help='Seconds the server waits before answering a request.')
+    parser.add_argument('--core-limit', type=int, default=5000)
+    parser.add_argument('--search-limit', type=int, default=30)
+    parser.add_argument(
+        '--window', type=int, default=5,
+        help='Seconds until rate limits reset.')
+    parser.add_argument(
+        '--abuse-every', type=int, default=0,
+        help='Trigger abuse detection every n-th request.')
+    parser.add_argument(
+        '--metadata-cache', type=str, default=None,
+        help='''Path of RepoCache database shared by all workloads, e.g.
+            :memory:. Default: no cache.''')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--workloads', nargs='+', choices=WORKLOADS, default=WORKLOADS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    from util.repo_cache import RepoCache
+    metadata_cache = (
+        RepoCache(args.metadata_cache) if args.metadata_cache else None)
+
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        details_dir = os.path.join(fixtures_dir, 'package_details')
+        write_play_details_dir(details_dir, args.packages, args.seed)
+        package_repos_path = os.path.join(fixtures_dir, 'package_repos.csv')
+        write_package_repos(details_dir, package_repos_path, args.seed)
+        all_names = read_repo_names(package_repos_path)
+        repos = github_repos(all_names, args.seed)
+        repo_names = all_names[:args.repos]
+        inputs = {
+            'match_packages': fixtures_dir,
+            'get_repo_data': repo_names,
+            'get_gradle_files': repo_names,
+        }
+        functions = {
+            'match_packages': run_match_packages,
+            'get_repo_data': run_get_repo_data,
+            'get_gradle_files': run_get_gradle_files,
+        }
+
+        # One server for all workloads keeps URLs in cached meta data valid
+        server = start_server(FakeGitHub(repos))
+        verifier_factory = functools.partial(
+            make_verifier, server.base_url, metadata_cache)
+        results = []
+        for workload in args.workloads:
+            fake_github = FakeGitHub(
+                repos, RateLimits({
+                    CORE_RESOURCE: (args.core_limit, args.window),
+                    SEARCH_RESOURCE: (args.search_limit, args.window)}),
+                args.latency, args.abuse_every)
+            server.fake = fake_github
+            start = time.perf_counter()
+            items = functions[workload](
+                verifier_factory, inputs[workload], args.workers)
+            seconds = time.perf_counter() - start
+            statistics = fake_github.statistics()
+            results.append(dict({
+                'workload': workload,
+                'items': items,
+                'seconds': round(seconds, 3),
+                'requests_per_second': round(
+                    statistics['requests'] / seconds, 1),
+            }, **statistics))
+        server.shutdown()
+
+    json.dump({
+        'parameters': {
+            key: value for key, value in vars(args).items()
+            if key != 'workloads'},
+        'results': results,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
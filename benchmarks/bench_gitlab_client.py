@@ -0,0 +1,138 @@
+"""Load test the Gitlab API client stack against a local stand-in server.
+
+Generates bare Git repositories with branches and tags, serves them with
+benchmarks.fake_gitlab, and drives the functions of subcommands
+store_repo_data and mirror_empty_repos against it through python-gitlab.
+Every workload starts with fresh statistics of the server. Reports
+throughput and the requests the server received by endpoint and status.
+
+Usage:
+    python -m benchmarks.bench_gitlab_client --repos 50 --latency 0.02 \\
+        --jitter 0.01
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_gitlab import FakeGitlab, start_gitlab_server
+from benchmarks.fixtures import write_git_repo
+
+
+WORKLOADS = ['store_repo_data', 'mirror_empty_repos']
+TOKEN = 'benchmark'
+
+
+def make_gitlab(base_url: str, repos_dir: str):
+    """Create Gitlab instance as subcommand store_repo_data does."""
+    from gitlab import Gitlab
+    gitlab = Gitlab(base_url, private_token=TOKEN, api_version=4)
+    gitlab.repository_prefix = repos_dir
+    return gitlab
+
+
+def run_store_repo_data(gitlab, projects: list) -> int:
+    """Store data of all repositories."""
+    from subcommands.store_repo_data import store_repository_info
+    csv_file = tempfile.SpooledTemporaryFile(mode='w+')
+    csv_writer = csv.DictWriter(csv_file, [
+        'id', 'full_name', 'clone_project_id', 'clone_project_path',
+        'packages'])
+    csv_writer.writeheader()
+    for project_id, path in projects:
+        csv_writer.writerow({
+            'id': project_id,
+            'full_name': path.replace('_', '/', 1),
+            'clone_project_id': project_id,
+            'clone_project_path': path,
+            'packages': 'com.example.{}'.format(path.replace('-', '_')),
+        })
+    csv_file.seek(0)
+    with tempfile.TemporaryDirectory() as outdir:
+        store_repository_info(csv_file, gitlab, outdir)
+        return len(os.listdir(outdir))
+
+
+def run_mirror_empty_repos(gitlab, projects: list) -> int:
+    """Delete all projects and create them again."""
+    from subcommands.mirror_empty_repos import mirror_repos
+    repo_names = [(path.replace('_', '/', 1), path) for _, path in projects]
+    return sum(1 for _ in mirror_repos(repo_names, gitlab, delete_wait=0))
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repos', type=int, default=20)
+    parser.add_argument('--commits', type=int, default=200)
+    parser.add_argument('--branches', type=int, default=30)
+    parser.add_argument('--tags', type=int, default=30)
+    parser.add_argument(
+        '--latency', type=float, default=0.02,
+        help='Seconds the server waits before answering a request.')
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='Maximum of additional random seconds to wait.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--workloads', nargs='+', choices=WORKLOADS, default=WORKLOADS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    functions = {
+        'store_repo_data': run_store_repo_data,
+        'mirror_empty_repos': run_mirror_empty_repos,
+    }
+    with tempfile.TemporaryDirectory() as repos_dir:
+        for number in range(args.repos):
+            write_git_repo(
+                os.path.join(repos_dir, 'user{}_app-{}.git'.format(
+                    number % 7, number)),
+                args.commits, args.seed + number, args.branches, args.tags)
+
+        results = []
+        server = None
+        for workload in args.workloads:
+            # Fresh projects for every workload as mirror_empty_repos
+            # deletes and recreates them
+            fake_gitlab = FakeGitlab(
+                repos_dir, private_token=TOKEN, latency=args.latency,
+                jitter=args.jitter, seed=args.seed)
+            if server is None:
+                server = start_gitlab_server(fake_gitlab)
+            server.fake = fake_gitlab
+            projects = [
+                (project['id'], project['path'])
+                for project in fake_gitlab.projects.values()]
+            gitlab = make_gitlab(server.base_url, repos_dir)
+            start = time.perf_counter()
+            items = functions[workload](gitlab, projects)
+            seconds = time.perf_counter() - start
+            statistics = fake_gitlab.statistics()
+            results.append(dict({
+                'workload': workload,
+                'items': items,
+                'seconds': round(seconds, 3),
+                'items_per_second': round(items / seconds, 1),
+                'requests_per_second': round(
+                    statistics['requests'] / seconds, 1),
+            }, **statistics))
+        if server is not None:
+            server.shutdown()
+
+    json.dump({
+        'parameters': {
+            key: value for key, value in vars(args).items()
+            if key != 'workloads'},
+        'results': results,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Compare writers of Neo4j import files.
+
+Writes commit nodes and their relations with prepare_neo4j_import.Output,
+uncompressed and gzip compressed, and with a copy of its former
+implementation, which dispatched through __getattribute__ to csv.DictWriter
+with dictionary rows.
+
+Usage:
+    python -m benchmarks.bench_neo4j_output --rows 200000
+"""
+
+import argparse
+import csv
+from functools import partial
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import WORDS
+from subcommands import prepare_neo4j_import as neo4j
+from util.compress import find_gzip_program
+
+
+class DictOutput(object):
+    """Former implementation of prepare_neo4j_import.Output."""
+    output_type = neo4j.Output.output_type
+
+    def __init__(self, directory: str):
+        self._output = {}
+        for tag, fields in self.output_type:
+            path = os.path.join(directory, '{}s.csv'.format(tag))
+            output_file = open(path, 'w', newline='')
+            writer = csv.DictWriter(
+                output_file, fields, dialect=neo4j.Neo4jDialect)
+            writer.writeheader()
+            self._output[tag] = {'handle': output_file, 'writer': writer}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        for output in self._output.values():
+            output['handle'].close()
+
+    def __getattribute__(self, name):
+        if name in object.__getattribute__(self, '_output'):
+            write = object.__getattribute__(self, 'write')
+            return lambda row: write(name, row)
+        return object.__getattribute__(self, name)
+
+    def write(self, tag: str, row: dict):
+        if tag in self._output:
+            self._output[tag]['writer'].writerow(row)
+        else:
+            raise KeyError('No writer for tag {}'.format(tag))
+
+
+def make_commits(n_commits: int, seed: int) -> list:
+    """Create rows of commit nodes and relations."""
+    rng = random.Random(seed)
+    commits = []
+    for index in range(n_commits):
+        commit_id = '{:040x}'.format(rng.getrandbits(160))
+        message = ' '.join(rng.choice(WORDS) for _ in range(40))
+        commits.append((
+            ('Commit', commit_id, commit_id[:8], message[:40], message,
+             rng.randint(0, 100), rng.randint(0, 100), rng.randint(0, 200)),
+            ('PARENT', commit_id, '{:040x}'.format(index)),
+            ('AUTHORS', 'contr:{}@example.com'.format(rng.choice(WORDS)),
+             commit_id, 1500000000 + index),
+        ))
+    return commits
+
+
+def as_dict(fields: list, row: tuple) -> dict:
+    return dict(zip(fields, row))
+
+
+def run_dict(directory: str, commits: list) -> float:
+    """Write rows with the former Output."""
+    dict_commits = [
+        (as_dict(neo4j.COMMIT_FIELDS, commit),
+         as_dict(neo4j.GENERAL_RELATION_FIELDS, parent),
+         as_dict(neo4j.CONTRIBUTOR_RELATION_FIELDS, author))
+        for commit, parent, author in commits]
+    start = time.perf_counter()
+    with DictOutput(directory) as output:
+        for commit, parent, author in dict_commits:
+            output.commit(commit)
+            output.general_relation(parent)
+            output.contribute_relation(author)
+    return time.perf_counter() - start
+
+
+def run_positional(
+        directory: str, commits: list, compress: bool = False) -> float:
+    """Write rows with the current Output."""
+    start = time.perf_counter()
+    with neo4j.Output(directory, compress) as output:
+        for commit, parent, author in commits:
+            output.commit(commit)
+            output.general_relation(parent)
+            output.contribute_relation(author)
+    return time.perf_counter() - start
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--rows', type=int, default=300000,
+        help='Number of rows to write. A third of them are commits.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    commits = make_commits(args.rows // 3, args.seed)
+    rows = 3 * len(commits)
+    results = {
+        'rows': rows,
+        'compressor': find_gzip_program() or 'gzip module',
+        'runs': [],
+    }
+    outputs = set()
+    for name, run in [
+            ('dict', run_dict),
+            ('positional', run_positional),
+            ('positional_gzip', partial(run_positional, compress=True))]:
+        with tempfile.TemporaryDirectory() as directory:
+            seconds = run(directory, commits)
+            path = os.path.join(directory, 'commits.csv')
+            if os.path.exists(path):
+                with open(path, 'rb') as csv_file:
+                    outputs.add(hash(csv_file.read()))
+            else:
+                with gzip.open(path + '.gz', 'rb') as csv_file:
+                    outputs.add(hash(csv_file.read()))
+            size = sum(
+                os.path.getsize(os.path.join(directory, filename))
+                for filename in os.listdir(directory))
+        results['runs'].append({
+            'writer': name,
+            'seconds': round(seconds, 4),
+            'rows_per_second': round(rows / seconds, 1),
+            'bytes_written': size,
+        })
+    if len(outputs) != 1:
+        sys.exit('Writers produced different output')
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
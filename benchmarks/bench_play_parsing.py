@@ -0,0 +1,76 @@
+"""Compare decoders for parsing Google Play details.
+
+Generates a corpus of synthetic details files and runs
+util.parse.parse_google_play_info on all of them, decoding with json from
+the standard library and, if it is installed, with orjson. Reports wall
+time and peak memory allocated while parsing.
+
+Usage:
+    python -m benchmarks.bench_play_parsing --packages 2000
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixtures import package_names, write_play_details_dir
+from util import parse
+
+
+def run(details_dir: str, names: list, decoder: str) -> dict:
+    """Parse details of all packages and measure time and memory."""
+    start = time.perf_counter()
+    for package_name in names:
+        parse.parse_google_play_info(package_name, details_dir)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    for package_name in names[:200]:
+        parse.parse_google_play_info(package_name, details_dir)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'decoder': decoder,
+        'packages': len(names),
+        'seconds': round(seconds, 4),
+        'packages_per_second': round(len(names) / seconds, 1),
+        'peak_traced_bytes': peak,
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--packages', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    orjson = parse.orjson
+    with tempfile.TemporaryDirectory() as details_dir:
+        write_play_details_dir(details_dir, args.packages, args.seed)
+        names = list(package_names(args.packages, args.seed))
+        runs = []
+        try:
+            parse.orjson = None
+            expected = [
+                parse.parse_google_play_info(name, details_dir)
+                for name in names[:100]]
+            runs.append(run(details_dir, names, 'json'))
+            if orjson:
+                parse.orjson = orjson
+                if expected != [
+                        parse.parse_google_play_info(name, details_dir)
+                        for name in names[:100]]:
+                    sys.exit('Decoders disagree')
+                runs.append(run(details_dir, names, 'orjson'))
+        finally:
+            parse.orjson = orjson
+    json.dump({'runs': runs}, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Measure cold start of gh_android_apps.py.
+
+Runs the script in new interpreter processes with --help and with --help of
+each sub-command. Reports wall time and the number of modules imported,
+counted with python -X importtime. An interpreter doing nothing is measured
+as baseline. Commands exiting with an error, e.g. because a sub-command
+misses a dependency, are reported as failed without timings.
+
+Usage:
+    python -m benchmarks.bench_startup --repeat 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import gh_android_apps
+
+
+SCRIPT = os.path.abspath(gh_android_apps.__file__)
+
+
+def count_imports(command: list) -> int:
+    """Count modules imported by command, a Python interpreter call."""
+    process = subprocess.run(
+        command[:1] + ['-X', 'importtime'] + command[1:],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    return sum(
+        1 for line in process.stderr.splitlines()
+        if line.startswith('import time:') and '|' in line
+        and not line.rstrip().endswith('imported package'))
+
+
+def run(name: str, command: list, repeat: int) -> dict:
+    """Run command repeat times and measure wall time.
+
+    Stops at the first run exiting with an error and reports the last line
+    it wrote to stderr instead of timings.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run(
+            command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        seconds.append(time.perf_counter() - start)
+        if process.returncode != 0:
+            lines = process.stderr.strip().splitlines()
+            return {
+                'command': name,
+                'returncode': process.returncode,
+                'failed': True,
+                'error': lines[-1] if lines else '',
+            }
+    return {
+        'command': name,
+        'returncode': 0,
+        'failed': False,
+        'median_seconds': round(statistics.median(seconds), 4),
+        'min_seconds': round(min(seconds), 4),
+        'modules_imported': count_imports(command),
+    }
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [
+        run('python -c pass', [sys.executable, '-c', 'pass'], args.repeat),
+        run('--help', [sys.executable, SCRIPT, '--help'], args.repeat),
+    ]
+    for command in gh_android_apps.SUB_COMMANDS:
+        runs.append(run(
+            '{} --help'.format(command),
+            [sys.executable, SCRIPT, command, '--help'], args.repeat))
+    json.dump({'python': sys.version.split()[0], 'runs': runs}, sys.stdout,
+              indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,573 @@
+"""Local stand-in for the Github API v3 serving synthetic repositories.
+
+Serves the endpoints used by RateLimitedGitHub and its subclasses:
+
+- /rate_limit
+- /repos/<owner>/<name> and /repositories/<id>
+- /repos/<owner>/<name>/commits, paginated with Link headers
+- /repos/<owner>/<name>/contents/<path>
+- /search/code with qualifier repo:<owner>/<name>
+
+Responses carry X-RateLimit-* headers. Requests are counted per token and
+resource ('core' or 'search'). Requests beyond the limit are answered with
+status 403 until the window resets. Optionally, every n-th request triggers
+abuse detection, i.e. status 403 with a Retry-After header. Renamed
+repositories redirect from their old name, and searching them by their old
+name fails with status 422 like on Github.
+
+Usage:
+    python -m benchmarks.fake_github --repos 1000 --port 8080
+    GITHUB_API_URL=http://localhost:8080 python gh_android_apps.py ...
+"""
+
+import argparse
+import base64
+from collections import Counter
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import math
+import re
+import sys
+import threading
+import time
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from benchmarks.fixtures import WORDS, github_repos
+
+
+__log__ = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 8080
+DEFAULT_CORE_LIMIT = 5000
+DEFAULT_CORE_WINDOW = 3600
+DEFAULT_SEARCH_LIMIT = 30
+DEFAULT_SEARCH_WINDOW = 60
+DEFAULT_RETRY_AFTER = 1
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+DOCUMENTATION_URL = 'https://developer.github.com/v3'
+
+CORE_RESOURCE = 'core'
+SEARCH_RESOURCE = 'search'
+
+REPO_PATH_PATTERN = re.compile(
+    r'^/(?:repos/(?P<owner>[^/]+)/(?P<name>[^/]+)'
+    r'|repositories/(?P<id>\d+))(?P<rest>/.*)?$')
+
+
+class RateLimits(object):
+    """Requests remaining per token and resource in the current window.
+
+    :param Dict[str, Tuple[int, int]] limits:
+        Mapping from resource to number of requests and length of window in
+        seconds.
+    """
+    def __init__(self, limits: Dict[str, Tuple[int, int]]):
+        self.limits = limits
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _window(self, token: str, resource: str) -> list:
+        limit, seconds = self.limits[resource]
+        now = time.time()
+        window = self._windows.get((token, resource))
+        if window is None or window[1] <= now:
+            window = [limit, int(now) + seconds]
+            self._windows[token, resource] = window
+        return window
+
+    def status(self, token: str, resource: str) -> dict:
+        """Get limit, remaining requests, and reset time of resource."""
+        with self._lock:
+            remaining, reset = self._window(token, resource)
+        return {
+            'limit': self.limits[resource][0],
+            'remaining': remaining,
+            'reset': reset,
+        }
+
+    def consume(self, token: str, resource: str) -> bool:
+        """Count a request.
+
+        :returns bool:
+            False if no requests remain in the current window.
+        """
+        with self._lock:
+            window = self._window(token, resource)
+            if window[0] < 1:
+                return False
+            window[0] -= 1
+            return True
+
+
+class FakeGitHub(object):
+    """Repositories, rate limits, and statistics of the stand-in server.
+
+    Instances can be shared between threads.
+
+    :param list repos:
+        Repositories as created by benchmarks.fixtures.github_repos().
+    :param RateLimits rate_limits:
+        Limits of requests per token.
+    :param float latency:
+        Seconds to wait before answering a request.
+    :param int abuse_every:
+        Answer every n-th request with status 403 and a Retry-After header.
+        0 disables abuse detection.
+    :param int retry_after:
+        Seconds to send in Retry-After header.
+    """
+    def __init__(
+            self, repos: list, rate_limits: RateLimits = None,
+            latency: float = 0.0, abuse_every: int = 0,
+            retry_after: int = DEFAULT_RETRY_AFTER):
+        self.repos_by_name = {
+            repo['full_name'].lower(): repo for repo in repos}
+        self.repos_by_old_name = {
+            repo['old_name'].lower(): repo for repo in repos
+            if repo['old_name']}
+        self.repos_by_id = {repo['id']: repo for repo in repos}
+        self.rate_limits = rate_limits or RateLimits({
+            CORE_RESOURCE: (DEFAULT_CORE_LIMIT, DEFAULT_CORE_WINDOW),
+            SEARCH_RESOURCE: (DEFAULT_SEARCH_LIMIT, DEFAULT_SEARCH_WINDOW)})
+        self.latency = latency
+        self.abuse_every = abuse_every
+        self.retry_after = retry_after
+        self.requests = Counter()
+        self._requests_lock = threading.Lock()
+
+    def statistics(self) -> dict:
+        """Count requests by endpoint and by status."""
+        with self._requests_lock:
+            requests = dict(self.requests)
+        by_endpoint = Counter()
+        by_status = Counter()
+        for (endpoint, status), count in requests.items():
+            by_endpoint[endpoint] += count
+            by_status[str(status)] += count
+        return {
+            'requests': sum(requests.values()),
+            'by_endpoint': dict(by_endpoint),
+            'by_status': dict(by_status),
+        }
+
+    def handle(self, path: str, token: str, base_url: str) -> tuple:
+        """Answer a GET request.
+
+        :param str path:
+            Path and query of the request.
+        :param str token:
+            Authentication token or None.
+        :param str base_url:
+            URL of this server to use in links.
+        :returns tuple:
+            Status, headers, and JSON body of the response.
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(path)
+        query = dict(parse_qsl(url.query))
+        endpoint, handler = self._route(url.path)
+        resource = (
+            SEARCH_RESOURCE if endpoint.startswith('search')
+            else CORE_RESOURCE)
+        if endpoint == 'rate_limit':
+            status, headers, body = self._rate_limit(token)
+        elif self._triggers_abuse_detection():
+            status, headers, body = 403, {
+                'Retry-After': str(self.retry_after)}, {
+                    'message': 'You have triggered an abuse detection '
+                               'mechanism. Please wait a few minutes before '
+                               'you try again.',
+                    'documentation_url': DOCUMENTATION_URL}
+        elif not self.rate_limits.consume(token, resource):
+            status, headers, body = 403, {}, {
+                'message': 'API rate limit exceeded.',
+                'documentation_url': DOCUMENTATION_URL}
+        else:
+            status, headers, body = handler(url.path, query, base_url)
+        rate_limit = self.rate_limits.status(token, resource)
+        headers.update({
+            'X-RateLimit-Limit': str(rate_limit['limit']),
+            'X-RateLimit-Remaining': str(rate_limit['remaining']),
+            'X-RateLimit-Reset': str(rate_limit['reset']),
+        })
+        with self._requests_lock:
+            self.requests[endpoint, status] += 1
+        return status, headers, body
+
+    def _triggers_abuse_detection(self) -> bool:
+        if not self.abuse_every:
+            return False
+        with self._requests_lock:
+            count = sum(self.requests.values()) + 1
+        return count % self.abuse_every == 0
+
+    def _route(self, path: str) -> tuple:
+        if path == '/rate_limit':
+            return 'rate_limit', None
+        if path == '/search/code':
+            return 'search/code', self._search_code
+        match = REPO_PATH_PATTERN.match(path)
+        if match:
+            rest = match.group('rest') or ''
+            if not rest:
+                return 'repo', self._repo
+            if rest == '/commits':
+                return 'commits', self._commits
+            if rest.startswith('/contents/'):
+                return 'contents', self._contents
+        return 'unknown', self._not_found
+
+    @staticmethod
+    def _not_found(*_) -> tuple:
+        return 404, {}, {
+            'message': 'Not Found', 'documentation_url': DOCUMENTATION_URL}
+
+    def _rate_limit(self, token: str) -> tuple:
+        resources = {
+            resource: self.rate_limits.status(token, resource)
+            for resource in self.rate_limits.limits}
+        return 200, {}, {
+            'resources': resources, 'rate': resources[CORE_RESOURCE]}
+
+    def _find_repo(self, path: str, base_url: str) -> tuple:
+        """Find repository addressed by path.
+
+        :returns tuple:
+            The repository and None, or None and a response: a redirect if
+            the repository has been renamed or 404 if it is unknown.
+        """
+        match = REPO_PATH_PATTERN.match(path)
+        if match.group('id'):
+            repo = self.repos_by_id.get(int(match.group('id')))
+            return (repo, None) if repo else (None, self._not_found())
+        full_name = '{}/{}'.format(
+            match.group('owner'), match.group('name')).lower()
+        repo = self.repos_by_name.get(full_name)
+        if repo:
+            return repo, None
+        repo = self.repos_by_old_name.get(full_name)
+        if repo:
+            location = '{}/repositories/{}{}'.format(
+                base_url, repo['id'], match.group('rest') or '')
+            return None, (301, {'Location': location}, {
+                'message': 'Moved Permanently', 'url': location,
+                'documentation_url': DOCUMENTATION_URL})
+        return None, self._not_found()
+
+    @staticmethod
+    def _repo_json(repo: dict, base_url: str) -> dict:
+        owner, name = repo['full_name'].split('/')
+        url = '{}/repos/{}'.format(base_url, repo['full_name'])
+        owner_id = int(hashlib.sha1(owner.encode()).hexdigest()[:7], 16)
+        data = {
+            'id': repo['id'],
+            'name': name,
+            'full_name': repo['full_name'],
+            'owner': {
+                'login': owner,
+                'id': owner_id,
+                'type': 'User' if owner_id % 4 else 'Organization',
+                'url': '{}/users/{}'.format(base_url, owner),
+            },
+            'private': False,
+            'html_url': 'https://github.com/{}'.format(repo['full_name']),
+            'description': repo['description'],
+            'fork': repo['fork'],
+            'url': url,
+            'created_at': repo['created_at'],
+            'updated_at': '2018-03-01T10:00:00Z',
+            'pushed_at': '2018-02-28T10:00:00Z',
+            'homepage': None,
+            'size': 10 * repo['commit_count'],
+            'stargazers_count': repo['stargazers_count'],
+            'watchers_count': repo['stargazers_count'],
+            'language': 'Java',
+            'has_issues': True,
+            'has_projects': True,
+            'has_downloads': True,
+            'has_wiki': True,
+            'has_pages': False,
+            'forks_count': repo['forks_count'],
+            'archived': False,
+            'open_issues_count': 0,
+            'forks': repo['forks_count'],
+            'open_issues': 0,
+            'watchers': repo['stargazers_count'],
+            'default_branch': 'master',
+            'network_count': repo['network_count'],
+            'subscribers_count': repo['subscribers_count'],
+        }
+        if repo['fork']:
+            parent = {
+                'id': repo['id'] + 1000000,
+                'full_name': 'upstream/{}'.format(name),
+                'url': '{}/repos/upstream/{}'.format(base_url, name),
+            }
+            data['parent'] = parent
+            data['source'] = parent
+        return data
+
+    def _repo(self, path: str, _, base_url: str) -> tuple:
+        repo, response = self._find_repo(path, base_url)
+        if response:
+            return response
+        return 200, {}, self._repo_json(repo, base_url)
+
+    @staticmethod
+    def _page(
+            items_count: int, query: dict, base_url: str, path: str) -> tuple:
+        """Select items of page requested in query.
+
+        :returns tuple:
+            Range of items on page and Link header.
+        """
+        per_page = min(
+            int(query.get('per_page', DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = max(int(query.get('page', 1)), 1)
+        last_page = max(math.ceil(items_count / per_page), 1)
+
+        def _link(number, rel):
+            return '<{}{}?{}>; rel="{}"'.format(
+                base_url, path,
+                urlencode(dict(query, page=number, per_page=per_page)), rel)
+
+        links = []
+        if page < last_page:
+            links += [_link(page + 1, 'next'), _link(last_page, 'last')]
+        if page > 1:
+            links += [_link(1, 'first'), _link(page - 1, 'prev')]
+        headers = {'Link': ', '.join(links)} if links else {}
+        start = (page - 1) * per_page
+        return range(start, min(start + per_page, items_count)), headers
+
+    def _commits(self, path: str, query: dict, base_url: str) -> tuple:
+        repo, response = self._find_repo(path, base_url)
+        if response:
+            return response
+        if not repo['commit_count']:
+            return 409, {}, {
+                'message': 'Git Repository is empty.',
+                'documentation_url': DOCUMENTATION_URL}
+        indexes, headers = self._page(
+            repo['commit_count'], query, base_url, path)
+        url = '{}/repos/{}'.format(base_url, repo['full_name'])
+        commits = []
+        for index in indexes:
+            sha = hashlib.sha1('{}:{}'.format(
+                repo['full_name'], index).encode()).hexdigest()
+            person = {
+                'name': WORDS[index % len(WORDS)],
+                'email': '{}@example.com'.format(WORDS[index % len(WORDS)]),
+                'date': '2018-01-01T00:00:00Z',
+            }
+            commits.append({
+                'sha': sha,
+                'url': '{}/commits/{}'.format(url, sha),
+                'html_url': 'https://github.com/{}/commit/{}'.format(
+                    repo['full_name'], sha),
+                'commit': {
+                    'author': person,
+                    'committer': person,
+                    'message': 'Commit {}'.format(index),
+                    'tree': {'sha': sha, 'url': '{}/git/trees/{}'.format(
+                        url, sha)},
+                    'url': '{}/git/commits/{}'.format(url, sha),
+                    'comment_count': 0,
+                },
+                'author': None,
+                'committer': None,
+                'parents': [],
+            })
+        return 200, headers, commits
+
+    def _contents(self, path: str, _, base_url: str) -> tuple:
+        repo, response = self._find_repo(path, base_url)
+        if response:
+            return response
+        file_path = REPO_PATH_PATTERN.match(path).group('rest')[
+            len('/contents/'):]
+        content = repo['files'].get(file_path)
+        if content is None:
+            return self._not_found()
+        url = '{}/repos/{}/contents/{}'.format(
+            base_url, repo['full_name'], file_path)
+        html_url = 'https://github.com/{}/blob/master/{}'.format(
+            repo['full_name'], file_path)
+        sha = hashlib.sha1(content.encode()).hexdigest()
+        git_url = '{}/repos/{}/git/blobs/{}'.format(
+            base_url, repo['full_name'], sha)
+        return 200, {}, {
+            'type': 'file',
+            'encoding': 'base64',
+            'size': len(content.encode()),
+            'name': file_path.rsplit('/', 1)[-1],
+            'path': file_path,
+            'content': base64.encodebytes(content.encode()).decode(),
+            'sha': sha,
+            'url': url,
+            'git_url': git_url,
+            'html_url': html_url,
+            'download_url': None,
+            '_links': {'self': url, 'git': git_url, 'html': html_url},
+        }
+
+    def _search_code(self, path: str, query: dict, base_url: str) -> tuple:
+        terms = query.get('q', '').split()
+        repo_names = [
+            term[len('repo:'):].lower() for term in terms
+            if term.startswith('repo:')]
+        words = [
+            term for term in terms
+            if ':' not in term and term not in ('OR', 'AND', 'NOT')]
+        repos = [self.repos_by_name.get(name) for name in repo_names]
+        if not repos or not all(repos):
+            return 422, {}, {
+                'message': 'Validation Failed',
+                'errors': [{
+                    'message': 'The listed users and repositories cannot be '
+                               'searched either because the resources do '
+                               'not exist or you do not have permission to '
+                               'view them.',
+                    'resource': 'Search', 'field': 'q', 'code': 'invalid'}],
+                'documentation_url': DOCUMENTATION_URL}
+        matches = [
+            (repo, file_path) for repo in repos
+            for file_path in sorted(repo['files'])
+            if not words or any(word in file_path for word in words)]
+        indexes, headers = self._page(
+            len(matches), query, base_url, path)
+        items = []
+        for repo, file_path in (matches[index] for index in indexes):
+            sha = hashlib.sha1(repo['files'][file_path].encode()).hexdigest()
+            items.append({
+                'name': file_path.rsplit('/', 1)[-1],
+                'path': file_path,
+                'sha': sha,
+                'url': '{}/repos/{}/contents/{}'.format(
+                    base_url, repo['full_name'], file_path),
+                'git_url': '{}/repos/{}/git/blobs/{}'.format(
+                    base_url, repo['full_name'], sha),
+                'html_url': 'https://github.com/{}/blob/master/{}'.format(
+                    repo['full_name'], file_path),
+                'repository': self._repo_json(repo, base_url),
+                'score': 1.0,
+            })
+        return 200, headers, {
+            'total_count': len(matches), 'incomplete_results': False,
+            'items': items}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Pass requests to FakeGitHub of server."""
+    # Keep connections alive like Github does
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer GET request."""
+        authorization = self.headers.get('Authorization', '')
+        token = authorization.split()[-1] if authorization else None
+        status, headers, body = self.server.fake.handle(
+            self.path, token, self.server.base_url)
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        __log__.debug(format, *args)
+
+
+def start_server(
+        fake, host: str = DEFAULT_HOST, port: int = 0,
+        handler_class: type = _RequestHandler) -> ThreadingHTTPServer:
+    """Serve a stand-in API in a background thread.
+
+    :param int port:
+        Port to listen on. 0 picks a free port.
+    :param type handler_class:
+        Request handler passing requests to the attribute fake of the
+        server. Default: Handler of GET requests of the Github API.
+    :returns ThreadingHTTPServer:
+        The running server. Its attribute base_url is the URL of the server.
+        Call shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), handler_class)
+    server.daemon_threads = True
+    server.fake = fake
+    server.base_url = 'http://{}:{}'.format(host, server.server_address[1])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    __log__.info('Serve %s at %s', type(fake).__name__, server.base_url)
+    return server
+
+
+def generate_repo_names(n_repos: int, seed: int = 0) -> list:
+    """Create names of repositories for a standalone server."""
+    return [
+        '{}{}/repo{}'.format(
+            WORDS[index % len(WORDS)], (index + seed) % 97, index)
+        for index in range(n_repos)]
+
+
+def main():
+    """Run server until interrupted and print statistics."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--repos', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--fixture', type=argparse.FileType('r'), default=None,
+        help='''JSON file with a list of repositories as created by
+            benchmarks.fixtures.github_repos(). Default: --repos generated
+            repositories.''')
+    parser.add_argument(
+        '--core-limit', type=int, default=DEFAULT_CORE_LIMIT)
+    parser.add_argument(
+        '--core-window', type=int, default=DEFAULT_CORE_WINDOW)
+    parser.add_argument(
+        '--search-limit', type=int, default=DEFAULT_SEARCH_LIMIT)
+    parser.add_argument(
+        '--search-window', type=int, default=DEFAULT_SEARCH_WINDOW)
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds to wait before answering a request.')
+    parser.add_argument(
+        '--abuse-every', type=int, default=0,
+        help='Trigger abuse detection every n-th request.')
+    parser.add_argument(
+        '--retry-after', type=int, default=DEFAULT_RETRY_AFTER)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.fixture:
+        repos = json.load(args.fixture)
+    else:
+        repos = github_repos(generate_repo_names(args.repos, args.seed),
+                             args.seed)
+    fake_github = FakeGitHub(
+        repos, RateLimits({
+            CORE_RESOURCE: (args.core_limit, args.core_window),
+            SEARCH_RESOURCE: (args.search_limit, args.search_window)}),
+        args.latency, args.abuse_every, args.retry_after)
+    server = start_server(fake_github, args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    json.dump(fake_github.statistics(), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
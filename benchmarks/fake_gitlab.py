@@ -0,0 +1,470 @@
+"""Local stand-in for the Gitlab API v4 backed by bare Git repositories.
+
+Every repository <name>.git in a directory is served as project <name> in
+namespace gitlab. Projects get IDs in alphabetical order of their names,
+starting at 1. Serves the endpoints used by subcommands store_repo_data and
+mirror_empty_repos:
+
+- GET /api/v4/projects/<id or namespace%2Fname>
+- GET /api/v4/projects/<id>/repository/branches, paginated
+- GET /api/v4/projects/<id>/repository/tags, paginated
+- POST /api/v4/projects
+- DELETE /api/v4/projects/<id>
+
+Created projects use the repository <name>.git if it exists. Otherwise an
+import_url naming a local repository is cloned and any other URL results in
+an empty repository. Deleting a project removes it from the API only and
+keeps its repository on disk.
+
+Latency of Gitlab can be simulated by waiting a fixed and a random number
+of seconds before answering a request.
+
+Usage:
+    python -m benchmarks.fake_gitlab REPOS_DIR --port 8081 --latency 0.05
+    python gh_android_apps.py store_repo_data --gitlab-host \\
+        http://localhost:8081 --gitlab-repos-dir REPOS_DIR OUTDIR LIST
+    python -m benchmarks.bench_gitlab_client --repos 50 --latency 0.05
+"""
+
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler
+import json
+import logging
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import parse_qsl, unquote, urlencode, urlsplit
+
+from benchmarks.fake_github import start_server
+from benchmarks.fixtures import GIT
+
+
+__log__ = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = 'localhost'
+DEFAULT_PORT = 8081
+DEFAULT_NAMESPACE = 'gitlab'
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+API_PREFIX = '/api/v4'
+# Fields of refs read with git for-each-ref
+REF_FORMAT = '%00'.join([
+    '%(refname)', '%(objectname)', '%(*objectname)', '%(subject)',
+    '%(*subject)', '%(contents)', '%(committerdate:iso-strict)',
+    '%(*committerdate:iso-strict)']) + '%00'
+REF_FIELDS = 8
+
+
+def _not_found(what: str = '') -> tuple:
+    return 404, {}, {'message': '404 {}Not Found'.format(
+        what + ' ' if what else '')}
+
+
+class FakeGitlab(object):
+    """Projects and statistics of the stand-in server.
+
+    Instances can be shared between threads.
+
+    :param str repos_dir:
+        Directory containing bare Git repositories <name>.git.
+    :param str namespace:
+        Namespace of all projects.
+    :param str private_token:
+        Token required in header PRIVATE-TOKEN. None allows all requests.
+    :param float latency:
+        Seconds to wait before answering a request.
+    :param float jitter:
+        Maximum of additional random seconds to wait.
+    :param int seed:
+        Seed of random waiting times.
+    """
+    def __init__(
+            self, repos_dir: str, namespace: str = DEFAULT_NAMESPACE,
+            private_token: str = None, latency: float = 0.0,
+            jitter: float = 0.0, seed: int = 0):
+        self.repos_dir = repos_dir
+        self.namespace = namespace
+        self.private_token = private_token
+        self.latency = latency
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.projects = {}
+        # IDs are never reused as cached refs are stored by ID
+        self._next_id = 1
+        self._refs = {}
+        self.requests = Counter()
+        paths = sorted(
+            file_name[:-len('.git')] for file_name in os.listdir(repos_dir)
+            if file_name.endswith('.git'))
+        for path in paths:
+            self._add_project(path, None)
+
+    def _add_project(self, path: str, import_url: str) -> dict:
+        """Register project with repository <path>.git. Lock is held."""
+        project_id = self._next_id
+        self._next_id += 1
+        git_dir = os.path.join(self.repos_dir, '{}.git'.format(path))
+        self.projects[project_id] = {
+            'id': project_id,
+            'path': path,
+            'git_dir': git_dir,
+            'import_url': import_url,
+            'created_at': datetime.fromtimestamp(
+                os.stat(git_dir).st_mtime, timezone.utc).strftime(
+                    '%Y-%m-%dT%H:%M:%S.000Z'),
+        }
+        return self.projects[project_id]
+
+    def statistics(self) -> dict:
+        """Count requests by endpoint and by status."""
+        with self._lock:
+            requests = dict(self.requests)
+        by_endpoint = Counter()
+        by_status = Counter()
+        for (endpoint, status), count in requests.items():
+            by_endpoint[endpoint] += count
+            by_status[str(status)] += count
+        return {
+            'requests': sum(requests.values()),
+            'by_endpoint': dict(by_endpoint),
+            'by_status': dict(by_status),
+        }
+
+    def handle(
+            self, method: str, path: str, private_token: str, body: dict,
+            base_url: str) -> tuple:
+        """Answer a request.
+
+        :param str method:
+            HTTP method.
+        :param str path:
+            Path and query of the request.
+        :param str private_token:
+            Value of header PRIVATE-TOKEN or None.
+        :param dict body:
+            JSON or form data of request.
+        :param str base_url:
+            URL of this server to use in links.
+        :returns tuple:
+            Status, headers, and JSON body of the response.
+        """
+        with self._lock:
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        url = urlsplit(path)
+        query = dict(parse_qsl(url.query))
+        parts = [unquote(part) for part in url.path.split('/')]
+        endpoint = '{} {}'.format(method, '/'.join(
+            ':id' if index == 4 else part
+            for index, part in enumerate(parts[3:], 3)))
+        if self.private_token and private_token != self.private_token:
+            response = 401, {}, {'message': '401 Unauthorized'}
+        elif url.path == API_PREFIX + '/projects' and method == 'POST':
+            response = self._create_project(body, base_url)
+        elif url.path.startswith(API_PREFIX + '/projects/'):
+            response = self._project_request(
+                method, parts[4:], query, url.path, base_url)
+        else:
+            response = _not_found()
+        with self._lock:
+            self.requests[endpoint, response[0]] += 1
+        return response
+
+    def _find_project(self, project_id: str) -> dict:
+        with self._lock:
+            if project_id.isdigit():
+                return self.projects.get(int(project_id))
+            for project in self.projects.values():
+                if project_id == '{}/{}'.format(
+                        self.namespace, project['path']):
+                    return project
+        return None
+
+    def _project_request(
+            self, method: str, parts: list, query: dict, path: str,
+            base_url: str) -> tuple:
+        project = self._find_project(parts[0])
+        if project is None:
+            return _not_found('Project')
+        rest = parts[1:]
+        if method == 'GET' and not rest:
+            return 200, {}, self._project_json(project, base_url)
+        if method == 'DELETE' and not rest:
+            with self._lock:
+                del self.projects[project['id']]
+                self._refs.pop(project['id'], None)
+            return 202, {}, {'message': '202 Accepted'}
+        if method == 'GET' and rest == ['repository', 'branches']:
+            branches, _ = self._read_refs(project)
+            return self._page(branches, query, path, base_url)
+        if method == 'GET' and rest == ['repository', 'tags']:
+            _, tags = self._read_refs(project)
+            return self._page(tags, query, path, base_url)
+        return _not_found()
+
+    def _create_project(self, data: dict, base_url: str) -> tuple:
+        name = data.get('name') or data.get('path')
+        if not name:
+            return 400, {}, {'message': {'name': ["can't be blank"]}}
+        path = data.get('path') or name
+        git_dir = os.path.join(self.repos_dir, '{}.git'.format(path))
+        import_url = data.get('import_url')
+        # Repositories of existing projects exist, too, and are kept
+        if os.path.exists(git_dir):
+            pass
+        elif import_url and os.path.isdir(import_url):
+            subprocess.run(
+                [GIT, 'clone', '--quiet', '--mirror', import_url, git_dir],
+                check=True)
+        else:
+            subprocess.run(
+                [GIT, 'init', '--quiet', '--bare', git_dir], check=True)
+        with self._lock:
+            if any(project['path'] == path
+                   for project in self.projects.values()):
+                return 400, {}, {'message': {
+                    'name': ['has already been taken'],
+                    'path': ['has already been taken']}}
+            project = self._add_project(path, import_url)
+        return 201, {}, dict(
+            self._project_json(project, base_url), name=name)
+
+    def _project_json(self, project: dict, base_url: str) -> dict:
+        path_with_namespace = '{}/{}'.format(self.namespace, project['path'])
+        web_url = '{}/{}'.format(base_url, path_with_namespace)
+        return {
+            'id': project['id'],
+            'description': '',
+            'name': project['path'],
+            'name_with_namespace': '{} / {}'.format(
+                self.namespace, project['path']),
+            'path': project['path'],
+            'path_with_namespace': path_with_namespace,
+            'created_at': project['created_at'],
+            'last_activity_at': project['created_at'],
+            'default_branch': self._default_branch(project),
+            'tag_list': [],
+            'ssh_url_to_repo': 'git@{}:{}.git'.format(
+                urlsplit(base_url).hostname, path_with_namespace),
+            'http_url_to_repo': '{}.git'.format(web_url),
+            'web_url': web_url,
+            'visibility': 'public',
+            'archived': False,
+            'namespace': {
+                'id': 1, 'name': self.namespace, 'path': self.namespace,
+                'kind': 'user', 'full_path': self.namespace},
+            'import_status': 'finished' if project['import_url'] else 'none',
+            'star_count': 0,
+            'forks_count': 0,
+        }
+
+    @staticmethod
+    def _default_branch(project: dict) -> str:
+        """Get branch HEAD points to or None if repository is empty."""
+        process = subprocess.run(
+            [GIT, '--git-dir', project['git_dir'], 'symbolic-ref', '--short',
+             '-q', 'HEAD'],
+            stdout=subprocess.PIPE, universal_newlines=True)
+        branch = process.stdout.strip()
+        verified = subprocess.run(
+            [GIT, '--git-dir', project['git_dir'], 'rev-parse', '--verify',
+             '-q', 'refs/heads/{}'.format(branch)],
+            stdout=subprocess.DEVNULL)
+        return branch if branch and not verified.returncode else None
+
+    def _read_refs(self, project: dict) -> tuple:
+        """Read branches and tags of project in JSON format of Gitlab.
+
+        Refs are read once per project.
+        """
+        with self._lock:
+            refs = self._refs.get(project['id'])
+        if refs is not None:
+            return refs
+        output = subprocess.run(
+            [GIT, '--git-dir', project['git_dir'], 'for-each-ref',
+             '--format={}'.format(REF_FORMAT), 'refs/heads', 'refs/tags'],
+            stdout=subprocess.PIPE, check=True).stdout.decode(
+                errors='replace')
+        fields = output.split('\0')
+        branches = []
+        tags = []
+        for start in range(0, len(fields) - 1, REF_FIELDS):
+            (refname, objectname, commit_id, subject, commit_subject,
+             contents, date, commit_date) = fields[start:start + REF_FIELDS]
+            refname = refname.lstrip('\n')
+            if refname.startswith('refs/heads/'):
+                branches.append({
+                    'name': refname[len('refs/heads/'):],
+                    'commit': self._commit_json(objectname, subject, date),
+                    'merged': False,
+                    'protected': False,
+                    'developers_can_push': False,
+                    'developers_can_merge': False,
+                })
+            elif commit_id:  # Annotated tag
+                tags.append({
+                    'name': refname[len('refs/tags/'):],
+                    'message': contents.rstrip('\n'),
+                    'commit': self._commit_json(
+                        commit_id, commit_subject, commit_date),
+                    'release': None,
+                })
+            else:
+                tags.append({
+                    'name': refname[len('refs/tags/'):],
+                    'message': None,
+                    'commit': self._commit_json(objectname, subject, date),
+                    'release': None,
+                })
+        refs = branches, tags
+        with self._lock:
+            self._refs[project['id']] = refs
+        return refs
+
+    @staticmethod
+    def _commit_json(commit_id: str, title: str, date: str) -> dict:
+        return {
+            'id': commit_id,
+            'short_id': commit_id[:8],
+            'title': title,
+            'message': title,
+            'committed_date': date,
+            'authored_date': date,
+            'parent_ids': None,
+        }
+
+    @staticmethod
+    def _page(items: list, query: dict, path: str, base_url: str) -> tuple:
+        """Select items of page requested in query."""
+        per_page = min(
+            int(query.get('per_page', DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = max(int(query.get('page', 1)), 1)
+        last_page = max(math.ceil(len(items) / per_page), 1)
+
+        def _link(number, rel):
+            return '<{}{}?{}>; rel="{}"'.format(
+                base_url, path,
+                urlencode(dict(query, page=number, per_page=per_page)), rel)
+
+        links = [_link(1, 'first'), _link(last_page, 'last')]
+        headers = {
+            'X-Page': str(page),
+            'X-Per-Page': str(per_page),
+            'X-Total': str(len(items)),
+            'X-Total-Pages': str(last_page),
+            'X-Next-Page': str(page + 1) if page < last_page else '',
+            'X-Prev-Page': str(page - 1) if page > 1 else '',
+        }
+        if page < last_page:
+            links.append(_link(page + 1, 'next'))
+        if page > 1:
+            links.append(_link(page - 1, 'prev'))
+        headers['Link'] = ', '.join(links)
+        start = (page - 1) * per_page
+        return 200, headers, items[start:start + per_page]
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """Pass requests to FakeGitlab of server."""
+    protocol_version = 'HTTP/1.1'
+
+    def _handle(self, method: str):
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length).decode() if length else ''
+        if not data:
+            body = {}
+        elif self.headers.get('Content-Type', '').startswith(
+                'application/json'):
+            body = json.loads(data)
+        else:
+            body = dict(parse_qsl(data))
+        status, headers, response = self.server.fake.handle(
+            method, self.path, self.headers.get('PRIVATE-TOKEN'), body,
+            self.server.base_url)
+        content = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Answer GET request."""
+        self._handle('GET')
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        """Answer POST request."""
+        self._handle('POST')
+
+    def do_DELETE(self):  # pylint: disable=invalid-name
+        """Answer DELETE request."""
+        self._handle('DELETE')
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        __log__.debug(format, *args)
+
+
+def start_gitlab_server(
+        fake_gitlab: FakeGitlab, host: str = DEFAULT_HOST, port: int = 0):
+    """Serve fake_gitlab in a background thread.
+
+    :returns ThreadingHTTPServer:
+        The running server. Its attribute base_url is the URL to pass to
+        Gitlab(). Call shutdown() to stop it.
+    """
+    return start_server(fake_gitlab, host, port, _RequestHandler)
+
+
+def main():
+    """Run server until interrupted and print statistics."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        'REPOS_DIR', type=str,
+        help='Directory containing bare Git repositories <name>.git.')
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        '--namespace', type=str, default=DEFAULT_NAMESPACE)
+    parser.add_argument(
+        '--token-file', type=str, default=None,
+        help='''File with private token to require in its first line.
+            Default: Allow all requests.''')
+    parser.add_argument(
+        '--latency', type=float, default=0.0,
+        help='Seconds to wait before answering a request.')
+    parser.add_argument(
+        '--jitter', type=float, default=0.0,
+        help='Maximum of additional random seconds to wait.')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    private_token = None
+    if args.token_file:
+        with open(args.token_file) as token_file:
+            private_token = token_file.readline().strip()
+    fake_gitlab = FakeGitlab(
+        args.REPOS_DIR, args.namespace, private_token, args.latency,
+        args.jitter)
+    server = start_gitlab_server(fake_gitlab, args.host, args.port)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+    json.dump(fake_gitlab.statistics(), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,490 @@
+"""Generate synthetic input data for benchmarks.
+
+All fixtures are created locally and deterministically from a seed.
+"""
+
+from contextlib import ExitStack
+import csv
+import json
+import os
+import random
+import re
+import subprocess
+from typing import Iterator
+
+from util.bare_git import CommitRecord, GitHistory
+from util.table_io import write_table
+
+
+GIT = '/usr/bin/git'
+NAMES = [
+    'Jane Doe', 'John Smith', 'Zoë Brontë', 'Łukasz Żółw', '山田太郎',
+    'Renée O\'Connor', 'dependabot[bot]']
+
+WORDS = (
+    'android app open source privacy tracker notes music player offline '
+    'calendar keyboard launcher weather battery widget backup camera map '
+    'secure fast simple free github material design theme dark mode sync'
+).split()
+
+GITHUB_LINK_PATTERN = re.compile(r'https://github\.com/[\w-]+/[\w.-]+')
+
+
+def _text(rng: random.Random, n_words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def play_details(package_name: str, rng: random.Random) -> dict:
+    """Create details of a package resembling output of gp-bulk-details.
+
+    Large parts like descriptions, images, and permissions are included
+    because they dominate size of real files.
+    """
+    return {
+        'docid': package_name,
+        'backendDocid': package_name,
+        'docType': 1,
+        'backendId': 3,
+        'docId': package_name,
+        'title': _text(rng, 3).title(),
+        'creator': _text(rng, 2).title(),
+        'descriptionHtml': '<p>{}</p><br>https://github.com/{}/{}'.format(
+            _text(rng, rng.randint(100, 600)), rng.choice(WORDS),
+            package_name.split('.')[-1]),
+        'translatedDescriptionHtml': '',
+        'promotionalDescription': _text(rng, 12),
+        'offer': [{
+            'micros': '0',
+            'currencyCode': 'USD',
+            'formattedAmount': 'Free',
+            'offerType': 1,
+            'checkoutFlowRequired': False,
+        }],
+        'availability': {'restriction': 1, 'offerType': 1},
+        'image': [
+            {
+                'imageType': rng.randint(1, 4),
+                'dimension': {
+                    'width': rng.randint(100, 2000),
+                    'height': rng.randint(100, 2000)},
+                'imageUrl': 'https://lh3.googleusercontent.com/{}'.format(
+                    ''.join(rng.choice('abcdefXYZ0123-_') for _ in range(80))),
+                'color': '#{:06x}'.format(rng.randint(0, 0xffffff)),
+                'supportsFifeUrlOptions': True,
+            }
+            for _ in range(rng.randint(5, 25))],
+        'details': {
+            'appDetails': {
+                'developerName': _text(rng, 2).title(),
+                'majorVersionNumber': 0,
+                'versionCode': rng.randint(1, 500),
+                'versionString': '{}.{}.{}'.format(
+                    rng.randint(0, 5), rng.randint(0, 20),
+                    rng.randint(0, 99)),
+                'title': _text(rng, 3).title(),
+                'appCategory': [],
+                'contentRating': 1,
+                'installationSize': str(rng.randint(10 ** 5, 10 ** 8)),
+                'permission': [
+                    'android.permission.{}'.format(
+                        rng.choice(WORDS).upper())
+                    for _ in range(rng.randint(0, 30))],
+                'developerEmail': '{}@example.com'.format(rng.choice(WORDS)),
+                'developerWebsite': 'https://example.com',
+                'numDownloads': '{:,}+ downloads'.format(
+                    10 ** rng.randint(1, 7)),
+                'packageName': package_name,
+                'recentChangesHtml': _text(rng, rng.randint(10, 200)),
+                'uploadDate': 'Mar {}, 2018'.format(rng.randint(1, 28)),
+                'file': [
+                    {'fileType': 0, 'versionCode': 1,
+                     'size': str(rng.randint(10 ** 5, 10 ** 8))}],
+                'unstable': False,
+                'hasInstantLink': False,
+                'containsAds': '',
+                'targetSdkVersion': rng.randint(15, 27),
+                'installNotes': rng.choice(['', 'Contains ads']),
+            },
+        },
+        'aggregateRating': {
+            'type': 2,
+            'starRating': round(rng.uniform(1, 5), 2),
+            'ratingsCount': str(rng.randint(0, 10 ** 5)),
+            'oneStarRatings': str(rng.randint(0, 10 ** 3)),
+            'fiveStarRatings': str(rng.randint(0, 10 ** 4)),
+            'commentCount': str(rng.randint(0, 10 ** 4)),
+        },
+        'annotations': {
+            'badgeForDoc': [
+                {'title': _text(rng, 2), 'description': _text(rng, 20)}
+                for _ in range(rng.randint(0, 5))],
+        },
+        'productDetails': {
+            'section': [{
+                'title': 'In-app purchases',
+                'description': [{'description': '$1.99 per item'}],
+            }] if rng.random() < 0.2 else [],
+        },
+        'detailsUrl': 'details?doc={}'.format(package_name),
+        'shareUrl': 'https://play.google.com/store/apps/details?id={}'.format(
+            package_name),
+        'reviewsUrl': 'rev?doc={}&n=20'.format(package_name),
+        'backendUrl': 'https://market.android.com/details?id={}'.format(
+            package_name),
+        'purchaseDetailsUrl': 'purchaseDetails?ww=false&doc={}'.format(
+            package_name),
+        'detailsReusable': True,
+        'subtitle': _text(rng, 4),
+    }
+
+
+def package_names(n_packages: int, seed: int = 0) -> Iterator[str]:
+    """Generate unique package names."""
+    rng = random.Random(seed)
+    for index in range(n_packages):
+        yield 'org.{}.{}{}'.format(
+            rng.choice(WORDS), rng.choice(WORDS), index)
+
+
+def write_play_details_dir(
+        details_dir: str, n_packages: int, seed: int = 0,
+        category_ratio: float = 0.5):
+    """Write a directory of JSON files as created by get_play_data.
+
+    Also writes category files as created by play_category for a share of
+    packages.
+    """
+    rng = random.Random(seed)
+    category_dir = os.path.join(details_dir, 'categories')
+    os.makedirs(category_dir, exist_ok=True)
+    for package_name in package_names(n_packages, seed):
+        path = os.path.join(details_dir, '{}.json'.format(package_name))
+        with open(path, 'w') as json_file:
+            json.dump(play_details(package_name, rng), json_file, indent=2)
+        if rng.random() < category_ratio:
+            path = os.path.join(category_dir, '{}.json'.format(package_name))
+            with open(path, 'w') as json_file:
+                json.dump({
+                    'packageName': package_name,
+                    'appCategory': rng.choice(['Tools', 'Productivity']),
+                }, json_file)
+
+
+def _fast_import_stream(n_commits: int, rng: random.Random) -> Iterator[bytes]:
+    """Generate input for git fast-import with linear history on master.
+
+    Every 50th commit also creates a branch and merges it back.
+    """
+    timestamp = 1300000000
+    for mark in range(1, n_commits + 1):
+        timestamp += rng.randint(60, 86400)
+        author = rng.choice(NAMES)
+        committer = rng.choice(NAMES)
+        message = '{}\n\n{}\n'.format(
+            _text(rng, rng.randint(2, 10)).capitalize(),
+            '\n'.join(
+                _text(rng, rng.randint(5, 12))
+                for _ in range(rng.randint(0, 8))))
+        if rng.random() < 0.05:
+            message += '\n\n    indented code\n\t\ttabs\r\n---\n'
+        message = message.encode()
+        lines = [
+            'commit refs/heads/master',
+            'mark :{}'.format(mark),
+            'author {} <{}@example.com> {} +0{}00'.format(
+                author, author.split()[0].lower(), timestamp,
+                rng.randint(0, 9)),
+            'committer {} <{}@example.com> {} -0{}00'.format(
+                committer, committer.split()[0].lower(), timestamp + 5,
+                rng.randint(0, 9)),
+            'data {}'.format(len(message)),
+        ]
+        yield '\n'.join(lines).encode() + b'\n' + message + b'\n'
+        if mark > 1:
+            yield 'from :{}\n'.format(mark - 1).encode()
+        if mark > 2 and mark % 50 == 0:
+            yield 'merge :{}\n'.format(mark - 2).encode()
+        for _ in range(rng.randint(1, 4)):
+            content = '\n'.join(
+                _text(rng, 8) for _ in range(rng.randint(1, 40))).encode()
+            yield 'M 100644 inline src/{}.txt\ndata {}\n'.format(
+                rng.choice(WORDS), len(content)).encode()
+            yield content + b'\n'
+        if rng.random() < 0.1:
+            yield 'D src/{}.txt\n'.format(rng.choice(WORDS)).encode()
+        yield b'\n'
+
+
+def _fast_import_refs(
+        n_commits: int, n_branches: int, n_tags: int,
+        rng: random.Random) -> Iterator[bytes]:
+    """Generate input for git fast-import creating branches and tags.
+
+    Branches and annotated tags point to random commits of the stream of
+    _fast_import_stream() with n_commits.
+    """
+    for number in range(n_branches):
+        yield 'reset refs/heads/{}-{}\nfrom :{}\n\n'.format(
+            rng.choice(WORDS), number, rng.randint(1, n_commits)).encode()
+    for number in range(n_tags):
+        tagger = rng.choice(NAMES)
+        message = '{}\n'.format(_text(rng, rng.randint(2, 10))).encode()
+        yield '\n'.join([
+            'tag v{}.{}'.format(number // 10, number % 10),
+            'from :{}'.format(rng.randint(1, n_commits)),
+            'tagger {} <{}@example.com> {} +0000'.format(
+                tagger, tagger.split()[0].lower(), 1400000000 + number),
+            'data {}'.format(len(message)),
+        ]).encode() + b'\n' + message + b'\n'
+
+
+def write_git_repo(
+        git_dir: str, n_commits: int, seed: int = 0, n_branches: int = 0,
+        n_tags: int = 0):
+    """Create a bare Git repository with n_commits synthetic commits.
+
+    Commits have multi-line messages, non-ASCII author names, timezone
+    offsets, file changes, and occasional merges. Optionally, n_branches
+    branches besides master and n_tags annotated tags are created.
+    """
+    rng = random.Random(seed)
+    subprocess.run(
+        [GIT, 'init', '--quiet', '--bare', git_dir], check=True)
+    process = subprocess.Popen(
+        [GIT, '--git-dir', git_dir, 'fast-import', '--quiet'],
+        stdin=subprocess.PIPE)
+    for chunk in _fast_import_stream(n_commits, rng):
+        process.stdin.write(chunk)
+    if n_commits:
+        for chunk in _fast_import_refs(
+                n_commits, n_branches, n_tags, random.Random(seed + 1)):
+            process.stdin.write(chunk)
+    process.stdin.close()
+    if process.wait():
+        raise subprocess.CalledProcessError(process.returncode, 'fast-import')
+
+
+def write_package_repos(
+        details_dir: str, path: str, seed: int = 0,
+        unlinked_ratio: float = 0.3):
+    """Write CSV file mapping packages to repositories for match_packages.
+
+    Every package is mapped to the repository its Google Play page links to
+    and to some other repositories. The link is removed from the details of
+    a share of packages, so that their repositories have to be deduplicated
+    by popularity.
+    """
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['package', 'all_repos'])
+        for file_name in sorted(os.listdir(details_dir)):
+            details_path = os.path.join(details_dir, file_name)
+            if not os.path.isfile(details_path):
+                continue
+            with open(details_path) as json_file:
+                details = json.load(json_file)
+            link = GITHUB_LINK_PATTERN.search(details['descriptionHtml'])
+            repos = [link.group()[len('https://github.com/'):]]
+            repos += [
+                '{}/{}'.format(rng.choice(WORDS), rng.choice(WORDS))
+                for _ in range(rng.randint(0, 3))]
+            if rng.random() < unlinked_ratio:
+                details['descriptionHtml'] = GITHUB_LINK_PATTERN.sub(
+                    '', details['descriptionHtml'])
+                with open(details_path, 'w') as json_file:
+                    json.dump(details, json_file, indent=2)
+            writer.writerow([details['docid'], ','.join(repos)])
+
+
+def write_consolidate_inputs(directory: str, n_repos: int, seed: int = 0):
+    """Write input files of consolidate_data.
+
+    Writes original.csv, gitlab_import.csv, mirrored_repos.csv,
+    packages_by_repo.csv, and renamed_repos.csv. Some repositories are
+    renamed, not found, imported twice, mirrored again, or have no
+    package.
+    """
+    rng = random.Random(seed)
+    fields = ['id', 'full_name', 'renamed_to', 'not_found', 'description']
+    with ExitStack() as stack:
+        def _writer(name, fieldnames=None):
+            csv_file = stack.enter_context(open(
+                os.path.join(directory, name), 'w', newline=''))
+            if fieldnames is None:
+                return csv.writer(csv_file)
+            writer = csv.DictWriter(csv_file, fieldnames)
+            writer.writeheader()
+            return writer
+        original = _writer('original.csv', fields)
+        gitlab_import = _writer('gitlab_import.csv', fields + [
+            'clone_status', 'clone_project_name', 'clone_project_id',
+            'clone_project_url'])
+        mirrored = _writer('mirrored_repos.csv', [
+            'github_full_name', 'clone_project_name', 'clone_project_id',
+            'clone_project_path'])
+        renamed = _writer('renamed_repos.csv', ['github_id', 'packages'])
+        packages = _writer('packages_by_repo.csv')
+        for index in range(n_repos):
+            full_name = '{}{}/{}'.format(
+                rng.choice(WORDS), rng.randrange(n_repos // 3 + 1), index)
+            renamed_to = (
+                'renamed/{}'.format(index) if rng.random() < 0.1 else '')
+            row = {
+                'id': str(index), 'full_name': full_name,
+                'renamed_to': renamed_to,
+                'not_found': 'TRUE' if rng.random() < 0.05 else 'FALSE',
+                'description': _text(rng, 8),
+            }
+            original.writerow(row)
+            for _ in range(2 if rng.random() < 0.05 else 1):
+                if rng.random() < 0.97:
+                    status = rng.choice(['Success', 'Success', 'Failed'])
+                    gitlab_import.writerow(dict(
+                        row, clone_status=status,
+                        clone_project_name='p{}'.format(index),
+                        clone_project_id=(
+                            str(1000 + index) if status == 'Success' else ''),
+                        clone_project_url='http://gitlab/p{}'.format(index)))
+            if rng.random() < 0.1:
+                mirrored.writerow({
+                    'github_full_name': renamed_to or full_name,
+                    'clone_project_name': 'm{}'.format(index),
+                    'clone_project_id': str(5000 + index),
+                    'clone_project_path': 'm{}'.format(index)})
+            if rng.random() < 0.85:
+                for package in range(rng.randint(1, 2)):
+                    packages.writerow([
+                        'org.{}.p{}x{}'.format(
+                            rng.choice(WORDS), index, package),
+                        renamed_to or full_name])
+            elif rng.random() < 0.3:
+                renamed.writerow({
+                    'github_id': str(index),
+                    'packages': 'org.renamed.p{}'.format(index)})
+        for index in range(n_repos // 20):
+            packages.writerow([
+                'org.unused.p{}'.format(index), 'unused/{}'.format(index)])
+
+
+def write_repository_details(
+        input_dir: str, git_repos_dir: str, n_repos: int,
+        commits_per_repo: int, seed: int = 0):
+    """Write input directory of prepare_neo4j_import.
+
+    Creates a bare Git repository <git_repos_dir>/repo<n>.git per repository
+    and writes repositories.csv, play_snapshots.csv, package_details, and
+    repository_details with commits, branches, tags, paths, and snapshot
+    tables as written by store_repo_data.
+    """
+    rng = random.Random(seed)
+    details_dir = os.path.join(input_dir, 'package_details')
+    write_play_details_dir(details_dir, n_repos, seed)
+    names = list(package_names(n_repos, seed))
+    os.makedirs(git_repos_dir, exist_ok=True)
+    with open(os.path.join(input_dir, 'play_snapshots.csv'), 'w',
+              newline='') as csv_file:
+        csv.writer(csv_file).writerows(
+            (name, 1500000000 + index) for index, name in enumerate(names))
+    repositories = []
+    for index, package_name in enumerate(names):
+        repo_id = str(index + 1)
+        clone_project_path = 'repo{}'.format(index)
+        git_dir = os.path.join(
+            git_repos_dir, '{}.git'.format(clone_project_path))
+        write_git_repo(git_dir, commits_per_repo, seed + index)
+        commits = list(GitHistory(git_dir).iter_commits())
+        repo_dir = os.path.join(input_dir, 'repository_details', repo_id)
+        os.makedirs(repo_dir)
+        write_table(
+            os.path.join(repo_dir, 'commits'), CommitRecord._fields, commits)
+        write_table(
+            os.path.join(repo_dir, 'snapshot'), ['web_url', 'created_at'],
+            [('http://gitlab/{}'.format(clone_project_path),
+              '2018-04-0{}T12:00:00Z'.format(rng.randint(1, 9)))])
+        write_table(
+            os.path.join(repo_dir, 'branches'),
+            ['commit_hash', 'branch_name'], [(commits[0].id, 'master')])
+        write_table(
+            os.path.join(repo_dir, 'tags'),
+            ['commit_hash', 'tag_name', 'tag_message'],
+            [(commit.id, 'v{}'.format(number), _text(rng, 5))
+             for number, commit in enumerate(commits[::100])])
+        write_table(
+            os.path.join(repo_dir, 'paths'),
+            ['package', 'manifestPaths', 'gradleConfigPaths',
+             'mavenConfigPaths'],
+            [(package_name, 'app/src/main/AndroidManifest.xml',
+              'build.gradle,app/build.gradle', '')])
+        repositories.append({
+            'id': repo_id,
+            'owner_login': rng.choice(WORDS),
+            'name': package_name.split('.')[-1],
+            'description': _text(rng, 10),
+            'created_at': '2014-0{}-1{}T15:05:06Z'.format(
+                rng.randint(1, 9), rng.randint(0, 9)),
+            'forks_count': rng.randint(0, 100),
+            'stargazers_count': rng.randint(0, 1000),
+            'subscribers_count': rng.randint(0, 100),
+            'watchers_count': rng.randint(0, 1000),
+            'network_count': rng.randint(0, 100),
+            'owner_type': rng.choice(['User', 'Organization']),
+            'parent_id': '',
+            'source_id': '',
+            'packages': package_name,
+            'clone_project_path': clone_project_path,
+        })
+    with open(os.path.join(input_dir, 'repositories.csv'), 'w',
+              newline='') as csv_file:
+        writer = csv.DictWriter(csv_file, list(repositories[0]))
+        writer.writeheader()
+        writer.writerows(repositories)
+
+
+def github_repos(
+        full_names: Iterator[str], seed: int = 0,
+        renamed_ratio: float = 0.05, empty_ratio: float = 0.02) -> list:
+    """Create meta data of Github repositories with commits and files.
+
+    Every repository has a number of commits, some Gradle files, and
+    popularity counts. A share of repositories is renamed: They are known
+    under their new name and their old name redirects there. Another share
+    is empty, i.e. has no commits.
+
+    :returns list:
+        Dicts with keys id, full_name, old_name, fork, created_at, counts,
+        commit_count, and files, a mapping of paths to content.
+    """
+    rng = random.Random(seed)
+    repos = []
+    for index, full_name in enumerate(sorted(set(full_names))):
+        old_name = None
+        if rng.random() < renamed_ratio:
+            old_name = full_name
+            full_name = '{}-renamed'.format(full_name)
+        modules = ['app'] + rng.sample(
+            [word for word in WORDS if word != 'app'], rng.randint(0, 3))
+        files = {'settings.gradle': 'include {}\n'.format(', '.join(
+            "':{}'".format(module) for module in modules))}
+        for module in modules:
+            files['{}/build.gradle'.format(module)] = (
+                "apply plugin: 'com.android.application'\n"
+                "// {}\n".format(_text(rng, 20)))
+        repos.append({
+            'id': 1000 + index,
+            'full_name': full_name,
+            'old_name': old_name,
+            'fork': rng.random() < 0.2,
+            'description': _text(rng, 10),
+            'created_at': '201{}-0{}-1{}T15:05:06Z'.format(
+                rng.randint(0, 7), rng.randint(1, 9), rng.randint(0, 9)),
+            'forks_count': int(rng.paretovariate(1)) - 1,
+            'stargazers_count': int(rng.paretovariate(0.8)) - 1,
+            'subscribers_count': int(rng.paretovariate(1.2)) - 1,
+            'network_count': int(rng.paretovariate(1)) - 1,
+            'commit_count': (
+                0 if rng.random() < empty_ratio
+                else min(int(rng.paretovariate(0.7)), 50000)),
+            'files': files,
+        })
+    return repos
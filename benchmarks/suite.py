@@ -0,0 +1,337 @@
+"""Benchmark hot paths of the pipeline on synthetic fixtures.
+
+Generates deterministic fixtures locally: bare Git repositories created with
+git fast-import, directories of Google Play details, input lists of
+consolidate_data, and an input directory of prepare_neo4j_import with
+repository_details. Each stage runs in a new interpreter process, so that
+its peak resident memory is measured on its own. Stages depending on
+packages which are not installed fail without affecting other stages.
+
+No network access is needed: match_packages uses a stub RepoVerifier
+returning synthetic meta data of repositories.
+
+Results are written as JSON. With --baseline, results are compared to those
+of an earlier run and the exit status is 1 if a stage became slower, uses
+more memory than allowed by --tolerance, or fails. Runs with different sizes
+or seed of fixtures are not compared.
+
+Usage:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json
+"""
+
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+from benchmarks.fixtures import (
+    WORDS, write_consolidate_inputs, write_git_repo, write_package_repos,
+    write_play_details_dir, write_repository_details)
+
+
+DEFAULT_COMMITS = 5000
+DEFAULT_REPOS = 5000
+DEFAULT_PACKAGES = 2000
+DEFAULT_NEO4J_REPOS = 20
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_SEED = 0
+# Commits per repository in input of prepare_neo4j_import
+NEO4J_COMMITS = 200
+PARAMETERS_FILE = 'parameters.json'
+
+
+def generate_fixtures(
+        fixtures_dir: str, parameters: Dict[str, int]):
+    """Write all fixtures to fixtures_dir.
+
+    Parameters are stored in fixtures_dir, too, for reusing fixtures.
+    """
+    n_commits, n_repos, n_packages, n_neo4j_repos, seed = (
+        parameters[key] for key in
+        ['commits', 'repos', 'packages', 'neo4j_repos', 'seed'])
+    write_git_repo(
+        os.path.join(fixtures_dir, 'history.git'), n_commits, seed)
+    details_dir = os.path.join(fixtures_dir, 'package_details')
+    write_play_details_dir(details_dir, n_packages, seed)
+    write_package_repos(
+        details_dir, os.path.join(fixtures_dir, 'package_repos.csv'), seed)
+    consolidate_dir = os.path.join(fixtures_dir, 'consolidate')
+    os.makedirs(consolidate_dir)
+    write_consolidate_inputs(consolidate_dir, n_repos, seed)
+    neo4j_dir = os.path.join(fixtures_dir, 'neo4j_input')
+    os.makedirs(neo4j_dir)
+    write_repository_details(
+        neo4j_dir, os.path.join(fixtures_dir, 'neo4j_repos'),
+        n_neo4j_repos, NEO4J_COMMITS, seed)
+    with open(os.path.join(fixtures_dir, PARAMETERS_FILE), 'w') as json_file:
+        json.dump(parameters, json_file)
+
+
+def bench_git_history(fixtures_dir: str) -> Callable[[], int]:
+    """Parse all commits of a repository."""
+    from util.bare_git import GitHistory
+    git = GitHistory(os.path.join(fixtures_dir, 'history.git'))
+    return lambda: sum(1 for _ in git.iter_commits())
+
+
+def bench_find_paths(fixtures_dir: str) -> Callable[[], int]:
+    """Search files in a repository as store_repo_data does."""
+    from subcommands.store_repo_data import find_paths
+    from util.bare_git import BareGit
+    git = BareGit(os.path.join(fixtures_dir, 'history.git'))
+    return lambda: sum(
+        len(find_paths(word, '*.txt', 'master', git)) for word in WORDS[:10])
+
+
+def bench_parse_google_play_info(fixtures_dir: str) -> Callable[[], int]:
+    """Parse Google Play details of all packages."""
+    from util.parse import parse_google_play_info
+    details_dir = os.path.join(fixtures_dir, 'package_details')
+
+    def _run():
+        names = [
+            os.path.splitext(file_name)[0]
+            for file_name in os.listdir(details_dir)
+            if file_name.endswith('.json')]
+        for package_name in names:
+            parse_google_play_info(package_name, details_dir)
+        return len(names)
+    return _run
+
+
+def bench_consolidate_data(fixtures_dir: str) -> Callable[[], int]:
+    """Join repository lists of GitHub, Gitlab, and packages."""
+    from util.parse import \
+        consolidate_data, index_rows, parse_repo_to_package_file
+    directory = os.path.join(fixtures_dir, 'consolidate')
+
+    def _open(name):
+        return open(os.path.join(directory, name), newline='')
+
+    def _run():
+        with _open('original.csv') as original, \
+                _open('gitlab_import.csv') as gitlab_import, \
+                _open('mirrored_repos.csv') as mirrored, \
+                _open('packages_by_repo.csv') as packages, \
+                _open('renamed_repos.csv') as renamed:
+            packages_by_repo = parse_repo_to_package_file(packages)
+            renamed_repos = index_rows(csv.DictReader(renamed), 'github_id')
+            return sum(1 for _ in consolidate_data(
+                original, gitlab_import, mirrored, renamed_repos,
+                packages_by_repo, io.StringIO()))
+    return _run
+
+
+class StubRepoVerifier(object):
+    """RepoVerifier returning synthetic meta data without requests."""
+    def get_repo_info(self, full_name: str) -> dict:
+        """Derive meta data of repository from its name."""
+        digest = hashlib.sha256(full_name.encode()).digest()
+        return {
+            'full_name': full_name,
+            'fork': digest[0] < 64,
+            'forks_count': digest[1] % 8,
+            'watchers_count': digest[2] % 16,
+            'subscribers_count': digest[3],
+        }
+
+
+def bench_match_packages(fixtures_dir: str) -> Callable[[], int]:
+    """Match packages with repositories, deduplicating some by popularity."""
+    from subcommands.match_packages import match_play_and_github
+
+    def _run():
+        with open(os.path.join(
+                fixtures_dir, 'package_repos.csv')) as csv_file:
+            return sum(1 for _ in match_play_and_github(
+                csv_file, os.path.join(fixtures_dir, 'package_details'),
+                StubRepoVerifier()))
+    return _run
+
+
+def bench_prepare_neo4j_import(fixtures_dir: str) -> Callable[[], int]:
+    """Write Neo4j import files reading commits from Git repositories."""
+    from subcommands.prepare_neo4j_import import prepare_for_neo4j_import
+
+    def _run():
+        with tempfile.TemporaryDirectory() as output_dir:
+            prepare_for_neo4j_import(
+                os.path.join(fixtures_dir, 'neo4j_input'), output_dir,
+                os.path.join(fixtures_dir, 'neo4j_repos'))
+            return len(os.listdir(output_dir))
+    return _run
+
+
+STAGES = {
+    'git_history': bench_git_history,
+    'find_paths': bench_find_paths,
+    'parse_google_play_info': bench_parse_google_play_info,
+    'consolidate_data': bench_consolidate_data,
+    'match_packages': bench_match_packages,
+    'prepare_neo4j_import': bench_prepare_neo4j_import,
+}
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_stage(name: str, fixtures_dir: str):
+    """Run stage in this process and print measurements as JSON.
+
+    Modules are imported and fixtures opened before timing starts.
+    """
+    logging.disable(logging.CRITICAL)
+    function = STAGES[name](fixtures_dir)
+    start = time.perf_counter()
+    items = function()
+    seconds = time.perf_counter() - start
+    json.dump({
+        'items': items,
+        'seconds': seconds,
+        'peak_rss_bytes': _peak_rss_bytes(),
+    }, sys.stdout)
+
+
+def measure(name: str, fixtures_dir: str, repeat: int) -> dict:
+    """Run stage repeat times in new processes.
+
+    :returns dict:
+        Minimum wall time and maximum peak RSS of all runs, or the error of
+        the first failed run.
+    """
+    runs = []
+    for _ in range(repeat):
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.suite', '--run-stage', name,
+             '--fixtures', fixtures_dir],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if process.returncode:
+            lines = process.stderr.strip().splitlines()
+            return {'stage': name, 'error': lines[-1] if lines else
+                    'exit status {}'.format(process.returncode)}
+        runs.append(json.loads(process.stdout))
+    return {
+        'stage': name,
+        'items': runs[0]['items'],
+        'seconds': round(min(run['seconds'] for run in runs), 4),
+        'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+    }
+
+
+def find_regressions(
+        results: list, baseline: dict, tolerance: float) -> list:
+    """Compare results with baseline.
+
+    :returns list:
+        Descriptions of stages which are slower or use more memory than
+        baseline by more than tolerance, as a fraction, or which fail but
+        succeeded in baseline.
+    """
+    previous = {
+        result['stage']: result for result in baseline['results']
+        if 'error' not in result}
+    regressions = []
+    for result in results:
+        old = previous.get(result['stage'])
+        if old is None:
+            continue
+        if 'error' in result:
+            regressions.append('{} failed: {}'.format(
+                result['stage'], result['error']))
+            continue
+        for metric in ['seconds', 'peak_rss_bytes']:
+            if result[metric] > old[metric] * (1 + tolerance):
+                regressions.append('{} {}: {} -> {}'.format(
+                    result['stage'], metric, old[metric], result[metric]))
+    return regressions
+
+
+def main():
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--commits', type=int, default=DEFAULT_COMMITS)
+    parser.add_argument('--repos', type=int, default=DEFAULT_REPOS)
+    parser.add_argument('--packages', type=int, default=DEFAULT_PACKAGES)
+    parser.add_argument(
+        '--neo4j-repos', type=int, default=DEFAULT_NEO4J_REPOS)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        '--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument(
+        '--fixtures', type=str, default=None,
+        help='''Directory of fixtures to reuse. Fixtures are generated if
+            it does not contain any. Sizes and seed of existing fixtures
+            take precedence over options. Default: a temporary
+            directory.''')
+    parser.add_argument(
+        '--output', type=argparse.FileType('w'), default=sys.stdout)
+    parser.add_argument(
+        '--baseline', type=argparse.FileType('r'), default=None,
+        help='Results of an earlier run to check for regressions.')
+    parser.add_argument(
+        '--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--run-stage', choices=list(STAGES),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage, args.fixtures)
+        return
+
+    parameters = {
+        'commits': args.commits, 'repos': args.repos,
+        'packages': args.packages, 'neo4j_repos': args.neo4j_repos,
+        'seed': args.seed}
+    baseline = json.load(args.baseline) if args.baseline else None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures_dir = args.fixtures or tmp_dir
+        parameters_path = os.path.join(fixtures_dir, PARAMETERS_FILE)
+        fixtures_exist = os.path.exists(parameters_path)
+        if fixtures_exist:
+            with open(parameters_path) as json_file:
+                parameters = json.load(json_file)
+        if baseline and baseline['parameters'] != parameters:
+            parser.error(
+                'Baseline was measured with parameters {}, not {}'.format(
+                    json.dumps(baseline['parameters'], sort_keys=True),
+                    json.dumps(parameters, sort_keys=True)))
+        if not fixtures_exist:
+            os.makedirs(fixtures_dir, exist_ok=True)
+            generate_fixtures(fixtures_dir, parameters)
+        results = [
+            measure(name, fixtures_dir, args.repeat) for name in args.stages]
+
+    report = {
+        'python': sys.version.split()[0],
+        'parameters': parameters,
+        'results': results,
+    }
+    json.dump(report, args.output, indent=2)
+    args.output.write('\n')
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('Regression:', regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -11,14 +11,19 @@ This script executes several of the interdependent steps as sub-commands. Use
 the --help option on a sub-command to learn more about it.
 """
 import argparse
+import ast
 import importlib
+import os
 import sys
-from util import log
+import tokenize
+from typing import List
+from util import log, profiling
 
 
 SUB_COMMANDS = [
     'verify_play_link',
     'get_play_data',
+    'pack_play_data',
     'get_repo_data',
     'match_packages',
     'get_gradle_files',
@@ -30,11 +35,70 @@ SUB_COMMANDS = [
     'store_repo_data',
     'prepare_neo4j_import',
     'play_category',
+    'pipeline',
     ]
 
 
-def define_cmdline_interface():
-    """Define parsers for main script and sub-commands."""
+SUB_COMMAND_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'subcommands')
+# Options of main script which take a value
+VALUE_OPTIONS = ['--log', '--profile', '--profiler', '--trace']
+
+
+def read_docstring(command: str) -> str:
+    """Read docstring of sub-command without importing its module.
+
+    Importing a sub-command imports all libraries it depends on. Only the
+    first statement of the module is read.
+
+    :param str command:
+        Name of sub-command.
+    :returns str:
+        Docstring of module or None if it has none.
+    """
+    path = os.path.join(SUB_COMMAND_DIR, '{}.py'.format(command))
+    with tokenize.open(path) as module_file:
+        for token in tokenize.generate_tokens(module_file.readline):
+            if token.type in (tokenize.COMMENT, tokenize.NL):
+                continue
+            if token.type == tokenize.STRING:
+                return ast.literal_eval(token.string)
+            return None
+    return None
+
+
+def find_command(args: List[str]) -> str:
+    """Find name of sub-command in command line arguments.
+
+    >>> find_command(['-v', '--log', 'clone', 'consolidate_data', '-h'])
+    'consolidate_data'
+
+    :param List[str] args:
+        Command line arguments without name of script.
+    :returns str:
+        Name of sub-command or None if args do not contain any.
+    """
+    args = iter(args)
+    for arg in args:
+        if arg in VALUE_OPTIONS:
+            next(args, None)
+        elif not arg.startswith('-'):
+            return arg if arg in SUB_COMMANDS else None
+    return None
+
+
+def define_cmdline_interface(args: List[str] = None):
+    """Define parsers for main script and sub-commands.
+
+    Only the module of the sub-command given in args is imported to define
+    its arguments. Other sub-commands are described by their docstrings.
+
+    :param List[str] args:
+        Command line arguments without name of script. Default:
+        sys.argv[1:].
+    """
+    if args is None:
+        args = sys.argv[1:]
     # Arguments to main script
     parser = argparse.ArgumentParser(
         description=__doc__,
@@ -49,23 +113,62 @@ def define_cmdline_interface():
     parser.add_argument(
         '-q', '--quiet', default=0, action='count',
         help='Decrease log level. May be used several times.')
+    parser.add_argument(
+        '--profile', default=None, type=str,
+        help='''Profile the sub-command and write stats to this file. See
+            --profiler for its format.''')
+    parser.add_argument(
+        '--profiler', default=profiling.DEFAULT_PROFILER,
+        choices=profiling.PROFILERS,
+        help='''Profiler used by --profile: cprofile writes stats readable
+            with pstats or snakeviz. sampling requires pyinstrument and
+            writes an HTML report. Default: {}.'''.format(
+                profiling.DEFAULT_PROFILER))
+    parser.add_argument(
+        '--trace', default=None, type=str,
+        help='''Write timing spans of Git commands, HTTP requests, JSON
+            parsing, and CSV writes to this file in Chrome's trace event
+            format, e.g. for viewing as flame graph in
+            https://ui.perfetto.dev.''')
 
+    selected = find_command(args)
     subparsers = parser.add_subparsers()
     for command in SUB_COMMANDS:
-        script = importlib.import_module('subcommands.{}'.format(command))
+        description = read_docstring(command)
         command_parser = subparsers.add_parser(
-            command, description=script.__doc__, help=script.__doc__,
+            command, description=description, help=description,
             formatter_class=argparse.RawDescriptionHelpFormatter)
-        script.define_cmdline_arguments(command_parser)
+        if command == selected:
+            script = importlib.import_module('subcommands.{}'.format(command))
+            script.define_cmdline_arguments(command_parser)
 
     return parser
 
 
+def run_command(args: argparse.Namespace):
+    """Run sub-command, profiled and traced if requested in args."""
+    if args.trace:
+        profiling.start_tracing()
+    try:
+        if args.profile:
+            profiling.run_profiled(
+                args.func, (args,), args.profile, args.profiler)
+        else:
+            args.func(args)
+    finally:
+        if args.trace:
+            profiling.write_trace(args.trace, profiling.stop_tracing())
+
+
 if __name__ == '__main__':
     PARSER = define_cmdline_interface()
     ARGS = PARSER.parse_args()
+    if ARGS.profile and \
+            ARGS.profiler not in profiling.available_profilers():
+        PARSER.error('Profiler {} requires pyinstrument'.format(
+            ARGS.profiler))
     if 'func' in ARGS:
         log.configure_logger('', ARGS.log, ARGS.verbose, ARGS.quiet)
-        ARGS.func(ARGS)
+        run_command(ARGS)
     else:
         PARSER.print_help()
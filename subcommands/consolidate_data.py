@@ -8,8 +8,9 @@ import logging
 import sys
 
 from util.parse import \
-    parse_repo_to_package_file, \
-    consolidate_data
+    consolidate_data, \
+    index_rows, \
+    parse_repo_to_package_file
 
 
 __log__ = logging.getLogger(__name__)
@@ -86,6 +87,12 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         '-o', '--output', type=argparse.FileType('w'), default=sys.stdout,
         help='File to write output CSV to. Default: stdout.')
+    parser.add_argument(
+        '--unused-repos', type=argparse.FileType('w'), default=None,
+        help='''File to write CSV rows of repository name and package names
+            to for repositories in PACKAGE_LIST which are not matched with
+            any repository. Default: unused repositories are only
+            logged.''')
     parser.set_defaults(func=_main)
 
 
@@ -98,14 +105,17 @@ def _main(args: argparse.Namespace):
     __log__.info('PACKAGE_LIST: %s', args.PACKAGE_LIST.name)
     __log__.info('RENAMED_REPOS_LIST: %s', args.RENAMED_REPOS_LIST.name)
     __log__.info('--output: %s', args.output.name)
+    __log__.info(
+        '--unused-repos: %s',
+        args.unused_repos.name if args.unused_repos else None)
     __log__.info('------- Arguments end -------')
 
     packages_by_repo = parse_repo_to_package_file(args.PACKAGE_LIST)
-    renamed_repos = {row['github_id']: row for row in csv.DictReader(
-        args.RENAMED_REPOS_LIST)}
+    renamed_repos = index_rows(
+        csv.DictReader(args.RENAMED_REPOS_LIST), 'github_id')
     data = consolidate_data(
         args.ORIGINAL_REPO_LIST, args.NEW_REPO_LIST, args.MIRRORED_REPO_LIST,
-        renamed_repos, packages_by_repo)
+        renamed_repos, packages_by_repo, args.unused_repos)
     writer = csv.DictWriter(args.output, FIELDNAMES)
     writer.writeheader()
     num_repos = 0
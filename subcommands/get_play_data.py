@@ -7,10 +7,15 @@ Input expects each package name on a separate line.
 
 Output JSON files are stored in <outdir>/<package_name>.json. Out
 directory will be created if it does not exist and individual files
-will be overwritten if they exist.
+will be overwritten if they exist. Alternatively, all details are
+stored in a single snapshot file.
+
+Packages with details stored recently can be skipped. Packages Google
+Play returned no details for have a separate maximum age.
 
 Executable bulk-details from node-google-play-cli is used to communicate
 with Google Play (https://github.com/dweinstein/node-google-play-cli).
+Several sets of credentials can be used in parallel.
 """
 
 import argparse
@@ -18,16 +23,27 @@ import itertools
 import json
 import logging
 import os
+import queue
+import re
 import subprocess
 import sys
 import time
-from typing import Any, IO, Iterable, Iterator, List, Mapping, TypeVar
+from typing import \
+    Any, IO, Iterable, Iterator, List, Mapping, Tuple, TypeVar
+
+from util.play_snapshot import PlaySnapshot
+from util.pool import bounded_map
 
 
 NODE_GOOGLE_PLAY_CLI_BULK_BIN = '/usr/bin/gp-bulk-details'
 # Manual testing indicates a limit of 1k. Leave a margin
 BULK_SIZE = 900
-DELAY = 12 # in seconds
+DELAY = 12  # in seconds, initial delay between requests
+# Error output of bulk-details when Google Play throttles requests or
+# rejects credentials
+THROTTLED_PATTERN = re.compile(
+    r'\b(401|403|429)\b|too many requests|rate.?limit|unauthori[sz]ed|'
+    r'forbidden|authentication|log ?in failed', re.IGNORECASE)
 
 logger = logging.getLogger(__name__)
 
@@ -58,13 +74,51 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
             help='File to read package names from. Default: stdin.')
     parser.add_argument('--outdir', default='out/', type=str,
             help='Out directory. Default: out/.')
+    parser.add_argument('--snapshot', default=None, type=str,
+            help='Store details in a single snapshot file instead of one '
+            'JSON file per package in out directory.')
+    parser.add_argument('--max-age', default=None, type=int,
+            help='Skip packages with details stored less than MAX_AGE '
+            'seconds ago. Default: fetch all packages.')
+    parser.add_argument('--negative-ttl', default=None, type=int,
+            help='Skip packages Google Play returned no details for less '
+            'than NEGATIVE_TTL seconds ago. Only used with --max-age. '
+            'Default: MAX_AGE.')
     parser.add_argument('--bulk_details-bin',
             default=NODE_GOOGLE_PLAY_CLI_BULK_BIN, type=str,
             help='Path to node-google-play-cli bulk-details binary. '
             'Default: {}'.format(NODE_GOOGLE_PLAY_CLI_BULK_BIN))
+    parser.add_argument('--credentials', default=None,
+            type=argparse.FileType('r'),
+            help='JSON file with a list of objects. Each object contains '
+            'environment variables with credentials for bulk-details, e.g. '
+            'GOOGLE_LOGIN, GOOGLE_PASSWORD, and ANDROID_ID. Batches are '
+            'fetched in parallel, one per set of credentials. Default: use '
+            'credentials from environment.')
     parser.set_defaults(func=_main)
 
 
+def _run_bulk_details(
+        package_names: List[str], env: Mapping[str, str] = None) -> Mapping[
+            str, Any]:
+    """Run bulk-details once.
+
+    :raises subprocess.CalledProcessError: if bulk-details fails.
+    :raises ValueError: if output of bulk-details cannot be parsed.
+    """
+    if env is not None:
+        env = dict(os.environ, **env)
+    process = subprocess.run(
+            [NODE_GOOGLE_PLAY_CLI_BULK_BIN] + package_names,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            check=True, universal_newlines=True, env=env)
+    details = json.loads(process.stdout)
+    if len(details) != len(package_names):
+        raise ValueError('Expected {} results, got {}'.format(
+            len(package_names), len(details)))
+    return dict(zip(package_names, details))
+
+
 def bulk_fetch_details(package_names: List[str]) -> Mapping[str, Any]:
     """Download meta data for all package names from Google Play.
 
@@ -78,38 +132,270 @@ def bulk_fetch_details(package_names: List[str]) -> Mapping[str, Any]:
         return {}
 
     try:
-        process = subprocess.run(
-                [NODE_GOOGLE_PLAY_CLI_BULK_BIN] + package_names,
-                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                check=True, universal_newlines=True)
-        return dict(zip(package_names, json.loads(process.stdout)))
-    except subprocess.CalledProcessError as e:
+        return _run_bulk_details(package_names)
+    except (subprocess.CalledProcessError, ValueError) as e:
         logger.warn('%s', e)
-        logger.debug(process.stderr)
+        logger.debug(getattr(e, 'stderr', ''))
         logger.debug('First package: %s; last package: %s',
                 package_names[0], package_names[-1])
         return {}
 
 
-def download_package_details(input_file: IO[str], out_dir: str):
+def is_throttled(error: Exception) -> bool:
+    """Check if bulk-details failed because of throttling or credentials.
+
+    Such failures do not depend on the packages requested.
+    """
+    return isinstance(error, subprocess.CalledProcessError) and bool(
+        THROTTLED_PATTERN.search(error.stderr or ''))
+
+
+class BulkDetailsFetcher(object):
+    """Fetch details with bulk-details using one set of credentials.
+
+    The delay between two requests adapts to errors: It is doubled after a
+    failed request and slowly decreased after a successful one.
+
+    A failed batch is retried up to RETRIES times. If it keeps failing or
+    its output cannot be parsed, it is bisected down to single packages to
+    isolate packages which make bulk-details fail. Only those packages are
+    dropped. Throttling and authentication errors (see is_throttled) are
+    retried up to RETRIES times at any size of batch and make the fetcher
+    give up the batch if they persist.
+
+    :param Mapping[str, str] env: Additional environment variables for
+        bulk-details, e.g. credentials. Default: None.
+    :param float delay: Initial delay between requests in seconds.
+    """
+    MIN_DELAY = 2  # in seconds
+    MAX_DELAY = 300  # in seconds
+    BACKOFF_FACTOR = 2
+    RECOVERY_FACTOR = 0.8
+    RETRIES = 3
+
+    def __init__(self, env: Mapping[str, str] = None, delay: float = DELAY):
+        self.env = env
+        self.delay = delay
+        self._last_request = 0
+
+    def _wait(self):
+        """Sleep until delay since last request has passed."""
+        remaining = self._last_request + self.delay - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        self._last_request = time.monotonic()
+
+    def _request(self, package_names: List[str]) -> Mapping[str, Any]:
+        """Run bulk-details once and adapt delay to the outcome."""
+        self._wait()
+        try:
+            details = _run_bulk_details(package_names, self.env)
+        except (subprocess.CalledProcessError, ValueError):
+            self.delay = min(
+                self.delay * self.BACKOFF_FACTOR, self.MAX_DELAY)
+            raise
+        self.delay = max(
+            self.delay * self.RECOVERY_FACTOR, self.MIN_DELAY)
+        return details
+
+    def _attempt(
+            self, package_names: List[str], retries: int = 0) -> Tuple[
+                Mapping[str, Any], Exception]:
+        """Request details, retrying failed runs of bulk-details.
+
+        Output which cannot be parsed is caused by packages and is not
+        retried. Throttling and authentication errors are retried up to
+        RETRIES times.
+
+        :returns Tuple[Mapping[str, Any], Exception]: Details and None, or
+            None and the error of the last attempt.
+        """
+        attempt = 0
+        while True:
+            try:
+                return self._request(package_names), None
+            except (subprocess.CalledProcessError, ValueError) as e:
+                logger.warning(
+                    'Failed to fetch %d packages (%s ... %s), attempt %d: '
+                    '%s', len(package_names), package_names[0],
+                    package_names[-1], attempt + 1, e)
+                logger.debug(getattr(e, 'stderr', ''))
+                attempt += 1
+                limit = self.RETRIES if is_throttled(e) else retries
+                if isinstance(e, ValueError) or attempt > limit:
+                    return None, e
+
+    def _fetch(
+            self, package_names: List[str], retries: int) -> Mapping[
+                str, Any]:
+        """Fetch a batch, bisecting it if it fails because of packages."""
+        details, error = self._attempt(package_names, retries)
+        if not error:
+            return details
+        if is_throttled(error):
+            logger.error(
+                'Give up %d packages (%s ... %s): %s', len(package_names),
+                package_names[0], package_names[-1], error.stderr.strip())
+            return {}
+        if len(package_names) == 1:
+            logger.error('Skip package %s', package_names[0])
+            return {}
+        middle = len(package_names) // 2
+        details = dict(self._fetch(package_names[:middle], 0))
+        details.update(self._fetch(package_names[middle:], 0))
+        return details
+
+    def fetch(self, package_names: List[str]) -> Mapping[str, Any]:
+        """Download meta data for package_names.
+
+        :param List[str] package_names: Package names to download meta data
+            for.
+        :returns Mapping[str, Any]: Dictionary with package names mapped to
+            meta data. Packages which cannot be fetched are left out.
+        """
+        if not package_names:
+            return {}
+        return self._fetch(package_names, self.RETRIES)
+
+
+def read_credentials(credentials_file: IO[str]) -> List[Mapping[str, str]]:
+    """Read sets of environment variables for bulk-details.
+
+    :param IO[str] credentials_file: JSON file containing a list of
+        objects. Each object maps environment variable names to values,
+        e.g. GOOGLE_LOGIN, GOOGLE_PASSWORD, and ANDROID_ID.
+    :returns List[Mapping[str, str]]: List of environment variables.
+    """
+    credentials = json.load(credentials_file)
+    if not isinstance(credentials, list) or not credentials:
+        raise ValueError('{} does not contain a list of credentials'.format(
+            credentials_file.name))
+    return [{str(k): str(v) for k, v in c.items()} for c in credentials]
+
+
+def write_package_details(
+        details: Mapping[str, Any], out_dir: str,
+        snapshot: PlaySnapshot = None):
+    """Store details of packages in out_dir or snapshot."""
+    for package, meta_data in details.items():
+        if snapshot:
+            snapshot.put_details(package, json.dumps(meta_data))
+            continue
+        filename = '{}.json'.format(package)
+        path = os.path.join(out_dir, filename)
+        with open(path, 'w') as output_file:
+            json.dump(meta_data, output_file, indent=2)
+    if snapshot:
+        snapshot.commit()
+
+
+def get_details_status(
+        package: str, out_dir: str,
+        snapshot: PlaySnapshot = None) -> Tuple[bool, int]:
+    """Check if details of package are stored.
+
+    :param str package: Package name.
+    :param str out_dir: Directory with JSON files.
+    :param PlaySnapshot snapshot: Snapshot to check instead of out_dir.
+    :returns Tuple[bool, int]: Whether stored details are null and POSIX
+        timestamp of when they were stored. (None, None) if details are not
+        stored.
+    """
+    if snapshot:
+        return snapshot.get_details_status(package)
+    path = os.path.join(out_dir, '{}.json'.format(package))
+    try:
+        with open(path) as details_file:
+            mtime = os.fstat(details_file.fileno()).st_mtime
+            # Avoid reading entire file: null is written as the only token.
+            is_null = details_file.read(5).strip() == 'null'
+            return is_null, mtime
+    except FileNotFoundError:
+        return None, None
+
+
+def filter_stale_packages(
+        packages: Iterable[str], out_dir: str, max_age: int,
+        negative_ttl: int = None,
+        snapshot: PlaySnapshot = None) -> Iterator[str]:
+    """Filter out packages with recently stored details.
+
+    :param Iterable[str] packages: Package names.
+    :param str out_dir: Directory with JSON files.
+    :param int max_age: Maximum age of details in seconds.
+    :param int negative_ttl: Maximum age of null details in seconds.
+        Default: max_age.
+    :param PlaySnapshot snapshot: Snapshot to check instead of out_dir.
+    :returns Iterator[str]: Package names without fresh details.
+    """
+    if negative_ttl is None:
+        negative_ttl = max_age
+    now = time.time()
+    skipped = 0
+    for package in packages:
+        is_null, mtime = get_details_status(package, out_dir, snapshot)
+        if mtime is not None:
+            age = now - mtime
+            if age < (negative_ttl if is_null else max_age):
+                skipped += 1
+                continue
+        yield package
+    logger.info('Skipped %d packages with fresh details', skipped)
+
+
+def download_package_details(
+        input_file: IO[str], out_dir: str, snapshot: PlaySnapshot = None,
+        fetchers: List[BulkDetailsFetcher] = None, max_age: int = None,
+        negative_ttl: int = None):
     """Download meta data for each package name from Google Play.
 
-    Stores one JSON files for each package in out_dir.
+    Stores one JSON files for each package in out_dir unless a snapshot is
+    given.
+
+    If max_age is given, packages with details stored less than max_age
+    seconds ago are skipped. negative_ttl does the same for packages which
+    Google Play returned null for.
+
+    Batches are fetched in background threads, one per fetcher, while
+    results of previous batches are written.
 
     :param IO[str] input_file: File to read lines from. Each line is
         considered a package name to test.
     :param str out_dir: Directory name to store JSON files in.
+    :param PlaySnapshot snapshot: Snapshot to store details in instead of
+        out_dir.
+    :param List[BulkDetailsFetcher] fetchers: Fetchers to use in parallel.
+        Default: one fetcher with credentials from environment.
+    :param int max_age: Maximum age of stored details in seconds. Default:
+        fetch all packages.
+    :param int negative_ttl: Maximum age of stored null details in
+        seconds. Default: max_age.
     """
-    os.makedirs(out_dir, exist_ok=True)
+    if not snapshot:
+        os.makedirs(out_dir, exist_ok=True)
+    if not fetchers:
+        fetchers = [BulkDetailsFetcher()]
+
+    idle_fetchers = queue.Queue()
+    for fetcher in fetchers:
+        idle_fetchers.put(fetcher)
+
+    def _fetch(packages: List[str]) -> Mapping[str, Any]:
+        fetcher = idle_fetchers.get()
+        try:
+            return fetcher.fetch(packages)
+        finally:
+            idle_fetchers.put(fetcher)
 
     package_iterator = map(lambda l: l.strip(), input_file)
-    for packages in grouper(package_iterator, BULK_SIZE):
-        for package, meta_data in bulk_fetch_details(packages).items():
-            filename = '{}.json'.format(package)
-            path = os.path.join(out_dir, filename)
-            with open(path, 'w') as output_file:
-                json.dump(meta_data, output_file, indent=2)
-        time.sleep(DELAY)
+    if max_age is not None:
+        package_iterator = filter_stale_packages(
+            package_iterator, out_dir, max_age, negative_ttl, snapshot)
+    batches = grouper(package_iterator, BULK_SIZE)
+    for details in bounded_map(
+            _fetch, batches, len(fetchers), len(fetchers) + 1):
+        write_package_details(details, out_dir, snapshot)
+        logger.info('Stored details of %d packages', len(details))
 
 
 def _main(args: argparse.Namespace):
@@ -117,4 +403,19 @@ def _main(args: argparse.Namespace):
     global NODE_GOOGLE_PLAY_CLI_BULK_BIN
     NODE_GOOGLE_PLAY_CLI_BULK_BIN = args.bulk_details_bin
     logger.debug('Reading from %s', args.input.name)
-    download_package_details(args.input, args.outdir)
+    fetchers = None
+    if args.credentials:
+        fetchers = [
+            BulkDetailsFetcher(env)
+            for env in read_credentials(args.credentials)]
+        logger.info('Fetch with %d sets of credentials', len(fetchers))
+    if args.snapshot:
+        logger.info('Store details in snapshot %s', args.snapshot)
+        with PlaySnapshot(args.snapshot) as snapshot:
+            download_package_details(
+                args.input, args.outdir, snapshot, fetchers, args.max_age,
+                args.negative_ttl)
+    else:
+        download_package_details(
+            args.input, args.outdir, None, fetchers, args.max_age,
+            args.negative_ttl)
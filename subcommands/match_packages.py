@@ -4,20 +4,27 @@ Use -h or --help for more information.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import csv
 import json
 import logging
 import os
 import sys
-from typing import IO, Iterator, List, Tuple
+from typing import Dict, IO, Iterable, Iterator, List, Mapping, Tuple
 
 from util.github_repo import RepoVerifier
 from util.package import Package
-from util.parse import parse_package_details, parse_package_to_repos_file
+from util.parse import \
+    ParsedJSON, \
+    parse_package_details, \
+    parse_package_to_repos_file
 
 
 __log__ = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 8
+DEFAULT_READ_WORKERS = 4
+
 
 def define_cmdline_arguments(parser: argparse.ArgumentParser):
     """Define commandline arguments."""
@@ -39,10 +46,52 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         '-o', '--out', default=sys.stdout, type=argparse.FileType('w'),
         help='File to write CSV output to. Default: stdout')
+    parser.add_argument(
+        '--read-workers', default=DEFAULT_READ_WORKERS, type=int,
+        help='''Number of threads reading JSON files from DETAILS_DIRECTORY.
+            Use 0 to read files sequentially. Default: {}.'''.format(
+                DEFAULT_READ_WORKERS))
+    parser.add_argument(
+        '--batch', action='store_true',
+        help='''Deduplicate packages without links to Github after all
+            packages have been read. Meta data of each candidate repository
+            is downloaded only once, concurrently. Matches found by
+            deduplication are written at the end of the output.''')
+    parser.add_argument(
+        '--workers', default=DEFAULT_WORKERS, type=int,
+        help='''Number of concurrent requests to Github in batch mode.
+            Default: {}.'''.format(DEFAULT_WORKERS))
     parser.set_defaults(func=_main)
 
 
-def deduplicate(repo_names: List[str], repo_verifier: RepoVerifier) -> str:
+def fetch_repo_infos(
+        repo_names: Iterable[str], repo_verifier: RepoVerifier,
+        workers: int = DEFAULT_WORKERS) -> Dict[str, ParsedJSON]:
+    """Download meta data of repositories concurrently.
+
+    :param Iterable[str] repo_names:
+        Names of repositories to download meta data for. Each name is
+        requested only once.
+    :param RepoVerifier repo_verifier:
+        Instance to fetch meta data from Github.
+    :param int workers:
+        Maximum number of concurrent requests.
+    :returns Dict[str, ParsedJSON]:
+        Mapping of repository names to meta data or None if the repository
+        cannot be found.
+    """
+    unique_names = sorted(set(repo_names))
+    __log__.info(
+        'Download meta data of %d repositories with %d workers',
+        len(unique_names), workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        infos = executor.map(repo_verifier.get_repo_info, unique_names)
+        return dict(zip(unique_names, infos))
+
+
+def deduplicate(
+        repo_names: List[str], repo_verifier: RepoVerifier,
+        repo_infos: Mapping[str, ParsedJSON] = None) -> str:
     """Deduplicate repositories by popularity.
 
     Fetches meta data from Github and filters out most popular repository.
@@ -56,6 +105,10 @@ def deduplicate(repo_names: List[str], repo_verifier: RepoVerifier) -> str:
         List of repository names to filter.
     :param RepoVerifier repo_verifier:
         Instance to fetch meta data from Github.
+    :param Mapping[str, ParsedJSON] repo_infos:
+        Meta data of repositories downloaded before, e.g. by
+        fetch_repo_infos(). Repositories missing in this mapping are
+        downloaded with repo_verifier.
     :returns str:
         Full name of most popular repository or None if no unique most popular
         repo exists.
@@ -64,9 +117,13 @@ def deduplicate(repo_names: List[str], repo_verifier: RepoVerifier) -> str:
     if len(repo_names) == 1:
         return repo_names[0]['full_name']
 
+    if repo_infos is None:
+        repo_infos = {}
+
     # Download meta data from Github
     repos = [
-            repo_verifier.get_repo_info(repo_name)
+            repo_infos[repo_name] if repo_name in repo_infos
+            else repo_verifier.get_repo_info(repo_name)
             for repo_name in repo_names]
     # Deduplicate by canonical repo name and filter out None
     repos = {repo['full_name']: repo for repo in repos if repo}.values()
@@ -91,9 +148,17 @@ def deduplicate(repo_names: List[str], repo_verifier: RepoVerifier) -> str:
 
 def match_play_and_github(
         package_to_repo: IO[str], details_dir: str,
-        repo_verifier: RepoVerifier) -> Iterator[Tuple[str, str]]:
+        repo_verifier: RepoVerifier, batch: bool = False,
+        workers: int = DEFAULT_WORKERS,
+        read_workers: int = 0) -> Iterator[Tuple[str, str]]:
     """Match Android apps on Google Play with their repositories on Github.
 
+    Meta data of repositories downloaded for deduplication is reused for all
+    packages. In batch mode, packages which need to be deduplicated by
+    popularity are collected first. Meta data of all their candidate
+    repositories is downloaded once and matches are yielded after all other
+    packages.
+
     :param IO[str] input_file:
         CSV file to parse.
         The file needs to contain a column `package` and a column
@@ -106,6 +171,12 @@ def match_play_and_github(
         assumed to be package name for details contained in file.
     :param util.repo_verifier.RepoVerifier:
         Instance of RepoVerifier to use for Github API v3 access.
+    :param bool batch:
+        Deduplicate all packages at once after reading all packages.
+    :param int workers:
+        Number of concurrent requests to Github in batch mode.
+    :param int read_workers:
+        Number of threads reading JSON files from details_dir.
     :returns Iterator[Tuple[str, str]]:
         An iterator over package name and repository name that match.
     """
@@ -120,8 +191,25 @@ def match_play_and_github(
             'too_many_repos': 0,
             }
     packages = parse_package_to_repos_file(package_to_repo)
+    ambiguous = []
+    # Meta data of repositories is shared between packages
+    repo_infos = {}
+
+    def _deduplicate(package_name: str, repo_names: List[str]) -> str:
+        """Deduplicate by popularity and count matches."""
+        for repo_name in repo_names:
+            if repo_name not in repo_infos:
+                repo_infos[repo_name] = repo_verifier.get_repo_info(repo_name)
+        most_popular = deduplicate(repo_names, repo_verifier, repo_infos)
+        if most_popular:
+            stats['no_github_link_but_unique_popular'] += 1
+            __log__.debug(
+                    '"%s" is most popular repo for %s',
+                    most_popular, package_name)
+        return most_popular
 
-    for package_name, package_details in parse_package_details(details_dir):
+    for package_name, package_details in parse_package_details(
+            details_dir, read_workers):
         stats['all'] += 1
         package = Package(package_name, package_details)
 
@@ -146,14 +234,13 @@ def match_play_and_github(
                     len(package.github_info['repos']),
                     package.github_info['repos'])
             stats['no_github_link'] += 1
+            if batch:
+                ambiguous.append((package_name, package.github_info['repos']))
+                continue
             # Try deduplication by popularity
-            most_popular = deduplicate(
-                    package.github_info['repos'], repo_verifier)
+            most_popular = _deduplicate(
+                    package_name, package.github_info['repos'])
             if most_popular:
-                stats['no_github_link_but_unique_popular'] += 1
-                __log__.debug(
-                        '"%s" is most popular repo for %s',
-                        most_popular, package_name)
                 yield package_name, most_popular
         elif not package.has_repo_links() and not is_unique_repo:
             __log__.debug(
@@ -177,6 +264,18 @@ def match_play_and_github(
             stats['valid'] += 1
             yield package_name, repo
 
+    if ambiguous:
+        # Only lists with several repos lead to requests in deduplicate()
+        repo_infos.update(fetch_repo_infos(
+            (
+                repo_name for _, repo_names in ambiguous
+                if len(repo_names) > 1 for repo_name in repo_names),
+            repo_verifier, workers))
+        for package_name, repo_names in ambiguous:
+            most_popular = _deduplicate(package_name, repo_names)
+            if most_popular:
+                yield package_name, most_popular
+
     # TODO: Above steps should be performed independently and sequentially.
     #       Move them out into separate generators.
     #       The idea is:
@@ -200,5 +299,8 @@ def _main(args: argparse.Namespace):
     for row in match_play_and_github(
             args.package_list,
             args.DETAILS_DIRECTORY,
-            repo_verifier):
+            repo_verifier,
+            args.batch,
+            args.workers,
+            args.read_workers):
         csv_writer.writerow(row)
@@ -9,6 +9,7 @@ import logging
 import re
 import sys
 import time
+from typing import Iterable, Iterator, Tuple
 
 from gitlab import Gitlab
 from gitlab.exceptions import GitlabGetError
@@ -23,6 +24,8 @@ GITLAB_HOST = 'http://145.108.225.21'
 GITLAB_TOKEN_FILE = '.gitlab.private_token'
 OLD_REPOSITORY_DATA = 'input/github_repo_data.new.complete.utf8.csv'
 EMPTY_REPOSITORY_LIST = 'output/all-empty-repos-no-wikis.txt'
+# Seconds to wait for Gitlab to delete projects before creating them again
+DELETE_WAIT = 5
 
 
 class GithubToGitlabName(object):
@@ -46,29 +49,29 @@ class GithubToGitlabName(object):
         return re.sub(r'-+$', '', step2)
 
 
-def _gitlab_instance():
-    with open(GITLAB_TOKEN_FILE) as token_file:
+def _gitlab_instance(gitlab_host: str, token_file_name: str) -> Gitlab:
+    with open(token_file_name) as token_file:
         token = token_file.readline().strip()
-    return Gitlab(GITLAB_HOST, private_token=token, api_version=4)
+    return Gitlab(gitlab_host, private_token=token, api_version=4)
 
 
-def _load_repository_data():
-    with open(OLD_REPOSITORY_DATA) as csv_file:
+def _load_repository_data(path: str):
+    with open(path) as csv_file:
         result = list(csv.DictReader(csv_file))
         __log__.info('Loaded repo data with %d entries', len(result))
         return result
 
 
-def _read_empty_repos():
-    with open(EMPTY_REPOSITORY_LIST) as input_file:
+def _read_empty_repos(path: str):
+    with open(path) as input_file:
         result = list(map(str.strip, input_file.readlines()))
         __log__.info('Loaded list with %d empty repos', len(result))
         return result
 
 
-def _by_gitlab_name():
+def _by_gitlab_name(repository_data: str):
     result = {}
-    for row in _load_repository_data():
+    for row in _load_repository_data(repository_data):
         original, latest = get_latest_repo_name(row)
         # FIXME: Gitlab repo could be found more reliably with
         #        row['clone_repo_id']
@@ -114,15 +117,49 @@ def _import_from_github_to_gitlab(github_repo_name, gitlab_repo_name, gitlab):
     return new_repo
 
 
+def mirror_repos(
+        repo_names: Iterable[Tuple[str, str]], gitlab: Gitlab,
+        delete_wait: float = DELETE_WAIT) -> Iterator[dict]:
+    """Delete projects on Gitlab and import them from GitHub again.
+
+    :param Iterable[Tuple[str, str]] repo_names:
+        Pairs of full name on GitHub and name on Gitlab of repositories.
+    :param Gitlab gitlab:
+        Gitlab instance to mirror repositories to.
+    :param float delete_wait:
+        Seconds to wait for Gitlab to delete projects before importing them
+        again.
+    :returns Iterator[dict]:
+        Iterator over rows describing the new projects.
+    """
+    repo_names = list(repo_names)
+    for _, gitlab_repo_name in repo_names:
+        _delete_repo(gitlab_repo_name, gitlab)
+
+    __log__.info('Wait for %s seconds for Gitlab to delete repos', delete_wait)
+    time.sleep(delete_wait)
+    __log__.info('Finished waiting: Continue')
+
+    for github_repo_name, gitlab_repo_name in repo_names:
+        gitlab_repo = _import_from_github_to_gitlab(
+            github_repo_name, gitlab_repo_name, gitlab)
+        yield {
+            'github_full_name': github_repo_name,
+            'clone_project_name': gitlab_repo.name,
+            'clone_project_path': gitlab_repo.path,
+            'clone_project_id': gitlab_repo.id
+            }
+
+
 def _log_args(args):
     """Pass arguments to respective function."""
-    __log__.info('------- Constants: -------')
-    __log__.info('GITLAB_HOST: %s', GITLAB_HOST)
-    __log__.info('GITLAB_TOKEN_FILE: %s', GITLAB_TOKEN_FILE)
-    __log__.info('OLD_REPOSITORY_DATA: %s', OLD_REPOSITORY_DATA)
-    __log__.info('EMPTY_REPOSITORY_LIST: %s', EMPTY_REPOSITORY_LIST)
     __log__.info('------- Arguments: -------')
     __log__.info('--output: %s', args.output.name)
+    __log__.info('--gitlab-host: %s', args.gitlab_host)
+    __log__.info('--gitlab-token-file: %s', args.gitlab_token_file)
+    __log__.info('--repository-data: %s', args.repository_data)
+    __log__.info('--empty-repos: %s', args.empty_repos)
+    __log__.info('--delete-wait: %s', args.delete_wait)
     __log__.info('------- Arguments end -------')
 
 
@@ -131,14 +168,34 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         '-o', '--output', type=argparse.FileType('w'), default=sys.stdout,
         help='File to write output to. Default: stdout.')
+    parser.add_argument(
+        '--gitlab-host', type=str, default=GITLAB_HOST,
+        help='''URL of Gitlab instance to mirror repositories to. Default:
+        {}'''.format(GITLAB_HOST))
+    parser.add_argument(
+        '--gitlab-token-file', type=str, default=GITLAB_TOKEN_FILE,
+        help='''File with private token for Gitlab in its first line.
+        Default: {}'''.format(GITLAB_TOKEN_FILE))
+    parser.add_argument(
+        '--repository-data', type=str, default=OLD_REPOSITORY_DATA,
+        help='''CSV file with columns full_name and renamed_to of
+        repositories on GitHub. Default: {}'''.format(OLD_REPOSITORY_DATA))
+    parser.add_argument(
+        '--empty-repos', type=str, default=EMPTY_REPOSITORY_LIST,
+        help='''File listing names of empty repositories on Gitlab, one per
+        line. Default: {}'''.format(EMPTY_REPOSITORY_LIST))
+    parser.add_argument(
+        '--delete-wait', type=float, default=DELETE_WAIT,
+        help='''Seconds to wait for Gitlab to delete repositories before
+        importing them again. Default: {}'''.format(DELETE_WAIT))
     parser.set_defaults(func=_main)
 
 
 def _main(args):
     _log_args(args)
 
-    repos = _by_gitlab_name()
-    gitlab = _gitlab_instance()
+    repos = _by_gitlab_name(args.repository_data)
+    gitlab = _gitlab_instance(args.gitlab_host, args.gitlab_token_file)
 
     csv_writer = csv.DictWriter(args.output, [
         'github_full_name',
@@ -148,28 +205,11 @@ def _main(args):
         ])
     csv_writer.writeheader()
 
-    empty_repos = _read_empty_repos()
     repo_names = list()
-
-    for gitlab_repo_name in empty_repos:
+    for gitlab_repo_name in _read_empty_repos(args.empty_repos):
         github_repo_name = _find_github_name(gitlab_repo_name, repos)
         if not github_repo_name:
             continue
         repo_names.append((github_repo_name, gitlab_repo_name))
 
-        _delete_repo(gitlab_repo_name, gitlab)
-
-    __log__.info('Wait for 5 seconds for Gitlab to delete repos')
-    time.sleep(5)
-    __log__.info('Finished waiting: Continue')
-
-    for github_repo_name, gitlab_repo_name in repo_names:
-        gitlab_repo = _import_from_github_to_gitlab(
-            github_repo_name, gitlab_repo_name, gitlab)
-
-        csv_writer.writerow({
-            'github_full_name': github_repo_name,
-            'clone_project_name': gitlab_repo.name,
-            'clone_project_path': gitlab_repo.path,
-            'clone_project_id': gitlab_repo.id
-            })
+    csv_writer.writerows(mirror_repos(repo_names, gitlab, args.delete_wait))
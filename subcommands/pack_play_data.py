@@ -0,0 +1,40 @@
+"""Pack Google Play details into a single snapshot file.
+
+Reads all <package_name>.json files in DETAILS_DIRECTORY and in its
+subdirectory categories/ and stores them in SNAPSHOT. Modification times of
+files are kept as snapshot times.
+
+Snapshot files can be used instead of details directories by subcommands
+get_play_data, match_packages, play_category, and prepare_neo4j_import.
+"""
+
+import argparse
+import logging
+
+from util.play_snapshot import PlaySnapshot
+
+
+__log__ = logging.getLogger(__name__)
+
+
+def define_cmdline_arguments(parser: argparse.ArgumentParser):
+    """Add arguments to parser."""
+    parser.add_argument(
+        'DETAILS_DIRECTORY', type=str,
+        help='Directory containing JSON files with details from Google Play.')
+    parser.add_argument(
+        'SNAPSHOT', type=str,
+        help='''Snapshot file to create. Existing entries are overwritten by
+            files in DETAILS_DIRECTORY.''')
+    parser.set_defaults(func=_main)
+
+
+def _main(args: argparse.Namespace):
+    """Pass arguments to respective function."""
+    __log__.info('------- Arguments: -------')
+    __log__.info('DETAILS_DIRECTORY: %s', args.DETAILS_DIRECTORY)
+    __log__.info('SNAPSHOT: %s', args.SNAPSHOT)
+    __log__.info('------- Arguments end -------')
+
+    with PlaySnapshot(args.SNAPSHOT) as snapshot:
+        snapshot.import_directory(args.DETAILS_DIRECTORY)
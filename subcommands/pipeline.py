@@ -0,0 +1,113 @@
+"""Run subcommands as stages of a pipeline.
+
+Stages, their input and output files, and the subcommands they run are
+declared in a JSON file. A stage runs after all stages writing its inputs.
+Independent stages run concurrently. Stages are skipped if the content of
+their inputs and outputs is unchanged since their last successful run.
+
+See doc/pipeline.example.json for an example. Paths are relative to the
+working directory.
+
+Use -h or --help for more information.
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+from util.pipeline import CACHED, DONE, Stage, load_pipeline, run_pipeline
+
+
+__log__ = logging.getLogger(__name__)
+
+
+MAIN_SCRIPT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'gh_android_apps.py')
+DEFAULT_JOBS = 2
+
+
+class StageRunner(object):
+    """Run stages with gh_android_apps.py in a new process each.
+
+    :param str log_dir:
+        Directory to write a log file per stage to. If None, stages log to
+        stderr.
+    :param list options:
+        Options to pass to gh_android_apps.py before the subcommand, e.g.
+        ['-v'].
+    """
+    def __init__(self, log_dir: str = None, options: list = None):
+        self.log_dir = log_dir
+        self.options = options or []
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+    def __call__(self, stage: Stage) -> int:
+        command = [sys.executable, MAIN_SCRIPT] + self.options
+        if self.log_dir:
+            log_path = os.path.join(self.log_dir, '{}.log'.format(stage.name))
+            command += ['--log', log_path]
+        return subprocess.run(command + stage.command).returncode
+
+
+def _verbosity_options(verbose: int, quiet: int) -> list:
+    return ['-v'] * verbose + ['-q'] * quiet
+
+
+def define_cmdline_arguments(parser: argparse.ArgumentParser):
+    """Add arguments to parser."""
+    parser.add_argument(
+        'PIPELINE', type=str,
+        help='''JSON file with an object with key "stages" listing objects
+            with keys "name", "command", "inputs", "outputs", and optionally
+            "after". "command" lists the subcommand and its arguments.
+            "inputs" lists files, directories or glob patterns the stage
+            reads. "outputs" lists files and directories it writes. "after"
+            lists names of stages to run before it in addition to those
+            writing its inputs.''')
+    parser.add_argument(
+        '--state', type=str, default=None,
+        help='''JSON file storing content hashes of inputs and outputs of
+            previous runs. Default: PIPELINE with suffix .state.json.''')
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=DEFAULT_JOBS,
+        help='Number of stages to run concurrently. Default: {}.'.format(
+            DEFAULT_JOBS))
+    parser.add_argument(
+        '--force', action='store_true',
+        help='Run all stages even if they are up to date.')
+    parser.add_argument(
+        '--log-dir', type=str, default=None,
+        help='''Directory to write a log file per stage to. Default: Stages
+            log to stderr.''')
+    parser.set_defaults(func=_main)
+
+
+def _main(args: argparse.Namespace):
+    """Pass arguments to respective function."""
+    state_path = args.state
+    if state_path is None:
+        state_path = os.path.splitext(args.PIPELINE)[0] + '.state.json'
+    __log__.info('------- Arguments: -------')
+    __log__.info('PIPELINE: %s', args.PIPELINE)
+    __log__.info('--state: %s', state_path)
+    __log__.info('--jobs: %d', args.jobs)
+    __log__.info('--force: %s', args.force)
+    __log__.info('--log-dir: %s', args.log_dir)
+    __log__.info('------- Arguments end -------')
+
+    stages = load_pipeline(args.PIPELINE)
+    runner = StageRunner(
+        args.log_dir, _verbosity_options(args.verbose, args.quiet))
+    results = run_pipeline(
+        stages, state_path, runner, jobs=args.jobs, force=args.force)
+    for name, result in results.items():
+        __log__.info('Stage %s: %s', name, result)
+    failed = [
+        name for name, result in results.items()
+        if result not in (DONE, CACHED)]
+    if failed:
+        __log__.error('Stages not completed: %s', ', '.join(failed))
+        sys.exit(1)
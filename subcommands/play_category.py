@@ -1,30 +1,148 @@
-"""Scrape Google Play category data from Google Play."""
+"""Scrape Google Play category data from Google Play.
+
+Pages of several packages are requested concurrently over a pool of
+keep-alive connections. Each page is scanned while it is downloaded and
+parsing stops as soon as the category is found. Only if scanning fails,
+the whole page is parsed with html5lib.
+
+Packages which already have a category are skipped.
+"""
 
 import argparse
+from html.parser import HTMLParser
 import json
 import logging
 import os
+from typing import Iterator, Tuple
 
 from lxml.html import html5parser
 import requests
 
+from util.http_session import pooled_session
 from util.parse import parse_package_details
+from util.play_snapshot import CATEGORY_DIR, PlaySnapshot
+from util.pool import bounded_map
 
 
 __log__ = logging.getLogger(__name__)
 
 
 PLAY_STORE_LINK = 'https://play.google.com/store/apps/details?id={}'
-CATEGORY_DIR = 'categories'
+DEFAULT_READ_WORKERS = 4
+DEFAULT_CONCURRENCY = 8
+CHUNK_SIZE = 16 * 1024
+COMMIT_INTERVAL = 100
 HEADERS = {
     'Accept-Language': 'en,en-GB;q=0.8,en-US;q=0.7,de;q=0.5,de-DE;q=0.3,nl;q=0.2'
     }
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr'])
+
+
+class _GenreFound(Exception):
+    pass
+
+
+class GenreParser(HTMLParser):
+    """Find text of first [itemprop=genre] element inside a .category element.
+
+    Equivalent to find_category_string() for well-formed pages but works on
+    chunks of a page and stops at the first match.
+
+    Example:
+        >>> parser = GenreParser()
+        >>> parser.feed('<a class="document-subtitle category" href="">')
+        >>> parser.genre is None
+        True
+        >>> parser.feed('<span itemprop="genre">Tools</span></a>')
+        >>> parser.genre
+        'Tools'
+    """
+    def __init__(self):
+        super().__init__()
+        self.genre = None
+        self._depth = 0
+        self._category_depth = None
+        self._genre_text = None
+
+    def feed(self, data: str):
+        """Feed data unless genre has been found already."""
+        if self.genre is not None:
+            return
+        try:
+            super().feed(data)
+        except _GenreFound:
+            pass
+
+    def handle_starttag(self, tag, attrs):
+        if self._genre_text is not None:
+            self._found()
+        if tag in VOID_ELEMENTS:
+            return
+        self._depth += 1
+        attrs = dict(attrs)
+        if self._category_depth is None:
+            if 'category' in (attrs.get('class') or '').split():
+                self._category_depth = self._depth
+        elif attrs.get('itemprop') == 'genre':
+            self._genre_text = []
+
+    def handle_startendtag(self, tag, attrs):
+        if self._genre_text is not None:
+            self._found()
+
+    def handle_endtag(self, tag):
+        if self._genre_text is not None:
+            self._found()
+        if tag in VOID_ELEMENTS:
+            return
+        if self._category_depth == self._depth:
+            self._category_depth = None
+        self._depth = max(self._depth - 1, 0)
+
+    def handle_data(self, data):
+        if self._genre_text is not None:
+            self._genre_text.append(data)
+
+    def _found(self):
+        self.genre = ''.join(self._genre_text)
+        raise _GenreFound()
+
 
+def fetch_category(
+        package_name: str, session: requests.Session = None) -> str:
+    """Download Google Play page of package_name until category is found.
 
-def get_play_page(package_name):
+    :param str package_name:
+        Package name to get category of.
+    :param requests.Session session:
+        Session to send request with. Default: a new connection.
+    :returns str:
+        Category or None if page does not contain a category.
+    :raises requests.HTTPError:
+        If Google Play answers with an error status.
+    """
     url = PLAY_STORE_LINK.format(package_name)
     __log__.info('Request %s', url)
-    return requests.get(url, headers=HEADERS)
+    response = (session or requests).get(url, headers=HEADERS, stream=True)
+    with response:
+        response.raise_for_status()
+        response.encoding = response.encoding or 'utf-8'
+        parser = GenreParser()
+        chunks = []
+        content = response.iter_content(CHUNK_SIZE, decode_unicode=True)
+        for chunk in content:
+            parser.feed(chunk)
+            if parser.genre is not None:
+                # Read rest of page, so that the connection is returned to
+                # the pool instead of being closed
+                for _ in content:
+                    pass
+                return parser.genre
+            chunks.append(chunk)
+    __log__.debug('Fall back to full parse of %s', url)
+    return find_category_string(''.join(chunks))
 
 
 def find_category_string(html_text):
@@ -38,7 +156,39 @@ def find_category_string(html_text):
         return None
 
 
-def write_category_file(package_name, category, details_dir):
+def has_category(
+        package_name: str, details_dir: str,
+        snapshot: PlaySnapshot = None) -> bool:
+    """Check if category of package_name has been stored before.
+
+    :param str package_name:
+        Package name.
+    :param str details_dir:
+        Directory containing categories directory. Ignored if snapshot is
+        given.
+    :param PlaySnapshot snapshot:
+        Snapshot to look up category in instead of details_dir.
+    :returns bool:
+        True if a category is stored, False otherwise.
+    """
+    if snapshot:
+        return snapshot.get(package_name)[2] is not None
+    return os.path.isfile(os.path.join(
+        details_dir, CATEGORY_DIR, '{}.json'.format(package_name)))
+
+
+def write_category_file(package_name, category, details_dir, snapshot=None):
+    if snapshot is None and PlaySnapshot.is_snapshot(details_dir):
+        with PlaySnapshot(details_dir) as snapshot:
+            write_category_file(package_name, category, details_dir, snapshot)
+        return
+    if snapshot:
+        snapshot.put_category(package_name, json.dumps({
+            'packageName': package_name,
+            'appCategory': category
+            }))
+        __log__.info('Stored category of %s in %s', package_name, details_dir)
+        return
     category_path = os.path.join(details_dir, CATEGORY_DIR)
     os.makedirs(category_path, exist_ok=True)
     file_name = '{}.json'.format(package_name)
@@ -51,11 +201,48 @@ def write_category_file(package_name, category, details_dir):
     __log__.info('Wrote %s', file_path)
 
 
+def scrape_categories(
+        package_names: Iterator[str], session: requests.Session,
+        concurrency: int) -> Iterator[Tuple[str, str]]:
+    """Fetch categories of packages concurrently.
+
+    Packages whose page cannot be retrieved are logged and skipped.
+
+    :param Iterator[str] package_names:
+        Package names to get categories of.
+    :param requests.Session session:
+        Session to share between threads.
+    :param int concurrency:
+        Maximum number of requests in flight.
+    :returns Iterator[Tuple[str, str]]:
+        Package names and categories in order of package_names. Category
+        is None if it cannot be found.
+    """
+    def _fetch(package_name):
+        try:
+            return package_name, fetch_category(package_name, session)
+        except requests.RequestException:
+            __log__.exception('Cannot fetch page of %s', package_name)
+            return package_name, None
+
+    return bounded_map(_fetch, package_names, concurrency, 2 * concurrency)
+
+
 def define_cmdline_arguments(parser: argparse.ArgumentParser):
     """Add arguments to parser."""
     parser.add_argument(
         'PLAY_STORE_DETAILS_DIR', type=str,
-        help='Directory containing JSON files with details from Google Play.')
+        help='''Directory containing JSON files with details from Google Play
+            or snapshot file created by get_play_data or pack_play_data.''')
+    parser.add_argument(
+        '--read-workers', default=DEFAULT_READ_WORKERS, type=int,
+        help='''Number of threads reading JSON files from
+            PLAY_STORE_DETAILS_DIR. Use 0 to read files sequentially.
+            Default: {}.'''.format(DEFAULT_READ_WORKERS))
+    parser.add_argument(
+        '--concurrency', default=DEFAULT_CONCURRENCY, type=int,
+        help='''Maximum number of requests to Google Play in flight.
+            Default: {}.'''.format(DEFAULT_CONCURRENCY))
     parser.set_defaults(func=_main)
 
 
@@ -64,10 +251,27 @@ def _main(args):
     __log__.info('------- Arguments: -------')
     __log__.info('PLAY_STORE_DETAILS_DIR: %s', args.PLAY_STORE_DETAILS_DIR)
 
-    for package_name, _ in parse_package_details(args.PLAY_STORE_DETAILS_DIR):
-        response = get_play_page(package_name)
-        category = find_category_string(response.text)
-        if not category:
-            continue
-        __log__.info('Found category "%s" for %s', category, package_name)
-        write_category_file(package_name, category, args.PLAY_STORE_DETAILS_DIR)
+    details_dir = args.PLAY_STORE_DETAILS_DIR
+    snapshot = None
+    if PlaySnapshot.is_snapshot(details_dir):
+        snapshot = PlaySnapshot(details_dir)
+
+    package_names = (
+        package_name
+        for package_name, _ in parse_package_details(
+            details_dir, args.read_workers)
+        if not has_category(package_name, details_dir, snapshot))
+    session = pooled_session(args.concurrency)
+    try:
+        for count, (package_name, category) in enumerate(scrape_categories(
+                package_names, session, args.concurrency), 1):
+            if category:
+                __log__.info(
+                    'Found category "%s" for %s', category, package_name)
+                write_category_file(
+                    package_name, category, details_dir, snapshot)
+            if snapshot and count % COMMIT_INTERVAL == 0:
+                snapshot.commit()
+    finally:
+        if snapshot:
+            snapshot.close()
@@ -1,12 +1,21 @@
 """Create CSV files used for Neo4j import."""
 import argparse
 import csv
+import errno
+import itertools
 import logging
 import os
 import sys
-from typing import Iterator
+from typing import Iterable, Iterator, Sequence, Set, Union
 
-from util.parse import parse_google_play_info, parse_iso8601
+from util.bare_git import CommitRecord, GitHistory
+from util.compress import open_gzip_writer
+from util.parse import \
+    iter_commit_records, parse_google_play_info, parse_iso8601, \
+    parse_iso8601_column
+from util.play_snapshot import PlaySnapshot
+from util.profiling import span
+from util.table_io import iter_table, iter_table_dicts
 
 
 # Some commit messages in the dataset are excessively long
@@ -16,6 +25,11 @@ csv.field_size_limit(sys.maxsize)
 __log__ = logging.getLogger(__name__)
 
 
+PLAY_DETAILS_DIR = 'package_details'
+PLAY_SNAPSHOT_FILE = 'package_details.sqlite'
+# Number of repositories whose timestamps are parsed at once
+REPOSITORY_BATCH_SIZE = 1024
+
 REPOSITORY_FIELDS = [
     ':LABEL',
     'id:ID',
@@ -138,95 +152,124 @@ def node_index(prefix: str, domain_id: str = None) -> str:
 
 
 def format_relation(
-        relation_type: str, start_id: str, end_id: str, **properties) -> dict:
-    """Formats a relation."""
-    relation = {
-        ':TYPE': relation_type,
-        ':START_ID': start_id,
-        ':END_ID': end_id,
-    }
-    relation.update(properties)
-    return relation
+        relation_type: str, start_id: str, end_id: str, *properties) -> tuple:
+    """Formats a relation.
 
+    properties are appended in order of the relation's fields.
+    """
+    return (relation_type, start_id, end_id) + properties
 
-def format_belongs_to(start_id: str, end_id: str) -> dict:
+
+def format_belongs_to(start_id: str, end_id: str) -> tuple:
     """Format a :BELONGS_TO relation."""
     return format_relation(BELONGS_TO_RELATION, start_id, end_id)
 
 
-def format_points_to(start_id: str, end_id: str) -> dict:
+def format_points_to(start_id: str, end_id: str) -> tuple:
     """Format a :POINTS_TO relation."""
     return format_relation(POINTS_TO_RELATION, start_id, end_id)
 
 
-def format_parent(start_id: str, end_id: str) -> dict:
+def format_parent(start_id: str, end_id: str) -> tuple:
     """Format a :PARENT relation."""
     return format_relation(PARENT_RELATION, start_id, end_id)
 
 
-def format_implemented(input_row: dict, repo_id: str) -> dict:
+def format_implemented(input_row: dict, repo_id: str) -> tuple:
     """Format data for :IMPLEMENTED_BY relation for Neo4j import."""
     return format_relation(
         IMPLEMENTED_BY_RELATION, input_row['package'], repo_id,
-        **{
-            'manifestPaths:string[]':
-                input_row['manifestPaths'].replace(',', ';'),
-            'gradleConfigPaths:string[]':
-                input_row['gradleConfigPaths'].replace(',', ';'),
-            'mavenConfigPaths:string[]':
-                input_row['mavenConfigPaths'].replace(',', ';'),
-        })
-
-
-def format_contributor(input_row: dict, contributor_type: str) -> tuple:
-    """Extract data for Neo4j import from input_row."""
+        input_row['manifestPaths'].replace(',', ';'),
+        input_row['gradleConfigPaths'].replace(',', ';'),
+        input_row['mavenConfigPaths'].replace(',', ';'))
+
+
+def format_contributor(commit: CommitRecord, contributor_type: str) -> tuple:
+    """Extract data of a contributor to commit.
+
+    :returns tuple:
+        Relation type, email, name, and timestamp.
+    """
     if contributor_type == CONTRIBUTOR_TYPE_COMMITTER:
-        email_key = 'author_email'
-        name_key = 'author_name'
-        time_key = 'authored_date'
-        relation_type = COMMITS_RELATION
+        return (
+            COMMITS_RELATION, commit.author_email.strip(),
+            commit.author_name, commit.authored_date)
     elif contributor_type == CONTRIBUTOR_TYPE_AUTHOR:
-        email_key = 'committer_email'
-        name_key = 'committer_name'
-        time_key = 'committed_date'
-        relation_type = AUTHORS_RELATION
-    else:
-        raise ValueError('Unknown contributor_type: {}'.format(
-            contributor_type))
+        return (
+            AUTHORS_RELATION, commit.committer_email.strip(),
+            commit.committer_name, commit.committed_date)
+    raise ValueError('Unknown contributor_type: {}'.format(contributor_type))
 
-    email = input_row[email_key].strip()
-    node_id = node_index('contr', email)
-    node = {
-        ':LABEL': 'Contributor',
-        ':ID': node_id,
-        'email:string': email,
-        'name:string': input_row[name_key],
-    }
-    relation = format_relation(
-        relation_type, node_id, input_row['id'],
-        **{'timestamp:long': input_row[time_key]})
-    return node_id, node, relation
+
+def format_author(commit: CommitRecord) -> tuple:
+    """Format a author row form commit."""
+    return format_contributor(commit, CONTRIBUTOR_TYPE_AUTHOR)
+
+
+def format_committer(commit: CommitRecord) -> tuple:
+    """Format a committer row form commit."""
+    return format_contributor(commit, CONTRIBUTOR_TYPE_COMMITTER)
 
 
-def format_author(input_row: dict) -> tuple:
-    """Format a author row form commit input_row."""
-    return format_contributor(input_row, CONTRIBUTOR_TYPE_AUTHOR)
+def format_contributor_node(node_id: str, email: str, name: str) -> tuple:
+    """Format CSV row for contributor."""
+    return ('Contributor', node_id, email, name)
 
 
-def format_committer(input_row: dict) -> tuple:
-    """Format a committer row form commit input_row."""
-    return format_contributor(input_row, CONTRIBUTOR_TYPE_COMMITTER)
+class ContributorRegistry(object):
+    """Assign small integer IDs to contributors by email.
+
+    Name and node ID of a contributor are stored once, when the email is
+    registered first. Contributors without email are registered anew every
+    time because their node IDs cannot be derived from the email.
+
+    Example:
+        >>> registry = ContributorRegistry()
+        >>> registry.register('jane@example.com', 'Jane')
+        0
+        >>> registry.register('jane@example.com', 'Jane Doe')
+        0
+        >>> registry.register('joe@example.com', 'Joe')
+        1
+        >>> registry.node_ids[0], registry.names[0]
+        ('contr:jane@example.com', 'Jane')
+    """
+    def __init__(self):
+        self._ids = {}
+        self.node_ids = []
+        self.emails = []
+        self.names = []
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def register(self, email: str, name: str) -> int:
+        """Get ID of contributor with email and register if unknown."""
+        try:
+            return self._ids[email]
+        except KeyError:
+            pass
+        contributor_id = len(self.node_ids)
+        self.node_ids.append(node_index('contr', email))
+        self.emails.append(email)
+        self.names.append(name)
+        if email:
+            self._ids[email] = contributor_id
+        return contributor_id
+
+    def iter_nodes(self) -> Iterator[tuple]:
+        """Iterate over CSV rows of all contributors."""
+        for node_id, email, name in zip(
+                self.node_ids, self.emails, self.names):
+            yield format_contributor_node(node_id, email, name)
 
 
 def format_tag(input_row: dict, repo_id: str) -> tuple:
     """Convert input_row for Neo4j import."""
     node_id = node_index('tag')
-    node = {
-        ':LABEL': 'Tag',
-        ':ID': node_id,
-        'name:string': input_row['tag_name'],
-        'message:string': escape(input_row['tag_message']),
-    }
+    node = (
+        'Tag', node_id, input_row['tag_name'],
+        escape(input_row['tag_message']))
     belongs_relation = format_belongs_to(node_id, repo_id)
     points_relation = format_points_to(node_id, input_row['commit_hash'])
     return node, belongs_relation, points_relation
@@ -235,65 +278,45 @@ def format_tag(input_row: dict, repo_id: str) -> tuple:
 def format_branch(input_row: dict, repo_id: str) -> tuple:
     """Convert input_row for Neo4j import."""
     node_id = node_index('branch')
-    node = {
-        ':LABEL': 'Branch',
-        ':ID': node_id,
-        'name:string': input_row['branch_name'],
-    }
+    node = ('Branch', node_id, input_row['branch_name'])
     belongs_relation = format_belongs_to(node_id, repo_id)
     points_relation = format_points_to(node_id, input_row['commit_hash'])
     return node, belongs_relation, points_relation
 
 
-def format_app(package_name: str) -> dict:
+def format_app(package_name: str) -> tuple:
     """Format CSV row for package name."""
-    return {
-        ':LABEL': 'App',
-        'id:ID': package_name,
-    }
+    return ('App', package_name)
 
 
-def format_commit(input_row: dict, repo_id: str) -> dict:
-    """Convert input_row for import to Neo4j."""
-    node_id = input_row['id']
-    node = {
-        ':LABEL': 'Commit',
-        'id:ID': node_id,
-        'short_id:string': input_row['short_id'],
-        'title:string': input_row['title'],
-        'message:string': escape(input_row['message']),
-        'additions:int': input_row['additions'],
-        'deletions:int': input_row['deletions'],
-        'total:int': input_row['total'],
-    }
-    belongs_relation = format_belongs_to(node_id, repo_id)
-    author_id, author_node, author_relation = format_author(input_row)
-    committer_id, committer_node, committer_relation = format_committer(
-        input_row)
-    contributors = {
-        author_id: author_node,
-        committer_id: committer_node,
-    }
-    parent_relations = [
-        format_parent(node_id, parent_id)
-        for parent_id in input_row['parent_ids'].split(',')
-        if parent_id
-    ]
-    return {
-        'commit': node,
-        'authors': author_relation,
-        'commits': committer_relation,
-        'belongs': belongs_relation,
-        'contributors': contributors,
-        'parents': parent_relations
-    }
+def format_commit(commit: CommitRecord) -> tuple:
+    """Convert commit for import to Neo4j."""
+    return (
+        'Commit', commit.id, commit.short_id, commit.title,
+        escape(commit.message), commit.additions, commit.deletions,
+        commit.total)
 
 
-def format_play_page(package_name: str, input_dir: str, mtime: int) -> tuple:
+def open_play_details(input_dir: str) -> Union[str, PlaySnapshot]:
+    """Open PlaySnapshot in input_dir if it exists.
+
+    :returns Union[str, PlaySnapshot]:
+        PlaySnapshot if input_dir contains one, otherwise path to directory
+        with JSON files.
+    """
+    snapshot_path = os.path.join(input_dir, PLAY_SNAPSHOT_FILE)
+    if os.path.exists(snapshot_path):
+        __log__.info('Read Google Play details from %s', snapshot_path)
+        return PlaySnapshot(snapshot_path)
+    return os.path.join(input_dir, PLAY_DETAILS_DIR)
+
+
+def format_play_page(
+        package_name: str, play_details: Union[str, PlaySnapshot],
+        mtime: int) -> tuple:
     """Read data for GooglePlayPage in right format."""
-    details_dir = os.path.join(input_dir, 'package_details')
     node_id = node_index('play')
-    data = parse_google_play_info(package_name, details_dir)
+    data = parse_google_play_info(package_name, play_details)
     if not data:
         data = {}
     node = {
@@ -328,12 +351,22 @@ def format_play_page(package_name: str, input_dir: str, mtime: int) -> tuple:
     return node, relation
 
 
-def format_repository(input_row: dict, snapshot: dict) -> dict:
-    """Formats input_row for Neo4j import."""
-    if snapshot.get('created_at'):
-        timestamp = parse_iso8601(snapshot.get('created_at'))
-    else:
+def format_repository(
+        input_row: dict, snapshot: dict, created_at: int = None,
+        snapshot_created_at: int = None) -> dict:
+    """Formats input_row for Neo4j import.
+
+    created_at and snapshot_created_at can be passed if timestamps of
+    input_row and snapshot have been parsed in advance.
+    """
+    if created_at is None:
+        created_at = parse_iso8601(input_row['created_at'])
+    if snapshot_created_at is None and snapshot.get('created_at'):
+        snapshot_created_at = parse_iso8601(snapshot.get('created_at'))
+    if snapshot_created_at is None:
         timestamp = ''
+    else:
+        timestamp = snapshot_created_at
     node_id = input_row['id']
     return {
         ':LABEL': 'GitHubRepository',
@@ -343,7 +376,7 @@ def format_repository(input_row: dict, snapshot: dict) -> dict:
         'snapshot:string': snapshot.get('web_url'),
         'snapshotTimestamp:long': timestamp,
         'description:string': escape(input_row['description']),
-        'createdAt:long': parse_iso8601(input_row['created_at']),
+        'createdAt:long': created_at,
         'forksCount:int': input_row['forks_count'],
         'stargazersCount:int': input_row['stargazers_count'],
         'subscribersCount:int': input_row['subscribers_count'],
@@ -355,69 +388,105 @@ def format_repository(input_row: dict, snapshot: dict) -> dict:
     }
 
 
-def get_repository_csv_path(repo_id: str, input_dir: str, name: str) -> str:
-    """Get directory where CSV files of a repository are."""
+def get_repository_table_path(
+        repo_id: str, input_dir: str, name: str) -> str:
+    """Get path without suffix to a table of a repository.
+
+    Tables can be in any format of util.table_io.
+    """
     return os.path.join(
         input_dir, 'repository_details', repo_id, name)
 
 
 def read_snapshot(repo_id: str, input_dir: str) -> dict:
-    """Read Gitlab snapshot data from CSV file."""
-    path = get_repository_csv_path(repo_id, input_dir, 'snapshot.csv')
-    with open(path) as csv_file:
-        for row in csv.DictReader(csv_file):
-            # We are only interested in the first (and only) entry.
-            return row
-    return {}
+    """Read Gitlab snapshot data from table."""
+    path = get_repository_table_path(repo_id, input_dir, 'snapshot')
+    # We are only interested in the first (and only) entry.
+    return next(iter_table_dicts(path), {})
 
 
 def iter_implemented_rel(repo_id: str, input_dir: str) -> Iterator[dict]:
     """Read :IMPLEMENTED_BY relation properties."""
-    path = get_repository_csv_path(repo_id, input_dir, 'paths.csv')
-    with open(path) as csv_file:
-        for row in csv.DictReader(csv_file):
-            yield format_implemented(row, repo_id)
+    path = get_repository_table_path(repo_id, input_dir, 'paths')
+    for row in iter_table_dicts(path):
+        yield format_implemented(row, repo_id)
 
 
-def iter_commit_rows(repo_id: str, input_dir: str) -> Iterator[tuple]:
-    """Open commit CSV file for repo_id and format rows."""
-    path = get_repository_csv_path(repo_id, input_dir, 'commits.csv')
-    with open(path) as csv_file:
-        try:
-            for row in csv.DictReader(csv_file):
-                yield format_commit(row, repo_id)
-        except csv.Error as error:
-            __log__.exception('Repo ID: %d.', repo_id)
-            raise error
+def iter_commit_rows(repo_id: str, input_dir: str) -> Iterator[CommitRecord]:
+    """Open commit table for repo_id and read commits."""
+    path = get_repository_table_path(repo_id, input_dir, 'commits')
+    try:
+        yield from iter_commit_records(iter_table(path))
+    except csv.Error as error:
+        __log__.exception('Repo ID: %s.', repo_id)
+        raise error
+
+
+def iter_git_commits(
+        repo_id: str, clone_project_path: str,
+        git_repos_dir: str) -> Iterator[CommitRecord]:
+    """Read commits of a repository directly from its bare Git repository.
+
+    :param str repo_id:
+        ID of repository on GitHub.
+    :param str clone_project_path:
+        Path of the mirror on Gitlab as in repositories.csv.
+    :param str git_repos_dir:
+        Directory containing bare repositories of Gitlab user `gitlab`.
+    :raises FileNotFoundError:
+        If there is no repository for clone_project_path.
+    """
+    if not clone_project_path:
+        raise FileNotFoundError(
+            'No clone_project_path for repository {}'.format(repo_id))
+    path = os.path.join(git_repos_dir, '{}.git'.format(clone_project_path))
+    if not os.path.isdir(path):
+        raise FileNotFoundError(
+            errno.ENOENT, 'No Git repository for {}'.format(repo_id), path)
+    __log__.info('Read commits of %s from %s', repo_id, path)
+    return GitHistory(path).iter_commits()
 
 
 def iter_repository_rows(input_dir: str) -> Iterator[tuple]:
-    """Converts all rows in input_file to Neo4j import format."""
+    """Converts all rows in input_file to Neo4j import format.
+
+    Timestamps are parsed for REPOSITORY_BATCH_SIZE rows at a time.
+    """
     path = os.path.join(input_dir, 'repositories.csv')
     with open(path) as input_file:
-        for row in csv.DictReader(input_file):
-            repo_id = row['id']
-            yield (
-                repo_id,
-                format_repository(row, read_snapshot(repo_id, input_dir)),
-                row['packages'].split(',')
-            )
+        reader = csv.DictReader(input_file)
+        while True:
+            rows = list(itertools.islice(reader, REPOSITORY_BATCH_SIZE))
+            if not rows:
+                break
+            snapshots = [read_snapshot(row['id'], input_dir) for row in rows]
+            created_at = parse_iso8601_column(
+                row['created_at'] for row in rows)
+            snapshot_created_at = parse_iso8601_column(
+                snapshot.get('created_at') for snapshot in snapshots)
+            for row, snapshot, created, snapshot_created in zip(
+                    rows, snapshots, created_at, snapshot_created_at):
+                yield (
+                    row['id'],
+                    format_repository(
+                        row, snapshot, created, snapshot_created),
+                    row['packages'].split(','),
+                    row.get('clone_project_path')
+                )
 
 
 def iter_tag_rows(repo_id: str, input_dir: str) -> Iterator[tuple]:
     """Iterate over tag rows of a repository."""
-    path = get_repository_csv_path(repo_id, input_dir, 'tags.csv')
-    with open(path) as input_file:
-        for row in csv.DictReader(input_file):
-            yield format_tag(row, repo_id)
+    path = get_repository_table_path(repo_id, input_dir, 'tags')
+    for row in iter_table_dicts(path):
+        yield format_tag(row, repo_id)
 
 
 def iter_branch_rows(repo_id: str, input_dir: str) -> Iterator[tuple]:
     """Iterate over branch rows of a repository."""
-    path = get_repository_csv_path(repo_id, input_dir, 'branches.csv')
-    with open(path) as input_file:
-        for row in csv.DictReader(input_file):
-            yield format_branch(row, repo_id)
+    path = get_repository_table_path(repo_id, input_dir, 'branches')
+    for row in iter_table_dicts(path):
+        yield format_branch(row, repo_id)
 
 
 def read_package_snapshot_times(input_dir: str) -> dict:
@@ -427,61 +496,128 @@ def read_package_snapshot_times(input_dir: str) -> dict:
         return {row[0]: row[1] for row in csv.reader(input_file)}
 
 
-def add_rel_to_set(rel: dict, rel_set: set):
-    """Add a relation to a set.
-
-    Use tuple of :TYPE, :START_ID, and :END_ID as index.
+def write_commits(
+        commits: Iterable[CommitRecord], repo_id: str, output: 'Output',
+        contributors: ContributorRegistry, seen_commits: Set[str]):
+    """Write commits of a repository and their relations as they come in.
+
+    The same commit can belong to several repositories, e.g. forks. Its
+    node, :PARENT, :AUTHORS, and :COMMITS relations depend on the commit
+    hash only and are written when the commit is first seen.
+
+    :param Iterable[CommitRecord] commits:
+        Commits of repository.
+    :param str repo_id:
+        ID of repository.
+    :param Output output:
+        Output to write rows to.
+    :param ContributorRegistry contributors:
+        Registry of contributors of all repositories.
+    :param Set[str] seen_commits:
+        Hashes of commits written before. Updated in place.
     """
-    key = rel[':TYPE'], rel[':START_ID'], rel[':END_ID']
-    rel_set[key] = rel
-
-
-def prepare_for_neo4j_import(input_dir: str, output_dir: str):
-    """Convert all rows in input_file to Neo4j import."""
-    contributors = {}
-    commits = {}
-    general_relations = {}
-    contribute_relations = {}
+    repo_commits = set()
+    node_ids = contributors.node_ids
+    for commit in commits:
+        # There are duplicate commit entries. Probably because of cloned
+        # projects.
+        if commit.id in repo_commits:
+            continue
+        repo_commits.add(commit.id)
+        output.general_relation(format_belongs_to(commit.id, repo_id))
+        if commit.id in seen_commits:
+            continue
+        seen_commits.add(commit.id)
+        output.commit(format_commit(commit))
+        for parent_id in commit.parent_ids.split(','):
+            if parent_id:
+                output.general_relation(format_parent(commit.id, parent_id))
+        for relation_type, email, name, timestamp in (
+                format_author(commit), format_committer(commit)):
+            contributor_id = contributors.register(email, name)
+            output.contribute_relation(format_relation(
+                relation_type, node_ids[contributor_id], commit.id,
+                timestamp))
+
+
+def write_repository_rows(
+        repo_id: str, packages: Sequence[str], input_dir: str,
+        output: 'Output', play_details: Union[str, PlaySnapshot],
+        mtimes: dict):
+    """Write all rows of a repository except commits.
+
+    :param str repo_id:
+        ID of repository.
+    :param Sequence[str] packages:
+        Package names of apps in repository.
+    :param str input_dir:
+        Directory containing tables of tags, branches, and files.
+    :param Output output:
+        Output to write rows to.
+    :param Union[str, PlaySnapshot] play_details:
+        Google Play details as returned by open_play_details().
+    :param dict mtimes:
+        Snapshot times of packages.
+    """
+    for package in packages:
+        output.app(format_app(package))
+        play_data = format_play_page(package, play_details, mtimes[package])
+        output.write('play_page', play_data[0])
+        output.general_relation(play_data[1])
+    for tag_data in iter_tag_rows(repo_id, input_dir):
+        output.tag(tag_data[0])
+        output.general_relation(tag_data[1])
+        output.general_relation(tag_data[2])
+    for branch_data in iter_branch_rows(repo_id, input_dir):
+        output.branch(branch_data[0])
+        output.general_relation(branch_data[1])
+        output.general_relation(branch_data[2])
+    for paths in iter_implemented_rel(repo_id, input_dir):
+        output.implemented_relation(paths)
+
+
+def prepare_for_neo4j_import(
+        input_dir: str, output_dir: str, git_repos_dir: str = None,
+        compress: bool = False):
+    """Convert all rows in input_file to Neo4j import.
+
+    If git_repos_dir is given, commits are read from bare Git repositories
+    in git_repos_dir instead of commits.csv files in input_dir. Repositories
+    without a bare Git repository fall back to their commits.csv file.
+
+    If compress is True, output files are gzip compressed.
+    """
+    contributors = ContributorRegistry()
+    seen_commits = set()
     mtimes = read_package_snapshot_times(input_dir)
-    with Output(output_dir) as output:
-        for repo_id, repo, packages in iter_repository_rows(input_dir):
-            output.repo(repo)
-            for commit in iter_commit_rows(repo_id, input_dir):
-                # There are duplicate commit entries. Probably because of
-                # cloned projects.
-                commits[commit['commit']['id:ID']] = commit['commit']
-                #  Also relations may or may not be duplicate. We need to
-                # deduplicate them by a tuple (type, start_id, end_id).
-                add_rel_to_set(commit['authors'], contribute_relations)
-                add_rel_to_set(commit['commits'], contribute_relations)
-                add_rel_to_set(commit['belongs'], general_relations)
-                contributors.update(commit['contributors'])
-                for parent_relation in commit['parents']:
-                    add_rel_to_set(parent_relation, general_relations)
-            for package in packages:
-                output.app(format_app(package))
-                play_data = format_play_page(
-                    package, input_dir, mtimes[package])
-                output.play_page(play_data[0])
-                output.general_relation(play_data[1])
-            for tag_data in iter_tag_rows(repo_id, input_dir):
-                output.tag(tag_data[0])
-                output.general_relation(tag_data[1])
-                output.general_relation(tag_data[2])
-            for branch_data in iter_branch_rows(repo_id, input_dir):
-                output.branch(branch_data[0])
-                output.general_relation(branch_data[1])
-                output.general_relation(branch_data[2])
-            for paths in iter_implemented_rel(repo_id, input_dir):
-                output.implemented_relation(paths)
-        for contributor in contributors.values():
-            output.contributor(contributor)
-        for commit in commits.values():
-            output.commit(commit)
-        for relation in general_relations.values():
-            output.general_relation(relation)
-        for relation in contribute_relations.values():
-            output.contribute_relation(relation)
+    play_details = open_play_details(input_dir)
+    try:
+        with Output(output_dir, compress) as output:
+            for repo_id, repo, packages, clone_project_path in \
+                    iter_repository_rows(input_dir):
+                output.write('repo', repo)
+                commits = None
+                if git_repos_dir:
+                    try:
+                        commits = iter_git_commits(
+                            repo_id, clone_project_path, git_repos_dir)
+                    except FileNotFoundError as error:
+                        __log__.warning(
+                            'Read commits from table instead: %s', error)
+                if commits is None:
+                    commits = iter_commit_rows(repo_id, input_dir)
+                with span('write_commits', 'csv', repo_id=repo_id):
+                    write_commits(
+                        commits, repo_id, output, contributors, seen_commits)
+                with span('write_repository', 'csv', repo_id=repo_id):
+                    write_repository_rows(
+                        repo_id, packages, input_dir, output, play_details,
+                        mtimes)
+            with span('write_contributors', 'csv'):
+                output.writerows('contributor', contributors.iter_nodes())
+    finally:
+        if isinstance(play_details, PlaySnapshot):
+            play_details.close()
 
 
 def escape(string: str) -> str:
@@ -510,12 +646,21 @@ class Output(object):
     """Combine all CSV writers in one class.
 
     Facilitates opening all writers simultaneously in one `with` statement.
+    Every tag in output_type is an attribute holding the writerow() method
+    of the tag's CSV writer. Rows are sequences with values in order of
+    the tag's fields.
+
+    With compress set, files are written gzip compressed (.csv.gz) by one
+    compressor process per file. Neo4j import reads them directly.
+
+    Rows given as dictionaries keyed by fields are written with write().
 
     Example:
 
         with Output('output_dir/') as output:
             for row in repos:
-                output.repo(row)
+                output.write('repo', row)
+            output.general_relation(('BELONGS_TO', commit_id, repo_id))
     """
     # pylint: disable = too-few-public-methods
     output_type = [
@@ -530,52 +675,86 @@ class Output(object):
         ('contribute_relation', CONTRIBUTOR_RELATION_FIELDS),
         ('implemented_relation', IMPLEMENTED_RELATION_FIELDS),
     ]
+    buffer_size = 1024 * 1024
 
-    def __init__(self, directory: str):
+    def __init__(self, directory: str, compress: bool = False):
         self.directory = directory
-        self._output = {}
-        for tag, fields in self.output_type:
-            self._init_output(tag, fields)
+        self.compress = compress
+        self._handles = []
+        self._writers = {}
+        self._fields = dict(self.output_type)
+        self._field_sets = {
+            tag: frozenset(fields) for tag, fields in self.output_type}
+        try:
+            for tag, fields in self.output_type:
+                self._init_output(tag, fields)
+        except BaseException:
+            # Do not leak files and compressors opened before the failure
+            self._close_handles()
+            raise
 
     def __enter__(self):
         return self
 
     def __exit__(self, *exception_info):
-        """Close all file handles."""
-        for output in self._output.values():
-            output['handle'].close()
+        """Close all file handles and wait for compressors.
 
-    def __getattribute__(self, name):
-        """Resolve tags in output_types to self.write.
-
-        Allows self.repo(row) be resolved to self.write('repo', row)
+        All handles are closed even if closing one fails, e.g. because its
+        compressor exits with an error. The first error is raised.
         """
-        if name in object.__getattribute__(self, '_output'):
-            write = object.__getattribute__(self, 'write')
-            return lambda row: write(name, row)
-        return object.__getattribute__(self, name)
+        error = self._close_handles()
+        if error:
+            raise error
+
+    def _close_handles(self) -> Exception:
+        """Close all file handles and return the first error, if any."""
+        error = None
+        for handle in self._handles:
+            try:
+                handle.close()
+            except Exception as close_error:  # pylint: disable=broad-except
+                error = error or close_error
+        return error
 
     def _init_output(self, tag: str, fields: list):
-        """Creates csv.DictWriter and writes headers."""
+        """Creates csv.writer, writes headers, and binds writerow to tag."""
         if tag == 'branch':
             filename = 'branches.csv'
         else:
             filename = '{}s.csv'.format(tag)
         path = os.path.join(self.directory, filename)
-        output_file = open(path, 'w', newline='')
-        writer = csv.DictWriter(output_file, fields, dialect=Neo4jDialect)
-        writer.writeheader()
-        self._output[tag] = {
-            'handle': output_file,
-            'writer': writer,
-        }
+        if self.compress:
+            output_file = open_gzip_writer(path + '.gz', self.buffer_size)
+        else:
+            output_file = open(
+                path, 'w', newline='', buffering=self.buffer_size)
+        writer = csv.writer(output_file, dialect=Neo4jDialect)
+        writer.writerow(fields)
+        self._handles.append(output_file)
+        self._writers[tag] = writer
+        setattr(self, tag, writer.writerow)
 
     def write(self, tag: str, row: dict):
-        """Write row to tagged CSV output."""
-        if tag in self._output:
-            self._output[tag]['writer'].writerow(row)
-        else:
+        """Write row given as dictionary keyed by fields to tagged output.
+
+        Missing fields are left empty.
+
+        :raises ValueError:
+            If row contains keys which are not fields of tag, like
+            csv.DictWriter.
+        """
+        if tag not in self._writers:
             raise KeyError('No writer for tag {}'.format(tag))
+        unknown = row.keys() - self._field_sets[tag]
+        if unknown:
+            raise ValueError('Row of {} contains unknown fields: {}'.format(
+                tag, ', '.join(sorted(unknown))))
+        self._writers[tag].writerow([
+            row.get(field, '') for field in self._fields[tag]])
+
+    def writerows(self, tag: str, rows: Iterable[Sequence]):
+        """Write many rows given as sequences to tagged output."""
+        self._writers[tag].writerows(rows)
 
 
 def define_cmdline_arguments(parser: argparse.ArgumentParser):
@@ -586,6 +765,16 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
     parser.add_argument(
         'output_dir', type=str,
         help='Directory to store Neo4j import files in.')
+    parser.add_argument(
+        '--git-repos-dir', type=str, default=None,
+        help='''Read commits directly from bare Git repositories
+        <clone_project_path>.git in this directory, e.g. the repositories of
+        Gitlab user `gitlab`, instead of commits.csv files written by
+        store_repo_data.''')
+    parser.add_argument(
+        '--compress', action='store_true',
+        help='''Write gzip compressed files (.csv.gz). Uses pigz or gzip if
+        installed.''')
     parser.set_defaults(func=_main)
 
 
@@ -594,5 +783,8 @@ def _main(args: argparse.Namespace):
     __log__.info('------- Arguments: -------')
     __log__.info('input-dir: %s', args.input_dir)
     __log__.info('output-dir: %s', args.output_dir)
+    __log__.info('git-repos-dir: %s', args.git_repos_dir)
+    __log__.info('compress: %s', args.compress)
     __log__.info('------- Arguments end -------')
-    prepare_for_neo4j_import(args.input_dir, args.output_dir)
+    prepare_for_neo4j_import(
+        args.input_dir, args.output_dir, args.git_repos_dir, args.compress)
@@ -15,8 +15,10 @@ from typing import Dict, IO, Iterable, Iterator, List
 from gitlab import Gitlab, GitlabGetError
 from gitlab.v4.objects import Project
 
-from util.bare_git import BareGit, GitHistory
+from util.bare_git import BareGit, CommitRecord, GitHistory
 from util.parse import parse_iso8601
+from util.table_io import \
+    available_formats, DEFAULT_FORMAT, FORMATS, write_table
 
 
 __log__ = logging.getLogger(__name__)
@@ -24,6 +26,9 @@ __log__ = logging.getLogger(__name__)
 
 GITLAB_HOST = 'http://145.108.225.21'
 GITLAB_REPOSITORY_PATH = '/var/opt/gitlab/git-data/repositories/gitlab'
+# Types of columns of commit tables in Parquet files
+COMMIT_COLUMN_TYPES = [
+    CommitRecord.__annotations__[field] for field in CommitRecord._fields]
 
 
 def iter_tags(gitlab_project: Project) -> Iterator[str]:
@@ -161,19 +166,19 @@ def iter_implementation_properties(
             }
 
 
-def write_csv(
-        prefix: str, filename: str, fieldnames: List[str],
-        rows: Iterable[Dict[str, str]]):
-    """Write CSV file."""
-    path = os.path.join(prefix, filename)
-    with open(path, 'w') as csv_file:
-        csv_writer = csv.DictWriter(csv_file, fieldnames)
-        csv_writer.writeheader()
-        for row in rows:
-            csv_writer.writerow(row)
+def write_dict_table(
+        prefix: str, name: str, fieldnames: List[str],
+        rows: Iterable[Dict[str, str]], table_format: str = DEFAULT_FORMAT):
+    """Write table of dictionaries with keys fieldnames."""
+    write_table(
+        os.path.join(prefix, name), fieldnames,
+        ([row[field] for field in fieldnames] for row in rows),
+        table_format)
 
 
-def store_repository_info(csv_file: IO[str], gitlab: Gitlab, outdir: str):
+def store_repository_info(
+        csv_file: IO[str], gitlab: Gitlab, outdir: str,
+        table_format: str = DEFAULT_FORMAT):
     """Add data of GIT repositories to Neo4j.
 
     :param IO[str] csv_file:
@@ -182,6 +187,8 @@ def store_repository_info(csv_file: IO[str], gitlab: Gitlab, outdir: str):
         Neo4j instance to add nodes to.
     :param Gitlab gitlab:
         Gitlab instance to query repository data from.
+    :param str table_format:
+        Format of files to write. One of util.table_io.FORMATS.
     """
     csv_reader = csv.DictReader(csv_file)
     for row in csv_reader:
@@ -206,41 +213,42 @@ def store_repository_info(csv_file: IO[str], gitlab: Gitlab, outdir: str):
 
         repository_path = os.path.join(
             gitlab.repository_prefix, '{}.git'.format(project.path))
+        if not os.path.isdir(repository_path):
+            __log__.error(
+                'Local git repository of project %d does not exist: %s',
+                project.id, repository_path)
+            continue
         __log__.info('Use local git repository at %s', repository_path)
         git = GitHistory(repository_path)
 
-        write_csv(
-            repo_dir, 'snapshot.csv',
+        write_dict_table(
+            repo_dir, 'snapshot',
             ['web_url', 'created_at'],
-            [{'web_url': project.web_url, 'created_at': project.created_at}])
+            [{'web_url': project.web_url, 'created_at': project.created_at}],
+            table_format)
 
-        write_csv(
-            repo_dir, 'commits.csv',
-            [
-                'id', 'short_id', 'title', 'message', 'additions',
-                'deletions', 'total', 'author_name', 'author_email',
-                'committer_name', 'committer_email', 'authored_date',
-                'committed_date', 'parent_ids'
-            ],
-            git.iter_commits())
+        write_table(
+            os.path.join(repo_dir, 'commits'), CommitRecord._fields,
+            git.iter_commits(), table_format, COMMIT_COLUMN_TYPES)
 
-        write_csv(
-            repo_dir, 'branches.csv',
+        write_dict_table(
+            repo_dir, 'branches',
             ['commit_hash', 'branch_name'],
-            iter_branches(project))
+            iter_branches(project), table_format)
 
-        write_csv(
-            repo_dir, 'tags.csv',
+        write_dict_table(
+            repo_dir, 'tags',
             ['commit_hash', 'tag_name', 'tag_message'],
-            iter_tags(project))
+            iter_tags(project), table_format)
 
-        write_csv(
-            repo_dir, 'paths.csv',
+        write_dict_table(
+            repo_dir, 'paths',
             [
                 'package', 'manifestPaths', 'gradleConfigPaths',
                 'mavenConfigPaths'
             ],
-            iter_implementation_properties(project, packages, git))
+            iter_implementation_properties(project, packages, git),
+            table_format)
 
 
 def define_cmdline_arguments(parser: argparse.ArgumentParser):
@@ -258,6 +266,15 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
         '--gitlab-host', type=str, default=GITLAB_HOST,
         help='''Hostname Gitlab instance is running on. Default:
         {}'''.format(GITLAB_HOST))
+    parser.add_argument(
+        '--gitlab-token-file', type=str, default=None,
+        help='''File with private token for Gitlab in its first line.
+        Default: Access Gitlab without authentication.''')
+    parser.add_argument(
+        '--format', type=str, default=DEFAULT_FORMAT, choices=FORMATS,
+        help='''Format of files written to OUTDIR. csv.zst requires package
+        zstandard, parquet requires package pyarrow. Default: {}'''.format(
+            DEFAULT_FORMAT))
     parser.set_defaults(func=_main)
 
 
@@ -268,9 +285,21 @@ def _main(args: argparse.Namespace):
     __log__.info('REPOSITORY_LIST: %s', args.REPOSITORY_LIST.name)
     __log__.info('--gitlab-repos-dir: %s', args.gitlab_repos_dir)
     __log__.info('--gitlab-host: %s', args.gitlab_host)
+    __log__.info('--gitlab-token-file: %s', args.gitlab_token_file)
+    __log__.info('--format: %s', args.format)
     __log__.info('------- Arguments end -------')
 
-    gitlab = Gitlab(args.gitlab_host, api_version=4)
+    if args.format not in available_formats():
+        raise ValueError('Format {} is not available. Available: {}'.format(
+            args.format, ', '.join(available_formats())))
+
+    private_token = None
+    if args.gitlab_token_file:
+        with open(args.gitlab_token_file) as token_file:
+            private_token = token_file.readline().strip()
+    gitlab = Gitlab(
+        args.gitlab_host, private_token=private_token, api_version=4)
     gitlab.repository_prefix = args.gitlab_repos_dir
 
-    store_repository_info(args.REPOSITORY_LIST, gitlab, args.OUTDIR)
+    store_repository_info(
+        args.REPOSITORY_LIST, gitlab, args.OUTDIR, args.format)
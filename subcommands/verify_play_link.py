@@ -3,7 +3,9 @@
 For each package name in input, check if package name is available in
 Google Play. If so, print package name to output.
 
-Input and output have each package name on a separate lines.
+Input and output have each package name on a separate lines. Several
+packages are checked concurrently over a pool of keep-alive connections.
+Output keeps the order of input.
 
 Use -h or --help for more information.
 """
@@ -14,9 +16,16 @@ import sys
 from typing import IO
 import requests
 
+from util.http_session import pooled_session
+from util.pool import bounded_map
+
 
 __logger__ = logging.getLogger(__name__)
 
+PLAY_STORE_URL = 'https://play.google.com/store/apps/details'
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RETRIES = 3
+
 
 def define_cmdline_arguments(parser: argparse.ArgumentParser):
     """Define commandline arguments."""
@@ -36,10 +45,20 @@ def define_cmdline_arguments(parser: argparse.ArgumentParser):
         '--include-403', action='store_true',
         help='''Include package names which Google Play returns
             status `403 Unauthorized` for.''')
+    parser.add_argument(
+        '--concurrency', default=DEFAULT_CONCURRENCY, type=int,
+        help='''Maximum number of requests in flight. Default: {}.
+            '''.format(DEFAULT_CONCURRENCY))
+    parser.add_argument(
+        '--retries', default=DEFAULT_RETRIES, type=int,
+        help='''Number of retries with exponential backoff for responses
+            with status 429 or 5xx. Default: {}.'''.format(DEFAULT_RETRIES))
     parser.set_defaults(func=_main)
 
 
-def is_package_in_play(package_name: str, include_403: bool) -> bool:
+def is_package_in_play(
+        package_name: str, include_403: bool,
+        session: requests.Session = None) -> bool:
     """Test if package_name is available in Google Play.
 
     Response code `200 Success` is considered an indicator of
@@ -49,12 +68,13 @@ def is_package_in_play(package_name: str, include_403: bool) -> bool:
     :param str package_name: Package name to search for in Google Play.
     :param bool include_403: Consider packages valid that get a
         response code `403 Unauthorized`.
+    :param requests.Session session: Session to send request with.
+        Default: a new connection for this request.
     :returns bool: True if package name is available in Google Play,
         False otherwise.
     """
-    response = requests.head(
-            'https://play.google.com/store/apps/details',
-            params={ 'id': package_name })
+    response = (session or requests).head(
+            PLAY_STORE_URL, params={ 'id': package_name })
 
     log_msg = 'Status {} for {}'.format(
             response.status_code, response.url)
@@ -68,21 +88,40 @@ def is_package_in_play(package_name: str, include_403: bool) -> bool:
 
 
 def package_filter(input_file: IO[str], output_file: IO[str],
-        include_403=False):
+        include_403=False, concurrency=DEFAULT_CONCURRENCY,
+        retries=DEFAULT_RETRIES):
     """Filter out lines if they do not exist in Google Play.
 
+    Input is read lazily and results are written as soon as all packages
+    before them have been checked.
+
     :param IO[str] input_file: File to read lines from. Each line is
         considered a package name to test.
     :param IO[str] output_file: File to write package names to if they
         pass the filter.
+    :param bool include_403: Consider packages valid that get a
+        response code `403 Unauthorized`.
+    :param int concurrency: Maximum number of requests in flight.
+    :param int retries: Number of retries for responses with status 429
+        or 5xx.
     """
-    for line in input_file.readlines():
-        package = line.strip()
-        if is_package_in_play(package, include_403):
-            print(package, file=output_file)
+    session = pooled_session(concurrency, retries)
+
+    def _check(package: str) -> bool:
+        return is_package_in_play(package, include_403, session)
+
+    packages = (line.strip() for line in input_file if line.strip())
+    # Allow one more request per worker to be queued to keep workers busy.
+    for package, is_in_play in bounded_map(
+            lambda p: (p, _check(p)), packages, concurrency,
+            2 * concurrency):
+        if is_in_play:
+            print(package, file=output_file, flush=True)
 
 
 def _main(args: argparse.Namespace):
     """Pass arguments to respective function."""
     __logger__.debug('Reading from %s', args.input.name)
-    package_filter(args.input, args.output, args.include_unauthorized)
+    package_filter(
+        args.input, args.output, args.include_403, args.concurrency,
+        args.retries)
@@ -3,11 +3,39 @@ from datetime import datetime
 import logging
 import re
 import subprocess
+import sys
+from typing import Iterator, NamedTuple
+
+from .profiling import span
 
 
 __log__ = logging.getLogger(__name__)
 
 
+class CommitRecord(NamedTuple):
+    """A commit of a Git repository.
+
+    Field order matches the columns of commits.csv written by
+    store_repo_data. Fields hold integers when parsed from git-log and
+    strings when read back from CSV. Names and email addresses are
+    interned because few contributors make many commits.
+    """
+    id: str
+    short_id: str
+    title: str
+    message: str
+    additions: int
+    deletions: int
+    total: int
+    author_name: str
+    author_email: str
+    committer_name: str
+    committer_email: str
+    authored_date: int
+    committed_date: int
+    parent_ids: str
+
+
 class BareGit(object):
     """BareGit facilitates interaction with bare Git repositories.
 
@@ -72,9 +100,11 @@ class BareGit(object):
             The completed process.
         """
         try:
-            return subprocess.run(
-                command, stderr=subprocess.PIPE, stdout=subprocess.PIPE,
-                shell=True, universal_newlines=False)  # TODO: errors='replace'
+            # TODO: errors='replace'
+            with span('git', 'git', command=command):
+                return subprocess.run(
+                    command, stderr=subprocess.PIPE, stdout=subprocess.PIPE,
+                    shell=True, universal_newlines=False)
         except UnicodeDecodeError as error:
             __log__.exception(
                 'Cannot decode to %s git output from command: %s',
@@ -169,13 +199,31 @@ class BareGit(object):
         return self._parse_grep_output(output)
 
     def log(self, options=None, git_options=None):
-        """git-log wrapper."""
+        """git-log wrapper.
+
+        :raises subprocess.CalledProcessError:
+            If git-log fails, e.g. because the repository does not exist.
+        """
         output, status = self.git(self.COMMAND_LOG, options, git_options)
+        if status:
+            raise subprocess.CalledProcessError(
+                status, [self.BIN_GIT, self.OPTION_GIT_DIR, self.git_dir,
+                         self.COMMAND_LOG])
         return output
 
 
 class GitHistory(BareGit):
-    """Provides parsed access to commit history."""
+    """Provides parsed access to commit history.
+
+    iter_commits() reads commits in a fixed-field format: every field is
+    terminated by a NUL character and fields appear in the order of
+    RECORD_FIELDS. The entire output of git-log is split once and consumed
+    RECORD_LENGTH fields at a time. Git does not allow NUL characters in
+    commit messages, so no escaping is needed.
+
+    iter_legacy_commits() reads the previous key-value format and is kept
+    for comparison.
+    """
     STATS_REGEX = re.compile(
         r'(?: ([0-9]+) files? changed)(?:, ([0-9]+) insertions?...)?'
         r'(?:, ([0-9]+) deletions?...)?')
@@ -197,20 +245,90 @@ class GitHistory(BareGit):
             r"---%n'"
     )
     HISTORY_OPTIONS = ['--all', '--date=raw', '--shortstat', FORMAT_OPTION]
+    RECORD_FIELDS = [
+        ('id', '%H'),
+        ('short_id', '%h'),
+        ('parent_ids', '%P'),
+        ('author_name', '%an'),
+        ('author_email', '%ae'),
+        ('authored_date', '%at'),
+        ('committer_name', '%cn'),
+        ('committer_email', '%ce'),
+        ('committed_date', '%ct'),
+        ('title', '%s'),
+        ('message', '%B'),
+    ]
+    # Each record starts with NUL so that --shortstat output, which git
+    # prints after the formatted fields, ends up in a field of its own.
+    RECORD_FORMAT_OPTION = "--pretty='format:%x00{}'".format(''.join(
+        placeholder + '%x00' for _, placeholder in RECORD_FIELDS))
+    # Formatted fields plus --shortstat output
+    RECORD_LENGTH = len(RECORD_FIELDS) + 1
+    RECORD_OPTIONS = ['--all', '--shortstat', RECORD_FORMAT_OPTION]
+
+    def iter_commits(self) -> Iterator[CommitRecord]:
+        """Iterates over all commits in the Git repository.
+
+        :raises subprocess.CalledProcessError:
+            If git-log fails, e.g. because the repository does not exist.
+        """
+        return self._parse_records(self._log_records())
+
+    def _log_records(self) -> bytes:
+        """Run git-log with GitHistory.RECORD_OPTIONS."""
+        return self.log(options=self.RECORD_OPTIONS)
+
+    @staticmethod
+    def _parse_records(output: bytes) -> Iterator[CommitRecord]:
+        r"""Parse git-log output produced with RECORD_FORMAT_OPTION.
 
-    def iter_commits(self):
-        """Iterates over all commits in the Git repository."""
-        # Strip all line feed characters to avoid polution of meta data.
-        output = self._log_all()  #.replace(b'\r', b'')
-        self.output = output
+        Example:
+        >>> output = (
+        ...     b'\x00abc\x00a\x00\x00Jane\x00jane@example.com\x00100\x00'
+        ...     b'Joe\x00joe@example.com\x00200\x00Title\x00'
+        ...     b'Title\n\nBody\n\x00\n 1 file changed, 2 insertions(+)\n')
+        >>> commit = next(GitHistory._parse_records(output))
+        >>> commit.authored_date, commit.parent_ids, commit.total
+        (100, '', 2)
+        >>> commit.message
+        'Title\n\nBody\n'
+        """
+        fields = output.split(b'\0')
+        length = GitHistory.RECORD_LENGTH
+        parse_stats = GitHistory._parse_stats
+        intern = sys.intern
+        # fields[0] is empty text in front of the first record.
+        for start in range(1, len(fields) - length + 1, length):
+            (commit_id, short_id, parent_ids, author_name, author_email,
+             authored_date, committer_name, committer_email, committed_date,
+             title, message, stats) = fields[start:start + length]
+            stats = parse_stats(stats.decode(errors='replace'))
+            yield CommitRecord(
+                commit_id.decode(),
+                short_id.decode(),
+                title.decode(errors='replace'),
+                message.decode(errors='replace'),
+                stats['additions'],
+                stats['deletions'],
+                stats['total'],
+                intern(author_name.decode(errors='replace')),
+                intern(author_email.decode(errors='replace')),
+                intern(committer_name.decode(errors='replace')),
+                intern(committer_email.decode(errors='replace')),
+                int(authored_date),
+                int(committed_date),
+                parent_ids.decode().replace(' ', ','))
+
+    def iter_legacy_commits(self):
+        """Iterates over all commits using the key-value format."""
+        return self._parse_legacy_output(self._log_all())
+
+    @staticmethod
+    def _parse_legacy_output(output: bytes):
+        """Parse git-log output produced with FORMAT_OPTION."""
         for commit in output.split(b'\n------\n'):
-            self.commit = commit
             if commit:
-                parsed = self._parse_commit(commit)
-                if 'WinRt' in parsed:
-                    yield commit
-                    break
-                yield parsed
+                yield GitHistory._parse_commit(commit)
 
     def _log_all(self, start=None) -> bytes:
         """Run git-log with GitHistory.OPTIONS."""
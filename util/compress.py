@@ -0,0 +1,91 @@
+"""Write gzip compressed text files in separate compressor processes.
+
+Compression runs in a pigz or gzip process per file, concurrently with the
+Python process writing the text. If neither program is installed, the gzip
+module is used in-process instead.
+
+Example:
+    >>> import gzip, os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'example.csv.gz')
+    >>> with open_gzip_writer(path) as text_file:
+    ...     _ = text_file.write('a,b\\n')
+    >>> gzip.open(path, 'rt').read()
+    'a,b\\n'
+"""
+
+import gzip
+import io
+import logging
+import shutil
+import subprocess
+from typing import IO
+
+
+__log__ = logging.getLogger(__name__)
+
+
+# Compressors in order of preference. pigz compresses with several threads.
+GZIP_PROGRAMS = ['pigz', 'gzip']
+COMPRESS_LEVEL = 6
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def find_gzip_program() -> str:
+    """Find an installed gzip compatible compressor.
+
+    :returns str:
+        Path to executable or None if none is installed.
+    """
+    for program in GZIP_PROGRAMS:
+        path = shutil.which(program)
+        if path:
+            return path
+    return None
+
+
+class CompressorPipe(io.TextIOWrapper):
+    """Text file writing into the standard input of a compressor process.
+
+    Closing the file waits for the process to finish.
+    """
+    def __init__(self, process: subprocess.Popen, **kwargs):
+        super().__init__(process.stdin, **kwargs)
+        self.process = process
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            super().close()
+        finally:
+            returncode = self.process.wait()
+        if returncode:
+            raise subprocess.CalledProcessError(
+                returncode, self.process.args)
+
+
+def open_gzip_writer(
+        path: str, buffer_size: int = DEFAULT_BUFFER_SIZE,
+        level: int = COMPRESS_LEVEL) -> IO[str]:
+    """Open a gzip compressed file for writing UTF-8 text.
+
+    :param str path:
+        File to write to. Usually ends with .gz.
+    :param int buffer_size:
+        Size of buffer in front of compressor.
+    :param int level:
+        Compression level from 1 (fastest) to 9 (smallest).
+    :returns IO[str]:
+        File object to write text to. Newlines are not translated.
+    """
+    program = find_gzip_program()
+    if program is None:
+        __log__.debug('No compressor program found. Use gzip module.')
+        return gzip.open(
+            path, 'wt', compresslevel=level, encoding='utf-8', newline='')
+    with open(path, 'wb') as output_file:
+        # The child process keeps its own handle on output_file.
+        process = subprocess.Popen(
+            [program, '-c', '-{}'.format(level)], stdin=subprocess.PIPE,
+            stdout=output_file, bufsize=buffer_size)
+    return CompressorPipe(process, encoding='utf-8', newline='')
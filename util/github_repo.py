@@ -51,6 +51,7 @@ from typing import Any, Callable, Tuple
 from urllib.parse import urlparse, parse_qs
 from .parse import ParsedJSON
 from .ratelimited_github import RateLimitedGitHub
+from .repo_cache import RepoCache
 
 
 __log__ = logging.getLogger(__name__)
@@ -181,12 +182,30 @@ class RepoVerifier(RateLimitedGitHub):
     Help repository deduplication with information on canonical
     repository names, forks, and statistics.
 
+    Repository meta data is looked up in a local RepoCache first if one is
+    configured. By default the cache is configured through environment
+    variables GITHUB_METADATA_CACHE and GITHUB_METADATA_TTL (see
+    util.repo_cache).
+
     :param str token:
         Github authentication token. Get one for your account at
         https://github.com/settings/tokens
+    :param RepoCache metadata_cache:
+        Cache to look up repositories in before requesting them from Github.
+        Default: RepoCache.from_environment().
+    :param str base_url:
+        URL of Github API v3. Default: see RateLimitedGitHub.
     """
     FULL_NAME_PATTERN = re.compile(r'^([a-z0-9-]+)\/([a-z0-9_\.-]+)$', re.I)
 
+    def __init__(
+            self, login='', password='', token='',
+            metadata_cache: RepoCache = None, base_url: str = None):
+        super(RepoVerifier, self).__init__(login, password, token, base_url)
+        if metadata_cache is None:
+            metadata_cache = RepoCache.from_environment()
+        self.metadata_cache = metadata_cache
+
     def get_repo(self, full_name: str) -> Repo:
         """Get repository with full_name.
 
@@ -199,8 +218,16 @@ class RepoVerifier(RateLimitedGitHub):
             Repository identified by full_name.
         """
         owner, name = self.full_name_to_parts(full_name)
+        if self.metadata_cache:
+            is_cached, repo_json = self.metadata_cache.lookup(full_name)
+            if is_cached:
+                __log__.debug('Found %s in meta data cache', full_name)
+                return Repo(repo_json, self._session) if repo_json else None
         repo = self.repository(owner, name)
-        return Repo(repo.to_json(), repo._session) if repo else None
+        repo_json = repo.to_json() if repo else None
+        if self.metadata_cache:
+            self.metadata_cache.put(full_name, repo_json)
+        return Repo(repo_json, self._session) if repo else None
 
     def get_repo_info(self, full_name: str) -> ParsedJSON:
         """Retrieve information on repository from Github.
@@ -0,0 +1,42 @@
+"""Create HTTP sessions for many concurrent requests to one host."""
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def pooled_session(
+        pool_size: int, retries: int = 3, backoff_factor: float = 1.0,
+        headers: dict = None) -> requests.Session:
+    """Create a session which keeps connections alive and retries.
+
+    The session can be shared between threads. Up to pool_size connections
+    per host are kept open. Requests failing with one of RETRY_STATUS_CODES
+    are retried with exponential backoff, respecting Retry-After headers.
+
+    :param int pool_size:
+        Number of connections to keep open per host. Should be at least the
+        number of threads using the session.
+    :param int retries:
+        Number of retries per request.
+    :param float backoff_factor:
+        Retries sleep for backoff_factor * 2 ** (retry - 1) seconds.
+    :param dict headers:
+        Headers to send with every request.
+    :returns requests.Session:
+        A new session.
+    """
+    retry = Retry(
+        total=retries, backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES, raise_on_status=False)
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
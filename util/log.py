@@ -1,9 +1,6 @@
 """Maintain a global logger instance."""
 import logging
 from typing import IO, Text
-import github3
-import urllib3
-import neo4j
 
 
 LOG_LEVEL = logging.WARNING
@@ -11,6 +8,9 @@ LOG_FORMAT = '%(asctime)s | [%(levelname)s] %(name)s: %(message)s'
 LEVELS = [
     logging.NOTSET, logging.DEBUG, logging.INFO, logging.WARNING,
     logging.ERROR, logging.CRITICAL]
+# Loggers of libraries are referred to by name, so that the libraries need
+# not be imported.
+LIBRARY_LOGGERS = ['github3', 'urllib3', 'neo4j']
 
 
 def compute_level(verbose: int, quiet: int) -> int:
@@ -35,9 +35,8 @@ def compute_level(verbose: int, quiet: int) -> int:
 def lower_level_for_libraries(min_level: int):
     """Decrease log level for libraries."""
     max_level = max(min_level, logging.WARNING)
-    for package in [github3, urllib3, neo4j]:
-        logger = logging.getLogger(package.__package__)
-        logger.setLevel(max_level)
+    for name in LIBRARY_LOGGERS:
+        logging.getLogger(name).setLevel(max_level)
 
 
 def configure_logger(name: Text, stream: IO[str], verbose: int, quiet: int):
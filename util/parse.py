@@ -1,16 +1,19 @@
 """Parse intermediary files for further processing."""
 
 import csv
-from datetime import datetime
+from datetime import date, datetime
 import glob
 import json
 import logging
 import os
 import re
+import sys
 from typing import \
     Dict, \
     Generator, \
     IO, \
+    Iterable, \
+    Iterator, \
     List, \
     Mapping, \
     Sequence, \
@@ -19,6 +22,16 @@ from typing import \
     Tuple, \
     Union
 
+from .bare_git import CommitRecord
+from .play_snapshot import CATEGORY_DIR, PlaySnapshot
+from .pool import bounded_map
+from .profiling import traced
+
+try:
+    import orjson
+except ImportError:  # Optional: Fall back to json from standard library
+    orjson = None
+
 
 __log__ = logging.getLogger(__name__)
 
@@ -29,6 +42,12 @@ ParsedJSON = Union[  # pylint: disable=C0103
 TIME_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
 TIMESTAMP_PATTERN = re.compile(
     r'(\d+-\d+-\d+T\d+:\d+:\d+)\.?\d*([-\+Z])((\d+):(\d+))?')
+# Timestamps as returned by GitHub and GitLab APIs. Matches are parsed by
+# parse_iso8601_column() without datetime.strptime.
+CANONICAL_TIMESTAMP_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})'
+    r'(?:\.\d*)?(Z|[-\+]\d{2}:\d{2})')
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
 GITLAB_KEYS = ['clone_project_name', 'clone_project_id']
 
 
@@ -49,24 +68,71 @@ def parse_package_to_repos_file(input_file: IO[str]) -> Dict[str, List[str]]:
         }
 
 
-def parse_package_details(details_dir: str) -> Generator[
-        Tuple[str, ParsedJSON], None, None]:
+@traced('decode_json', 'json')
+def decode_json(text: Union[str, bytes]) -> ParsedJSON:
+    """Parse JSON text with orjson if available, otherwise with json."""
+    if orjson:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def load_json_file(path: str) -> ParsedJSON:
+    """Parse JSON file.
+
+    Uses orjson if it is installed because it decodes considerably faster
+    than the json module.
+
+    :param str path: Path of JSON file.
+    :returns ParsedJSON: Parsed content of file.
+    """
+    with open(path, 'rb') as json_file:
+        return decode_json(json_file.read())
+
+
+def _load_package_details(path: str) -> Tuple[str, ParsedJSON]:
+    """Parse details of one package if path is a file."""
+    if not os.path.isfile(path):
+        return None
+    filename = os.path.basename(path)
+    package_name = os.path.splitext(filename)[0]
+    return package_name, load_json_file(path)
+
+
+def parse_package_details(
+        details_dir: str, workers: int = 0, prefetch: int = None) -> Generator[
+            Tuple[str, ParsedJSON], None, None]:
     """Parse all JSON files in details_dir.
 
     Filenames need to have .json extension. Filename without extension is
     assumed to be package name for details contained in file.
 
+    Files can be read and parsed in a pool of threads. Packages are yielded
+    in the same order either way.
+
+    details_dir may also point to a PlaySnapshot file instead of a directory.
+
     :param str details_dir: Directory to include JSON files from.
+    :param int workers: Number of threads to read files with. Files are
+        read sequentially if workers is less than 1. Default: 0.
+    :param int prefetch: Maximum number of files read ahead of the
+        consumer. Default: 2 * workers.
     :returns Generator[Tuple[str, ParsedJSON]]: Generator over tuples of
         package name and parsed JSON.
     """
-    for path in glob.iglob('{}/*.json'.format(details_dir)):
-        if os.path.isfile(path):
-            with open(path, 'r') as details_file:
-                filename = os.path.basename(path)
-                package_name = os.path.splitext(filename)[0]
-                package_details = json.load(details_file)
-                yield package_name, package_details
+    if PlaySnapshot.is_snapshot(details_dir):
+        with PlaySnapshot(details_dir) as snapshot:
+            for package_name, details in snapshot.iter_details():
+                yield package_name, decode_json(details)
+        return
+
+    paths = glob.iglob('{}/*.json'.format(details_dir))
+    if workers > 0:
+        results = bounded_map(_load_package_details, paths, workers, prefetch)
+    else:
+        results = map(_load_package_details, paths)
+    for result in results:
+        if result:
+            yield result
 
 
 def invert_mapping(packages: Mapping[str, Sequence[str]]) -> Dict[
@@ -133,18 +199,34 @@ def parse_upload_date(app_details: ParsedJSON) -> float:
     return None
 
 
-def parse_google_play_info(package_name: str, play_details_dir: str) -> dict:
-    """Select and format data from json_file to store in node.
+def load_play_details(
+        package_name: str, play_details: Union[str, PlaySnapshot]) -> Tuple[
+            ParsedJSON, int, ParsedJSON, int]:
+    """Load details and category overlay of a package from Google Play.
 
     :param str package_name:
         Package name.
-    :param str play_details_dir:
-        Name of directory to include JSON files from. Filenames in this
-        directory need to have .json extension. Filename without extension is
-        assumed to be package name for details contained in file.
-    :returns dict:
-        Properties of a node represinting the Google Play page of an app.
+    :param Union[str, PlaySnapshot] play_details:
+        Either a PlaySnapshot or name of directory to include JSON files from.
+        Filenames in this directory need to have .json extension. Filename
+        without extension is assumed to be package name for details contained
+        in file. Category data is read from subdirectory `categories`.
+    :returns Tuple[ParsedJSON, int, ParsedJSON, int]:
+        Details, snapshot time of details, category data, and snapshot time
+        of category data. Missing data is returned as empty dict and missing
+        timestamps as None.
     """
+    if isinstance(play_details, PlaySnapshot):
+        details, mtime, category, category_mtime = play_details.get(
+            package_name)
+        if details is None:
+            __log__.warning(
+                'No details for %s in %s.', package_name, play_details.path)
+        return (
+            decode_json(details) if details is not None else {}, mtime,
+            decode_json(category) if category is not None else {},
+            category_mtime)
+
     def _parse_json_file(prefix: str) -> Tuple[dict, float]:
         """Return parsed JSON and mdate
 
@@ -155,12 +237,33 @@ def parse_google_play_info(package_name: str, play_details_dir: str) -> dict:
         if not os.path.exists(json_file_path):
             __log__.warning('Cannot read file: %s.', json_file_path)
             return {}, None
-        with open(json_file_path) as json_file:
-            return json.load(json_file), int(os.stat(json_file_path).st_mtime)
+        with open(json_file_path, 'rb') as json_file:
+            return (
+                decode_json(json_file.read()),
+                int(os.fstat(json_file.fileno()).st_mtime))
+
+    meta_data, mtime = _parse_json_file(play_details)
+    category_data, category_mtime = _parse_json_file(
+        os.path.join(play_details, CATEGORY_DIR))
+    return meta_data, mtime, category_data, category_mtime
+
+
+def parse_google_play_info(
+        package_name: str, play_details: Union[str, PlaySnapshot]) -> dict:
+    """Select and format data from json_file to store in node.
 
-    meta_data, mtime = _parse_json_file(play_details_dir)
-    category_data, category_mtime = _parse_json_file(os.path.join(
-        play_details_dir, 'categories'))
+    :param str package_name:
+        Package name.
+    :param Union[str, PlaySnapshot] play_details:
+        Either a PlaySnapshot or name of directory to include JSON files from.
+        Filenames in this directory need to have .json extension. Filename
+        without extension is assumed to be package name for details contained
+        in file.
+    :returns dict:
+        Properties of a node represinting the Google Play page of an app.
+    """
+    meta_data, mtime, category_data, category_mtime = load_play_details(
+        package_name, play_details)
     if not meta_data and not category_data:
         return None
     if not meta_data:
@@ -274,6 +377,124 @@ def parse_iso8601(timestamp: str) -> int:
     return int(date_time.timestamp())
 
 
+_TZ_OFFSETS = {'Z': 0}
+_EPOCH_DAYS = {}
+
+
+def _tz_offset(designator: str) -> int:
+    """Convert Z or [+-]HH:MM to seconds east of UTC."""
+    try:
+        return _TZ_OFFSETS[designator]
+    except KeyError:
+        seconds = int(designator[1:3]) * 3600 + int(designator[4:6]) * 60
+        offset = -seconds if designator[0] == '-' else seconds
+        _TZ_OFFSETS[designator] = offset
+        return offset
+
+
+def _epoch_days(year: str, month: str, day: str) -> int:
+    """Count days between the epoch and a date."""
+    key = year, month, day
+    try:
+        return _EPOCH_DAYS[key]
+    except KeyError:
+        days = date(int(year), int(month), int(day)).toordinal() \
+            - EPOCH_ORDINAL
+        _EPOCH_DAYS[key] = days
+        return days
+
+
+def parse_iso8601_column(timestamps: Iterable[str]) -> List[int]:
+    """Parse many ISO 8601 timestamps at once.
+
+    Gives the same results as parse_iso8601() for each timestamp, but much
+    faster. Timestamps of the form YYYY-MM-DDTHH:MM:SS[.fff](Z|+HH:MM) are
+    split by a single regular expression and converted with cached day
+    counts and timezone offsets. All other timestamps are passed to
+    parse_iso8601().
+
+    Empty values are kept as None.
+
+    Example:
+    >>> parse_iso8601_column([
+    ...     '2015-03-27T19:25:23.000-08:00', '2014-02-27T15:05:06+01:00',
+    ...     '2008-09-03T20:56:35.450686Z', ''])
+    [1427513123, 1393509906, 1220475395, None]
+
+    :param Iterable[str] timestamps:
+        ISO 8601 formatted timestamps with timezone offset.
+    :returns List[int]:
+        POSIX timestamps in order of timestamps.
+    :raises ValueError:
+        if a timestamp is malformed.
+    """
+    result = []
+    match_timestamp = CANONICAL_TIMESTAMP_PATTERN.match
+    for timestamp in timestamps:
+        if not timestamp:
+            result.append(None)
+            continue
+        match = match_timestamp(timestamp)
+        if not match:
+            result.append(parse_iso8601(timestamp))
+            continue
+        year, month, day, hours, minutes, seconds, designator = \
+            match.groups()
+        hours, minutes, seconds = int(hours), int(minutes), int(seconds)
+        if hours > 23 or minutes > 59 or seconds > 59:
+            # Let parse_iso8601() raise the error.
+            result.append(parse_iso8601(timestamp))
+            continue
+        result.append(
+            _epoch_days(year, month, day) * 86400
+            + hours * 3600 + minutes * 60 + seconds
+            - _tz_offset(designator))
+    return result
+
+
+def iter_commit_records(rows: Iterable[Sequence]) -> Iterator[CommitRecord]:
+    """Read commits table as written by store_repo_data.
+
+    Columns may appear in any order. All values are strings if rows come
+    from CSV.
+
+    Example:
+    >>> import io
+    >>> csv_file = io.StringIO(
+    ...     'id,short_id,title,message,additions,deletions,total,'
+    ...     'author_name,author_email,committer_name,committer_email,'
+    ...     'authored_date,committed_date,parent_ids\\r\\n'
+    ...     'abc,a,Fix,Fix,1,2,3,Jane,j@x,Joe,jo@x,100,200,def\\r\\n')
+    >>> commit = next(iter_commit_records(csv.reader(csv_file)))
+    >>> commit.author_email, commit.total, commit.parent_ids
+    ('j@x', '3', 'def')
+
+    :param Iterable[Sequence] rows:
+        Header row naming the fields of CommitRecord followed by commits,
+        e.g. from csv.reader or util.table_io.iter_table.
+    :returns Iterator[CommitRecord]:
+        Iterator over commits in order of rows.
+    """
+    reader = iter(rows)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = CommitRecord._fields
+    order = [header.index(field) for field in fields]
+    in_order = order == list(range(len(fields)))
+    intern = sys.intern
+    # Indices of author_name, author_email, committer_name, committer_email
+    interned = [fields.index(field) for field in fields
+                if field.endswith(('_name', '_email'))]
+    make = CommitRecord._make
+    for row in reader:
+        if not in_order or not isinstance(row, list):
+            row = [row[index] for index in order]
+        for index in interned:
+            row[index] = intern(row[index])
+        yield make(row)
+
+
 def read_gitlab_import_results(gitlab_import_file: IO[str]):
     """Read CSV output from gitlab import.
 
@@ -319,12 +540,39 @@ def read_gitlab_import_results(gitlab_import_file: IO[str]):
     return gitlab_import
 
 
+def index_rows(rows: Iterable[dict], key: str) -> Dict[str, dict]:
+    """Index rows by the value of a column.
+
+    Later rows replace earlier rows with the same value.
+
+    Example:
+    >>> index_rows([{'id': '1', 'v': 'a'}, {'id': '1', 'v': 'b'}], 'id')
+    {'1': {'id': '1', 'v': 'b'}}
+
+    :param Iterable[dict] rows:
+        Rows, e.g. from csv.DictReader.
+    :param str key:
+        Name of column to index by.
+    :returns Dict[str, dict]:
+        Mapping from value in column key to row.
+    """
+    return {row[key]: row for row in rows}
+
+
 def consolidate_data(
         original_file: IO[str], gitlab_import_file: IO[str],
         mirrored_repos_file: IO[str], renamed_repos: Dict[str, dict],
-        packages_by_repo: Dict[str, Set[str]]) -> Generator[dict, None, None]:
+        packages_by_repo: Dict[str, Set[str]],
+        unused_repos_file: IO[str] = None) -> Generator[dict, None, None]:
     """Combine information about repositories and packages
 
+    The Gitlab import and mirrored repositories are indexed by GitHub ID and
+    full name of repository, respectively. The original file is streamed
+    once and joined row by row with these indexes, with renamed_repos by
+    GitHub ID, and with packages_by_repo by full_name and renamed_to.
+    Repositories and packages which are not joined with any row are tracked
+    while streaming and logged at the end.
+
     :param IO[str] original_file:
         CSV file as created by subcommand 'get_repo_data' and augmented by
         subcommand 'add_gradle_info'. This original file is necessary because
@@ -343,9 +591,19 @@ def consolidate_data(
     :param Dict[str, Set[str]] packages_by_repo:
         A mapping from repository name to set of package names in that
         repository.
+    :param IO[str] unused_repos_file:
+        Optional file to write CSV rows of repository name and package names
+        to for every repository in packages_by_repo that is not used.
     :returns Generator[dict, None, None]:
         a generator of consolidated data rows.
     """
+    gitlab_import = read_gitlab_import_results(gitlab_import_file)
+    mirrored_repos = index_rows(
+        csv.DictReader(mirrored_repos_file), 'github_full_name')
+
+    unused_repos = set(packages_by_repo)
+    unused_packages = set().union(*packages_by_repo.values())
+    used_packages = set()
 
     def _correct_gitlab_data(row: dict, repo_names: Set[str]):
         found = False
@@ -363,9 +621,6 @@ def consolidate_data(
                 row['clone_status'] = 'Success'
                 found = True
 
-    _used_repos = set()
-    _used_packages = set()
-
     def _find_packages(github_id: str, repo_names: Set[str]) -> str:
         """Find packages for any of the repo_names.
 
@@ -378,78 +633,47 @@ def consolidate_data(
         """
         packages = set()
         for name in repo_names:
-            if name in _used_packages:
-                __log__.info('Repository has been used before: %s', name)
             if name in packages_by_repo:
+                if name not in unused_repos:
+                    __log__.info('Repository has been used before: %s', name)
                 packages.update(packages_by_repo[name])
-                _used_repos.add(name)
+                unused_repos.discard(name)
         if not packages and github_id in renamed_repos:
             packages_str = renamed_repos[github_id]['packages']
             if packages_str:  # Avoid adding the empty string
                 packages.update(packages_str.split(','))
-        _used_packages.update(packages)
+        unused_packages.difference_update(packages)
+        used_packages.update(packages)
         return ','.join(packages)
 
-    def _log_unused_repos():
-        known_repos = set(packages_by_repo.keys())
-        if known_repos > _used_repos:
-            __log__.warning(
-                '%d repos are known but not used',
-                len(known_repos) - len(_used_repos))
-            with open('/tmp/unused_repos.csv', 'w') as tmp_file:
-                writer = csv.writer(tmp_file)
-                for repo in known_repos - _used_repos:
-                    __log__.info(
-                        'Known repo %s is not used (packages %s)',
-                        repo, packages_by_repo[repo])
-                    writer.writerow([repo, ','.join(packages_by_repo[repo])])
-
-    def _log_unused_packages():
-        known_packages = {
-            p for ps in packages_by_repo.values() for p in ps}
-        if known_packages > _used_packages:
+    seen_ids = set()
+    for repo_data in csv.DictReader(original_file):
+        github_id = repo_data['id']
+        if github_id in seen_ids:
             __log__.warning(
-                '%d packages are left without repository',
-                len(known_packages) - len(_used_packages))
-            for package in known_packages - _used_packages:
-                __log__.info('Known package is not used: %s', package)
-
-    original = {
-        row['id']: row
-        for row in csv.DictReader(original_file)}
-
-    gitlab_import = read_gitlab_import_results(gitlab_import_file)
-
-    mirrored_repos = {
-        row['github_full_name']: row
-        for row in csv.DictReader(mirrored_repos_file)}
-
-    if len(original) != len(gitlab_import):
-        __log__.warning(
-            'List lengths do not match: %d != %d', len(original),
-            len(gitlab_import))
-
-    for github_id, repo_data in original.items():
-        combined = {}
+                'Skip repo %s: It is listed more than once in %s',
+                github_id, original_file.name)
+            continue
+        seen_ids.add(github_id)
 
         # Keep as many columns from original file as possible: It has the right
         # encoding.
-        combined.update(repo_data)
+        combined = dict(repo_data)
 
-        if github_id not in gitlab_import:
+        imported = gitlab_import.get(github_id)
+        if imported is None:
             __log__.warning(
                 'ID %s is not in %s', github_id, gitlab_import_file.name)
         else:
             for key in ['full_name', 'renamed_to', 'not_found']:
-                if repo_data[key] != gitlab_import[github_id][key]:
+                if repo_data[key] != imported[key]:
                     __log__.warning(
                         'Column %s for row with ID %s differs: "%s" vs "%s"',
-                        key, github_id, repo_data[key],
-                        gitlab_import[github_id][key])
+                        key, github_id, repo_data[key], imported[key])
 
             # Add information from initial import to Gitlab
             for key in GITLAB_KEYS + ['clone_status', 'clone_project_path']:
-                combined[key] = gitlab_import[github_id][key]
+                combined[key] = imported[key]
 
         # Some repositories have been renamed
         repo_names = set(get_latest_repo_name(repo_data))
@@ -462,7 +686,7 @@ def consolidate_data(
         if not combined['packages']:
             __log__.warning(
                 'No package for repository with ID %s: %s', github_id,
-                ', '.join(repo_names))
+                ', '.join(filter(None, repo_names)))
             continue
 
         if not combined.get('clone_project_id'):
@@ -474,8 +698,36 @@ def consolidate_data(
             continue
         yield combined
 
-    _log_unused_repos()
-    _log_unused_packages()
+    if len(seen_ids) != len(gitlab_import):
+        __log__.warning(
+            'List lengths do not match: %d != %d', len(seen_ids),
+            len(gitlab_import))
+    _log_unused_repos(unused_repos, packages_by_repo, unused_repos_file)
+    _log_unused_packages(unused_packages)
     __log__.info(
         'Packages in set: %d. Repositories in set: %d',
-        len(_used_packages), len(_used_repos))
+        len(used_packages), len(packages_by_repo) - len(unused_repos))
+
+
+def _log_unused_repos(
+        unused_repos: Set[str], packages_by_repo: Dict[str, Set[str]],
+        unused_repos_file: IO[str] = None):
+    if not unused_repos:
+        return
+    __log__.warning('%d repos are known but not used', len(unused_repos))
+    writer = csv.writer(unused_repos_file) if unused_repos_file else None
+    for repo in sorted(unused_repos):
+        __log__.info(
+            'Known repo %s is not used (packages %s)',
+            repo, packages_by_repo[repo])
+        if writer:
+            writer.writerow([repo, ','.join(packages_by_repo[repo])])
+
+
+def _log_unused_packages(unused_packages: Set[str]):
+    if not unused_packages:
+        return
+    __log__.warning(
+        '%d packages are left without repository', len(unused_packages))
+    for package in sorted(unused_packages):
+        __log__.info('Known package is not used: %s', package)
@@ -0,0 +1,351 @@
+"""Run stages of a pipeline in order of their dependencies.
+
+A stage runs a command which reads input files and writes output files. A
+stage depends on every stage writing one of its inputs. Stages that do not
+depend on each other run concurrently.
+
+Stages are skipped if their command and the content of their inputs are
+unchanged since their last successful run and their outputs are unchanged
+since then, too. Content hashes of files are stored in a state file along
+with size and modification time, so that unchanged files are not read
+again.
+
+Example:
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> source = os.path.join(directory, 'source.txt')
+    >>> target = os.path.join(directory, 'target.txt')
+    >>> with open(source, 'w') as source_file:
+    ...     _ = source_file.write('input')
+    >>> stages = [Stage('copy', ['cp', source, target], [source], [target])]
+    >>> def run(stage):
+    ...     shutil.copy(stage.command[1], stage.command[2])
+    ...     return 0
+    >>> state_path = os.path.join(directory, 'state.json')
+    >>> run_pipeline(stages, state_path, run)
+    {'copy': 'done'}
+    >>> run_pipeline(stages, state_path, run)
+    {'copy': 'cached'}
+"""
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import fnmatch
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from typing import Callable, Dict, Iterator, List, NamedTuple, Set
+
+
+__log__ = logging.getLogger(__name__)
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Digest of inputs and outputs which do not exist
+MISSING = 'missing'
+
+# Results of stages
+DONE = 'done'
+CACHED = 'cached'
+FAILED = 'failed'
+BLOCKED = 'blocked'
+
+
+class Stage(NamedTuple):
+    """Stage of a pipeline.
+
+    Inputs are paths of files or directories or glob patterns. Outputs are
+    paths of files or directories.
+    """
+    name: str
+    command: List[str]
+    inputs: List[str] = []
+    outputs: List[str] = []
+    after: List[str] = []
+
+
+def load_pipeline(path: str) -> List[Stage]:
+    """Read stages from JSON file.
+
+    The file contains an object with key "stages" holding a list of
+    objects with the fields of Stage.
+
+    :param str path:
+        Path to JSON file.
+    :returns List[Stage]:
+        Stages in order of the file.
+    :raises ValueError:
+        if the pipeline is invalid.
+    """
+    with open(path) as pipeline_file:
+        definition = json.load(pipeline_file)
+    stages = []
+    for fields in definition['stages']:
+        unknown = set(fields) - set(Stage._fields)
+        if unknown:
+            raise ValueError('Unknown fields of stage {}: {}'.format(
+                fields.get('name'), ', '.join(sorted(unknown))))
+        stages.append(Stage(**fields))
+    find_dependencies(stages)
+    return stages
+
+
+def _fixed_prefix(pattern: str) -> str:
+    """Get leading path components without glob characters."""
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts)
+
+
+def _contains(directory: str, path: str) -> bool:
+    """Check if path is directory or inside of it."""
+    directory = os.path.normpath(directory)
+    path = os.path.normpath(path)
+    return path == directory or path.startswith(directory + os.sep)
+
+
+def _reads_output(input_spec: str, output: str) -> bool:
+    """Check if input_spec refers to output or a part of it."""
+    if glob.has_magic(input_spec):
+        return (
+            fnmatch.fnmatchcase(os.path.normpath(output), input_spec)
+            or _contains(output, _fixed_prefix(input_spec))
+            or _contains(_fixed_prefix(input_spec), output))
+    return _contains(output, input_spec) or _contains(input_spec, output)
+
+
+def find_dependencies(stages: List[Stage]) -> Dict[str, Set[str]]:
+    """Find stages each stage depends on.
+
+    :param List[Stage] stages:
+        All stages of a pipeline.
+    :returns Dict[str, Set[str]]:
+        Mapping from name of stage to names of stages it depends on.
+    :raises ValueError:
+        if names are not unique, a stage is unknown, or dependencies form a
+        cycle.
+    """
+    names = [stage.name for stage in stages]
+    if len(set(names)) != len(names):
+        raise ValueError('Names of stages are not unique')
+    dependencies = {}
+    for stage in stages:
+        unknown = set(stage.after) - set(names)
+        if unknown:
+            raise ValueError('Stage {} is after unknown stages: {}'.format(
+                stage.name, ', '.join(sorted(unknown))))
+        dependencies[stage.name] = set(stage.after) | {
+            other.name for other in stages
+            if other is not stage and any(
+                _reads_output(input_spec, output)
+                for input_spec in stage.inputs for output in other.outputs)}
+    visited = set()
+    for name in names:
+        _check_cycle(name, dependencies, visited, [])
+    return dependencies
+
+
+def _check_cycle(
+        name: str, dependencies: Dict[str, Set[str]], visited: Set[str],
+        path: List[str]):
+    if name in path:
+        raise ValueError('Stages depend on each other: {}'.format(
+            ' -> '.join(path[path.index(name):] + [name])))
+    if name in visited:
+        return
+    for dependency in sorted(dependencies[name]):
+        _check_cycle(dependency, dependencies, visited, path + [name])
+    visited.add(name)
+
+
+class HashCache(object):
+    """Content hashes of files, reused while size and mtime are unchanged.
+
+    Instances can be shared between threads.
+    """
+    def __init__(self, entries: Dict[str, list] = None):
+        self._entries = dict(entries or {})
+        self._lock = threading.Lock()
+
+    def entries(self) -> Dict[str, list]:
+        """Get a copy of all entries for storing them."""
+        with self._lock:
+            return dict(self._entries)
+
+    def file_digest(self, path: str) -> str:
+        """Compute SHA-256 hash of content of file."""
+        stat = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        with self._lock:
+            self._entries[path] = [
+                stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def digest(self, specs: List[str], exclude: List[str] = ()) -> str:
+        """Compute hash of all files matching paths or glob patterns.
+
+        Files in directories listed in exclude are left out.
+        """
+        digest = hashlib.sha256()
+        for spec in specs:
+            for path, file_digest in self._iter_file_digests(spec, exclude):
+                digest.update('{}\0{}\0'.format(path, file_digest).encode())
+        return digest.hexdigest()
+
+    def _iter_file_digests(
+            self, spec: str, exclude: List[str]) -> Iterator[tuple]:
+        if glob.has_magic(spec):
+            paths = sorted(glob.glob(spec, recursive=True))
+        else:
+            paths = [spec]
+        for path in paths:
+            if any(_contains(excluded, path) for excluded in exclude):
+                continue
+            if os.path.isdir(path):
+                for root, directories, files in os.walk(path):
+                    directories[:] = sorted(
+                        directory for directory in directories
+                        if not any(
+                            _contains(excluded, os.path.join(root, directory))
+                            for excluded in exclude))
+                    for file_name in sorted(files):
+                        file_path = os.path.join(root, file_name)
+                        yield file_path, self.file_digest(file_path)
+            elif os.path.exists(path):
+                yield path, self.file_digest(path)
+            else:
+                yield path, MISSING
+
+
+def _read_state(path: str) -> dict:
+    try:
+        with open(path) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_state(path: str, state: dict):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as state_file:
+        json.dump(state, state_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def stage_key(stage: Stage, input_digest: str) -> str:
+    """Compute hash of command and inputs of stage."""
+    return hashlib.sha256(json.dumps(
+        [stage.command, input_digest]).encode()).hexdigest()
+
+
+def run_pipeline(
+        stages: List[Stage], state_path: str,
+        run_stage: Callable[[Stage], int], jobs: int = 1,
+        force: bool = False) -> Dict[str, str]:
+    """Run all stages which are out of date.
+
+    Stages whose dependencies failed are not run.
+
+    :param List[Stage] stages:
+        Stages of pipeline.
+    :param str state_path:
+        JSON file storing hashes of previous runs. Created if it does not
+        exist and updated after every stage.
+    :param Callable[[Stage], int] run_stage:
+        Function running the command of a stage and returning its exit
+        status.
+    :param int jobs:
+        Maximum number of stages to run concurrently.
+    :param bool force:
+        Run all stages even if they are up to date.
+    :returns Dict[str, str]:
+        Mapping from name of stage to result: DONE, CACHED, FAILED or
+        BLOCKED.
+    """
+    dependencies = find_dependencies(stages)
+    state = _read_state(state_path)
+    stage_state = state.setdefault('stages', {})
+    hashes = HashCache(state.get('files'))
+    state_lock = threading.Lock()
+    results = {}
+    # Outputs of other stages nested in outputs of a stage, e.g. a
+    # subdirectory, do not change the outputs of the stage.
+    nested_outputs = {
+        stage.name: [
+            nested for other in stages if other is not stage
+            for nested in other.outputs
+            if any(_contains(output, nested) for output in stage.outputs)]
+        for stage in stages}
+
+    def _save_state():
+        with state_lock:
+            state['files'] = hashes.entries()
+            _write_state(state_path, state)
+
+    def _process(stage: Stage) -> str:
+        key = stage_key(stage, hashes.digest(stage.inputs))
+        with state_lock:
+            previous = stage_state.get(stage.name, {})
+        if (
+                not force and previous.get('key') == key
+                and all(map(os.path.exists, stage.outputs))
+                and previous.get('outputs') == hashes.digest(
+                    stage.outputs, nested_outputs[stage.name])):
+            __log__.info('Stage %s is up to date', stage.name)
+            return CACHED
+        __log__.info('Run stage %s: %s', stage.name, ' '.join(stage.command))
+        returncode = run_stage(stage)
+        if returncode:
+            __log__.error(
+                'Stage %s failed with exit status %d', stage.name, returncode)
+            return FAILED
+        with state_lock:
+            stage_state[stage.name] = {
+                'key': key,
+                'outputs': hashes.digest(
+                    stage.outputs, nested_outputs[stage.name])}
+        _save_state()
+        __log__.info('Stage %s finished', stage.name)
+        return DONE
+
+    pending = list(stages)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        while pending or running:
+            for stage in list(pending):
+                required = [results.get(name) for name in
+                            dependencies[stage.name]]
+                if any(result in (FAILED, BLOCKED) for result in required):
+                    __log__.warning(
+                        'Skip stage %s: A stage it depends on failed',
+                        stage.name)
+                    results[stage.name] = BLOCKED
+                    pending.remove(stage)
+                elif all(result in (DONE, CACHED) for result in required):
+                    running[executor.submit(_process, stage)] = stage
+                    pending.remove(stage)
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    results[stage.name] = future.result()
+                except Exception:  # pylint: disable=broad-except
+                    __log__.exception('Stage %s failed', stage.name)
+                    results[stage.name] = FAILED
+    _save_state()
+    return {stage.name: results[stage.name] for stage in stages}
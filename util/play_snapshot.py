@@ -0,0 +1,200 @@
+"""Store Google Play details of many packages in a single file.
+
+A snapshot replaces a directory of JSON files, one per package, and its
+subdirectory `categories/` with one SQLite database. Each row holds the raw
+JSON of a package's details, the raw JSON of its category overlay, and the
+time each of them has been stored.
+
+JSON is stored as text and not decoded by this module.
+
+Example:
+    >>> snapshot = PlaySnapshot(':memory:')
+    >>> snapshot.put_details('com.example', '{"docId": "com.example"}', 1)
+    >>> snapshot.put_category('com.example', '{"appCategory": "Tools"}', 2)
+    >>> snapshot.get('com.example')
+    ('{"docId": "com.example"}', 1, '{"appCategory": "Tools"}', 2)
+    >>> snapshot.get('com.unknown')
+    (None, None, None, None)
+    >>> list(snapshot.iter_details())
+    [('com.example', '{"docId": "com.example"}')]
+"""
+
+import glob
+import logging
+import os
+import sqlite3
+import time
+from typing import Iterator, Tuple
+
+
+__log__ = logging.getLogger(__name__)
+
+
+CATEGORY_DIR = 'categories'
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS packages (
+        package TEXT PRIMARY KEY,
+        details TEXT,
+        details_mtime INTEGER,
+        category TEXT,
+        category_mtime INTEGER
+    );
+    '''
+
+
+class PlaySnapshot(object):
+    """SQLite database containing Google Play details of packages.
+
+    :param str path:
+        Path to database. Created if it does not exist.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+    @staticmethod
+    def is_snapshot(path: str) -> bool:
+        """Test if path points to a snapshot instead of a directory."""
+        return os.path.isfile(path)
+
+    def commit(self):
+        """Write pending changes to disk.
+
+        Changes are not committed after each put_*() call to allow fast bulk
+        inserts.
+        """
+        self._connection.commit()
+
+    def close(self):
+        """Commit pending changes and close database."""
+        self.commit()
+        self._connection.close()
+
+    def get(self, package_name: str) -> Tuple[str, int, str, int]:
+        """Get stored data for package_name.
+
+        :param str package_name:
+            Package name to look up.
+        :returns Tuple[str, int, str, int]:
+            Details as JSON text, time details were stored, category as JSON
+            text, and time category was stored. Each of them is None if not
+            available.
+        """
+        row = self._connection.execute(
+            '''SELECT details, details_mtime, category, category_mtime
+               FROM packages WHERE package = ?''',
+            (package_name,)).fetchone()
+        return tuple(row) if row else (None, None, None, None)
+
+    def get_details_status(self, package_name: str) -> Tuple[bool, int]:
+        """Check if details of package_name are stored without reading them.
+
+        :param str package_name:
+            Package name to look up.
+        :returns Tuple[bool, int]:
+            Whether Google Play returned null for the package and time
+            details were stored. (None, None) if no details are stored.
+        """
+        row = self._connection.execute(
+            """SELECT details = 'null', details_mtime FROM packages
+               WHERE package = ? AND details IS NOT NULL""",
+            (package_name,)).fetchone()
+        return (bool(row[0]), row[1]) if row else (None, None)
+
+    def iter_details(self) -> Iterator[Tuple[str, str]]:
+        """Iterate over packages with details.
+
+        Details are read one package at a time so that the database is not
+        locked while the caller writes to it between iterations.
+
+        :returns Iterator[Tuple[str, str]]:
+            Iterator over package names and details as JSON text.
+        """
+        package_names = [row[0] for row in self._connection.execute(
+            '''SELECT package FROM packages
+               WHERE details IS NOT NULL ORDER BY package''')]
+        for package_name in package_names:
+            row = self._connection.execute(
+                'SELECT details FROM packages WHERE package = ?',
+                (package_name,)).fetchone()
+            yield package_name, row[0]
+
+    def put_details(self, package_name: str, details: str, mtime: int = None):
+        """Store details of package_name.
+
+        :param str package_name:
+            Package name.
+        :param str details:
+            Details from Google Play as JSON text.
+        :param int mtime:
+            POSIX timestamp of snapshot. Default: now.
+        """
+        if mtime is None:
+            mtime = int(time.time())
+        self._connection.execute(
+            '''INSERT INTO packages (package, details, details_mtime)
+               VALUES (?, ?, ?)
+               ON CONFLICT (package) DO UPDATE
+               SET details = excluded.details,
+                   details_mtime = excluded.details_mtime
+            ''',
+            (package_name, details, mtime))
+
+    def put_category(
+            self, package_name: str, category: str, mtime: int = None):
+        """Store category overlay of package_name.
+
+        :param str package_name:
+            Package name.
+        :param str category:
+            Category data as JSON text.
+        :param int mtime:
+            POSIX timestamp of snapshot. Default: now.
+        """
+        if mtime is None:
+            mtime = int(time.time())
+        self._connection.execute(
+            '''INSERT INTO packages (package, category, category_mtime)
+               VALUES (?, ?, ?)
+               ON CONFLICT (package) DO UPDATE
+               SET category = excluded.category,
+                   category_mtime = excluded.category_mtime
+            ''',
+            (package_name, category, mtime))
+
+    def import_directory(self, details_dir: str) -> int:
+        """Store all JSON files in details_dir and its categories directory.
+
+        Modification times of files are kept as snapshot times.
+
+        :param str details_dir:
+            Directory containing <package_name>.json files and optionally
+            a subdirectory categories/ with <package_name>.json files.
+        :returns int:
+            Number of files imported.
+        """
+        count = 0
+        for prefix, put in [
+                (details_dir, self.put_details),
+                (os.path.join(details_dir, CATEGORY_DIR), self.put_category)]:
+            for path in glob.iglob(os.path.join(prefix, '*.json')):
+                if not os.path.isfile(path):
+                    continue
+                package_name = os.path.splitext(os.path.basename(path))[0]
+                with open(path) as json_file:
+                    put(
+                        package_name, json_file.read(),
+                        int(os.stat(path).st_mtime))
+                count += 1
+        self.commit()
+        __log__.info('Imported %d files from %s', count, details_dir)
+        return count
@@ -0,0 +1,53 @@
+"""Apply functions concurrently to streams of items.
+
+Example:
+    >>> list(bounded_map(lambda x: x * x, range(5), workers=2))
+    [0, 1, 4, 9, 16]
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def bounded_map(
+        function: Callable[[T], R], items: Iterable[T], workers: int,
+        prefetch: int = None) -> Iterator[R]:
+    """Apply function to items in a thread pool.
+
+    In contrast to Executor.map(), items are consumed lazily: At most
+    `prefetch` items are submitted to the pool but not yielded yet. Results
+    are yielded in the same order as items.
+
+    :param Callable[[T], R] function:
+        Function to apply to each item.
+    :param Iterable[T] items:
+        Items to pass to function. Consumed lazily.
+    :param int workers:
+        Number of threads.
+    :param int prefetch:
+        Maximum number of pending results. Default: 2 * workers.
+    :returns Iterator[R]:
+        Iterator over return values of function in order of items.
+    """
+    if prefetch is None:
+        prefetch = 2 * workers
+    prefetch = max(prefetch, 1)
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Do not wait for results nobody is going to read.
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
@@ -0,0 +1,176 @@
+"""Profile functions and record timing spans of hot paths.
+
+Spans are recorded only after start_tracing() has been called. Otherwise
+entering a span only checks a global variable. Recorded spans are written
+in Chrome's trace event format, which can be viewed as flame graph in
+chrome://tracing, https://ui.perfetto.dev, or https://www.speedscope.app.
+
+Example:
+    >>> start_tracing()
+    >>> with span('sleep', 'example', seconds=0):
+    ...     time.sleep(0)
+    >>> events = stop_tracing()
+    >>> [(event['name'], event['ph']) for event in events]
+    [('thread_name', 'M'), ('sleep', 'X')]
+"""
+
+import cProfile
+import functools
+import importlib.util
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List
+
+# Optional: sampling profiler, imported only when used
+HAS_PYINSTRUMENT = importlib.util.find_spec('pyinstrument') is not None
+
+
+__log__ = logging.getLogger(__name__)
+
+
+PROFILERS = ['cprofile', 'sampling']
+DEFAULT_PROFILER = 'cprofile'
+
+# Events recorded since start_tracing() or None if not tracing
+_events = None
+_start_ns = 0
+_thread_ids = set()
+
+
+def start_tracing():
+    """Start recording spans."""
+    global _events, _start_ns  # pylint: disable=global-statement
+    _thread_ids.clear()
+    _start_ns = time.perf_counter_ns()
+    _events = []
+
+
+def stop_tracing() -> List[dict]:
+    """Stop recording spans.
+
+    :returns List[dict]:
+        Trace events recorded since start_tracing().
+    """
+    global _events  # pylint: disable=global-statement
+    events, _events = _events or [], None
+    return events
+
+
+def write_trace(path: str, events: List[dict]):
+    """Write trace events to JSON file in Chrome's trace event format."""
+    with open(path, 'w') as trace_file:
+        json.dump(
+            {'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+    __log__.info('Wrote %d trace events to %s', len(events), path)
+
+
+class span(object):  # pylint: disable=invalid-name
+    """Context manager recording time spent in its block as trace event.
+
+    Arguments can be added to self.args inside the block, e.g. the status
+    of a response.
+
+    :param str name:
+        Name of span, e.g. the operation.
+    :param str category:
+        Category of span, e.g. 'git' or 'http'.
+    :param args:
+        Details to store with the span.
+    """
+    __slots__ = ['name', 'category', 'args', '_start']
+
+    def __init__(self, name: str, category: str, **args):
+        self.name = name
+        self.category = category
+        self.args = args
+        self._start = None
+
+    def __enter__(self):
+        if _events is not None:
+            self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exception_info):
+        events = _events
+        if events is None or self._start is None:
+            return
+        end = time.perf_counter_ns()
+        thread_id = threading.get_ident()
+        if thread_id not in _thread_ids:
+            _thread_ids.add(thread_id)
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(),
+                'tid': thread_id,
+                'args': {'name': threading.current_thread().name}})
+        if exception_info[0] is not None:
+            self.args['exception'] = exception_info[0].__name__
+        events.append({
+            'name': self.name, 'cat': self.category, 'ph': 'X',
+            'ts': (self._start - _start_ns) / 1000,
+            'dur': (end - self._start) / 1000,
+            'pid': os.getpid(), 'tid': thread_id, 'args': self.args})
+
+
+def traced(name: str, category: str) -> Callable:
+    """Decorate function to record a span for every call."""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _events is None:
+                return function(*args, **kwargs)
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def available_profilers() -> List[str]:
+    """List profilers whose optional dependencies are installed."""
+    return [
+        profiler for profiler in PROFILERS
+        if profiler != 'sampling' or HAS_PYINSTRUMENT]
+
+
+def run_profiled(
+        function: Callable, args: tuple, path: str,
+        profiler: str = DEFAULT_PROFILER):
+    """Call function with args under a profiler and write stats to path.
+
+    Both profilers measure only the calling thread. cProfile stats can be
+    read with pstats or viewed as flame graph, e.g. with snakeviz. The
+    sampling profiler pyinstrument adds less overhead to many small
+    function calls and writes an HTML report.
+
+    :param Callable function:
+        Function to profile.
+    :param tuple args:
+        Positional arguments to function.
+    :param str path:
+        File to write stats to, even if function raises an exception.
+    :param str profiler:
+        One of PROFILERS.
+    :returns:
+        Return value of function.
+    """
+    if profiler not in available_profilers():
+        raise ValueError('Profiler {} is not available'.format(profiler))
+    if profiler == 'sampling':
+        import pyinstrument
+        sampler = pyinstrument.Profiler(async_mode='disabled')
+        sampler.start()
+        try:
+            return function(*args)
+        finally:
+            sampler.stop()
+            with open(path, 'w') as report_file:
+                report_file.write(sampler.output_html())
+            __log__.info('Wrote profile to %s', path)
+    profile = cProfile.Profile()
+    try:
+        return profile.runcall(function, *args)
+    finally:
+        profile.dump_stats(path)
+        __log__.info('Wrote profile to %s', path)
@@ -8,10 +8,14 @@ Rate limit data is read from headers of last response if available. If
 there is not response available, rate limit information is requested from
 the /rate_limit endpoint of the Github API v3. For more information see
 https://developer.github.com/v3/rate_limit/
+
+Requests go to https://api.github.com unless another URL of the API is set in
+the environment variable GITHUB_API_URL, e.g. a local stand-in for testing.
 """
 
 from datetime import datetime
 import logging
+import os
 from github3 import GitHub
 from github3.models import GitHubCore
 from github3.session import GitHubSession
@@ -19,10 +23,15 @@ from requests.structures import CaseInsensitiveDict
 from urllib.parse import urlparse
 import time
 
+from .profiling import span
+
 
 __log__ = logging.getLogger(__name__)
 
 
+API_URL_VARIABLE = 'GITHUB_API_URL'
+
+
 class RateLimitedGitHubSession(GitHubSession):
     """Provices functionality to avoid rate limit of Github API.
 
@@ -160,8 +169,11 @@ class RateLimitedGitHubSession(GitHubSession):
             self._wait_for_ratelimit(resource=resource)
         while True:
             try:
-                response = super(RateLimitedGitHubSession, self).request(
-                        method, url, *args, **kwargs)
+                with span('http', 'http', method=method, url=url) as request:
+                    response = super(RateLimitedGitHubSession, self).request(
+                            method, url, *args, **kwargs)
+                    if response is not None:
+                        request.args['status'] = response.status_code
                 if (response is not None and response.status_code == 403 and
                         retry_after_header in response.headers):
                     retry_after = int(response.headers[retry_after_header])
@@ -195,9 +207,18 @@ class RateLimitedGitHub(GitHub):
 
     Wrapper for github3.GitHub to actively avoid running into rate limits
     and waiting for suggested time if abuse detection is triggered.
+
+    :param str base_url:
+        URL of Github API v3. Default: Value of environment variable
+        GITHUB_API_URL if set, otherwise https://api.github.com.
     """
-    def __init__(self, login='', password='', token=''):
+    def __init__(self, login='', password='', token='', base_url=None):
         GitHubCore.__init__(self, {}, RateLimitedGitHubSession())
+        if base_url is None:
+            base_url = os.getenv(API_URL_VARIABLE)
+        if base_url:
+            __log__.info('Use Github API at %s', base_url)
+            self._session.base_url = base_url.rstrip('/')
         if token:
             self.login(login, token=token)
         elif login and password:
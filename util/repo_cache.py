@@ -0,0 +1,183 @@
+"""Persistent local store of repository meta data from Github.
+
+Several subcommands request the same repositories from Github. RepoCache
+keeps the raw JSON of each repository in an SQLite database so that all
+subcommands share one download per repository.
+
+Repositories are indexed by their Github ID. Every name a repository has been
+requested with is stored as an alias of that ID. This way renamed
+repositories are found under their old and their new name. Names which Github
+does not know are cached as well to avoid asking again.
+
+Entries older than `ttl` seconds are considered stale and ignored.
+
+Example:
+    >>> cache = RepoCache(':memory:')
+    >>> cache.put('Old/Name', {'id': 1, 'full_name': 'new/name'})
+    >>> cache.lookup('old/name')
+    (True, {'id': 1, 'full_name': 'new/name'})
+    >>> cache.lookup('new/name')
+    (True, {'id': 1, 'full_name': 'new/name'})
+    >>> cache.get_by_id(1)
+    {'id': 1, 'full_name': 'new/name'}
+    >>> cache.put('gone/repo', None)
+    >>> cache.lookup('gone/repo')
+    (True, None)
+    >>> cache.lookup('unknown/repo')
+    (False, None)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Tuple
+
+from .parse import ParsedJSON
+
+
+__log__ = logging.getLogger(__name__)
+
+
+CACHE_PATH_VARIABLE = 'GITHUB_METADATA_CACHE'
+CACHE_TTL_VARIABLE = 'GITHUB_METADATA_TTL'
+DEFAULT_TTL = 7 * 24 * 60 * 60  # in seconds
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS repos (
+        id INTEGER PRIMARY KEY,
+        full_name TEXT NOT NULL,
+        data TEXT NOT NULL,
+        fetched_at INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS names (
+        name TEXT PRIMARY KEY,
+        id INTEGER,
+        fetched_at INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS names_by_id ON names (id);
+    '''
+
+
+class RepoCache(object):
+    """SQLite backed cache of repository meta data.
+
+    Instances can be shared between threads.
+
+    :param str path:
+        Path to SQLite database. Created if it does not exist.
+    :param int ttl:
+        Number of seconds an entry is considered fresh. Default: one week.
+    """
+    def __init__(self, path: str, ttl: int = DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(SCHEMA)
+
+    @staticmethod
+    def from_environment() -> 'RepoCache':
+        """Create cache from environment variables.
+
+        GITHUB_METADATA_CACHE contains the path to the database.
+        GITHUB_METADATA_TTL optionally contains the TTL in seconds.
+
+        :returns RepoCache:
+            a cache if GITHUB_METADATA_CACHE is set, otherwise None.
+        """
+        path = os.getenv(CACHE_PATH_VARIABLE)
+        if not path:
+            return None
+        ttl = int(os.getenv(CACHE_TTL_VARIABLE, DEFAULT_TTL))
+        __log__.info('Use Github meta data cache %s (TTL %d sec)', path, ttl)
+        return RepoCache(path, ttl)
+
+    @staticmethod
+    def _normalize(full_name: str) -> str:
+        """Github treats repository names case insensitively."""
+        return full_name.lower()
+
+    def _is_fresh(self, fetched_at: int) -> bool:
+        return fetched_at + self.ttl >= time.time()
+
+    def lookup(self, full_name: str) -> Tuple[bool, ParsedJSON]:
+        """Look up repository by any name it has been requested with.
+
+        :param str full_name:
+            Identifier of the repository on Github consisting of
+            <owner_login>/<repo_name>.
+        :returns Tuple[bool, ParsedJSON]:
+            (True, data) for a fresh entry. data is None if Github did not
+            know the repository. (False, None) if there is no fresh entry.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                '''SELECT names.id, names.fetched_at, repos.data,
+                          repos.fetched_at
+                   FROM names LEFT JOIN repos ON names.id = repos.id
+                   WHERE names.name = ?''',
+                (self._normalize(full_name),)).fetchone()
+        if not row:
+            return False, None
+        github_id, name_fetched_at, data, repo_fetched_at = row
+        if github_id is None:
+            return self._is_fresh(name_fetched_at), None
+        if data is None or not self._is_fresh(repo_fetched_at):
+            return False, None
+        return True, json.loads(data)
+
+    def get_by_id(self, github_id: int) -> ParsedJSON:
+        """Look up repository by its Github ID.
+
+        :param int github_id:
+            ID of repository on Github.
+        :returns ParsedJSON:
+            Meta data of repository if a fresh entry exists, otherwise None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data, fetched_at FROM repos WHERE id = ?',
+                (int(github_id),)).fetchone()
+        if row and self._is_fresh(row[1]):
+            return json.loads(row[0])
+        return None
+
+    def put(self, full_name: str, data: ParsedJSON):
+        """Store meta data of repository requested as full_name.
+
+        If Github returned a repository with a different name, both names
+        are stored as aliases.
+
+        :param str full_name:
+            Name the repository has been requested with.
+        :param ParsedJSON data:
+            JSON representation of the repository as returned by Github
+            or None if Github does not know the repository.
+        """
+        now = int(time.time())
+        name = self._normalize(full_name)
+        with self._lock, self._connection:
+            if data is None:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO names VALUES (?, NULL, ?)',
+                    (name, now))
+                return
+            github_id = data['id']
+            canonical = self._normalize(data['full_name'])
+            if canonical != name:
+                __log__.debug('Repo was moved: %s -> %s', name, canonical)
+            self._connection.execute(
+                'INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?)',
+                (github_id, data['full_name'], json.dumps(data), now))
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO names VALUES (?, ?, ?)',
+                [(name, github_id, now), (canonical, github_id, now)])
+
+    def close(self):
+        """Close database connection."""
+        with self._lock:
+            self._connection.close()
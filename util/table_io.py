@@ -0,0 +1,236 @@
+"""Read and write tables of intermediate results in several formats.
+
+The format of a table file is determined by its suffix:
+
+    .csv        CSV
+    .csv.gz     gzip compressed CSV
+    .csv.zst    Zstandard compressed CSV, requires package zstandard
+    .parquet    Parquet with typed columns, requires package pyarrow
+
+Columns of Parquet files have the types declared by the writer and hold
+text by default, like CSV.
+
+Tables are referred to by their path without suffix. Readers look for a file
+with any of the suffixes, so that they need not know which format the
+writer used. Writing a table removes its files in other formats.
+
+Example:
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> path = os.path.join(directory, 'tags')
+    >>> write_table(path, ['name', 'count'], [('v1', 1)], 'csv.gz')[-7:]
+    '.csv.gz'
+    >>> list(iter_table(path))
+    [['name', 'count'], ['v1', '1']]
+    >>> list(iter_table_dicts(path))
+    [{'name': 'v1', 'count': '1'}]
+    >>> write_table(path, ['name', 'count'], [('v2', 2)])[-4:]
+    '.csv'
+    >>> list(iter_table(path))
+    [['name', 'count'], ['v2', '2']]
+    >>> os.path.exists(path + '.csv.gz')
+    False
+    >>> path = os.path.join(directory, 'typed')
+    >>> if 'parquet' in available_formats():
+    ...     _ = write_table(
+    ...         path, ['name', 'count'], [('v1', 1), (2, None)], 'parquet',
+    ...         [str, int])
+    ...     assert list(iter_table(path))[1:] == [('v1', 1), ('2', None)]
+"""
+
+import csv
+import gzip
+import logging
+import os
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+try:
+    import zstandard
+except ImportError:  # Optional: Zstandard compressed CSV is unavailable
+    zstandard = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: Parquet is unavailable
+    pyarrow = None
+
+
+__log__ = logging.getLogger(__name__)
+
+
+# Format names and suffixes in the order readers look for files
+FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'csv.zst': '.csv.zst',
+    'parquet': '.parquet',
+}
+DEFAULT_FORMAT = 'csv'
+GZIP_LEVEL = 6
+PARQUET_BATCH_SIZE = 10000
+# Names of pyarrow types of Parquet columns by declared Python type
+PARQUET_TYPES = {
+    str: 'string',
+    int: 'int64',
+    float: 'float64',
+    bool: 'bool_',
+}
+
+
+def available_formats() -> List[str]:
+    """List formats whose optional dependencies are installed."""
+    return [
+        table_format for table_format in FORMATS
+        if _missing_dependency(table_format) is None]
+
+
+def _missing_dependency(table_format: str) -> str:
+    if table_format == 'csv.zst' and zstandard is None:
+        return 'zstandard'
+    if table_format == 'parquet' and pyarrow is None:
+        return 'pyarrow'
+    return None
+
+
+def _check_format(table_format: str):
+    if table_format not in FORMATS:
+        raise ValueError('Unknown table format: {}'.format(table_format))
+    dependency = _missing_dependency(table_format)
+    if dependency:
+        raise ValueError('Table format {} requires package {}'.format(
+            table_format, dependency))
+
+
+def find_table(path: str) -> str:
+    """Find file of table at path.
+
+    :param str path:
+        Path to table without suffix.
+    :returns str:
+        Path to file including suffix.
+    :raises FileNotFoundError:
+        if no file with a known suffix exists.
+    """
+    for suffix in FORMATS.values():
+        if os.path.exists(path + suffix):
+            return path + suffix
+    raise FileNotFoundError('No table at {} with suffix {}'.format(
+        path, ', '.join(FORMATS.values())))
+
+
+def _open_text(path: str, mode: str):
+    """Open CSV file, decompressing or compressing depending on suffix."""
+    if path.endswith('.gz'):
+        return gzip.open(
+            path, mode + 't', compresslevel=GZIP_LEVEL, newline='')
+    if path.endswith('.zst'):
+        return zstandard.open(path, mode + 't', newline='')
+    return open(path, mode, newline='')
+
+
+def write_table(
+        path: str, fieldnames: Sequence[str], rows: Iterable[Sequence],
+        table_format: str = DEFAULT_FORMAT,
+        column_types: Sequence[type] = None) -> str:
+    """Write rows to a table file.
+
+    :param str path:
+        Path to table without suffix.
+    :param Sequence[str] fieldnames:
+        Names of columns.
+    :param Iterable[Sequence] rows:
+        Rows with values in order of fieldnames.
+    :param str table_format:
+        One of FORMATS.
+    :param Sequence[type] column_types:
+        Types of columns in Parquet files, each a key of PARQUET_TYPES.
+        Ignored by CSV. Default: str for all columns.
+    :returns str:
+        Path to file written.
+    """
+    _check_format(table_format)
+    table_path = path
+    path += FORMATS[table_format]
+    if table_format == 'parquet':
+        _write_parquet(
+            path, fieldnames, rows, column_types or [str] * len(fieldnames))
+    else:
+        with _open_text(path, 'w') as table_file:
+            writer = csv.writer(table_file)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
+    __log__.debug('Wrote %s', path)
+    # Readers must not find a table written before in another format
+    for suffix in FORMATS.values():
+        if table_path + suffix != path and os.path.exists(
+                table_path + suffix):
+            os.remove(table_path + suffix)
+            __log__.info('Removed %s', table_path + suffix)
+    return path
+
+
+def _write_parquet(
+        path: str, fieldnames: Sequence[str], rows: Iterable[Sequence],
+        column_types: Sequence[type]):
+    """Write rows in batches with a schema of declared column types.
+
+    Values of text columns which are not strings are converted like CSV
+    does. None is stored as null.
+    """
+    schema = pyarrow.schema([
+        (name, getattr(pyarrow, PARQUET_TYPES[column_type])())
+        for name, column_type in zip(fieldnames, column_types)])
+    rows = iter(rows)
+    with pyarrow.parquet.ParquetWriter(
+            path, schema, compression='zstd') as writer:
+        while True:
+            batch = [row for _, row in zip(range(PARQUET_BATCH_SIZE), rows)]
+            if not batch:
+                break
+            columns = list(zip(*batch))
+            arrays = [
+                pyarrow.array(
+                    [value if value is None or isinstance(value, str)
+                     else str(value) for value in column]
+                    if column_type is str else column,
+                    type=field.type)
+                for column, column_type, field in zip(
+                    columns, column_types, schema)]
+            writer.write_table(
+                pyarrow.Table.from_arrays(arrays, schema=schema))
+
+
+def iter_table(path: str) -> Iterator[Sequence]:
+    """Iterate over rows of a table.
+
+    Values read from CSV are strings. Values read from Parquet have the
+    types they were written with.
+
+    :param str path:
+        Path to table without suffix.
+    :returns Iterator[Sequence]:
+        Header row followed by all rows.
+    :raises FileNotFoundError:
+        if table does not exist.
+    """
+    path = find_table(path)
+    if path.endswith('.parquet'):
+        _check_format('parquet')
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        yield parquet_file.schema_arrow.names
+        for batch in parquet_file.iter_batches(PARQUET_BATCH_SIZE):
+            yield from zip(*[column.to_pylist() for column in batch.columns])
+        return
+    if path.endswith('.zst'):
+        _check_format('csv.zst')
+    with _open_text(path, 'r') as table_file:
+        yield from csv.reader(table_file)
+
+
+def iter_table_dicts(path: str) -> Iterator[Dict[str, object]]:
+    """Iterate over rows of a table as dictionaries keyed by column name."""
+    rows = iter_table(path)
+    header = next(rows, None)
+    for row in rows:
+        yield dict(zip(header, row))